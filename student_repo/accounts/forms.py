@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.contrib.auth import password_validation
 from django.contrib.auth.forms import UserCreationForm
 from .models import Profile, AccType
 
@@ -90,3 +91,19 @@ class UserForm(forms.ModelForm):
     class Meta:
         model = User
         fields = ('username', 'email')
+
+
+class ImportUsersForm(forms.Form):
+    csv_file = forms.FileField(label='CSV file')
+    password = forms.CharField(
+        required=False,
+        widget=forms.PasswordInput,
+        help_text='Initial password for rows without a password column; leave blank for none.',
+    )
+
+    def clean_password(self):
+        password = self.cleaned_data.get('password')
+        if password:
+            # the same rules as passwords given in the file
+            password_validation.validate_password(password)
+        return password
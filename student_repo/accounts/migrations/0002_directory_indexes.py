@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['type'], name='profile_type_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_search_keys(apps, schema_editor):
+    """Give every user a profile carrying their lowercased username and email.
+
+    The user directory searches profiles, so users without one would not be
+    found; a profile with no type counts under "All" only, as before.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('accounts', 'Profile')
+    Profile.objects.bulk_create(
+        [Profile(user_id=pk) for pk in User.objects.filter(profile__isnull=True).values_list('pk', flat=True)],
+        batch_size=500,
+    )
+    profiles = Profile.objects.select_related('user').only('pk', 'user__username', 'user__email')
+    for start in range(0, profiles.count(), 500):
+        batch = list(profiles.order_by('pk')[start:start + 500])
+        for profile in batch:
+            profile.username_key = profile.user.username.lower()
+            profile.email_key = profile.user.email.lower()
+        Profile.objects.bulk_update(batch, ['username_key', 'email_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_directory_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='username_key',
+            field=models.CharField(blank=True, editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='email_key',
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['username_key'], name='profile_username_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['email_key'], name='profile_email_key_idx'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
@@ -12,10 +12,27 @@ class Profile(models.Model):
     # Do not allow NULL in DB (null=False). Keep blank=True so forms
     # may leave the type empty (app logic treats empty as 'unset').
     type = models.CharField(max_length=1, choices=AccType.choices, blank=True, null=False)
+    # lowercased copies of the user's username and email for the user
+    # directory's prefix search; save() and accounts.signals keep them current
+    username_key = models.CharField(max_length=150, blank=True, editable=False)
+    email_key = models.CharField(max_length=254, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # role filters on the user directory and the admin counts
+            models.Index(fields=['type'], name='profile_type_idx'),
+            models.Index(fields=['username_key'], name='profile_username_key_idx'),
+            models.Index(fields=['email_key'], name='profile_email_key_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} profile"
 
+    @staticmethod
+    def search_keys(user):
+        """The ``username_key`` and ``email_key`` values for ``user``."""
+        return {'username_key': user.username.lower(), 'email_key': user.email.lower()}
+
     def save(self, *args, **kwargs):
         """Protect against removing the last admin.
 
@@ -41,4 +58,6 @@ class Profile(models.Model):
         except Exception:
             # be defensive: on any DB error, fall back to saving as-is
             pass
-        super().save(*args, **kwargs)
\ No newline at end of file
+        for field, value in self.search_keys(self.user).items():
+            setattr(self, field, value)
+        super().save(*args, **kwargs)
@@ -0,0 +1,221 @@
+"""Creating accounts and changing roles in bulk.
+
+Used by ``manage.py import_users`` and the bulk page at
+``/accounts/manage/bulk/``. Accounts are written with ``bulk_create`` and
+role or status changes are a single UPDATE each. Those UPDATEs keep the
+invariant ``Profile.save`` enforces one row at a time, counting only
+active accounts: the last active admin keeps its role and stays active.
+
+The per-role totals on the user list are cached here too, since these bulk
+writes bypass the signals that clear them.
+"""
+import csv
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Count, Exists, Func, IntegerField, OuterRef, Subquery
+
+from .models import AccType, Profile
+
+COLUMNS = ('username', 'email', 'full_name', 'type', 'password')
+
+# "student", "Faculty", "A", ... -> type code
+TYPE_NAMES = {**{t.value.lower(): t.value for t in AccType}, **{t.label.lower(): t.value for t in AccType}}
+
+ROLE_TOTALS_KEY = 'accounts:role_totals'
+
+
+def role_totals():
+    """Users per role type and in total (``'all'``), for the user list tabs.
+
+    Counting means reading every profile, so the result is cached for
+    ``USER_COUNTS_CACHE_SECONDS``. Saving or deleting a user or profile, and
+    the bulk changes below, clear it; with a per-process cache other
+    processes see the change once their copy expires.
+    """
+    totals = cache.get(ROLE_TOTALS_KEY)
+    if totals is None:
+        # the user count rides along as a scalar subquery: one query in all
+        users = get_user_model().objects.order_by().annotate(
+            n=Func(template='COUNT(*)', output_field=IntegerField()),
+        ).values('n')
+        rows = Profile.objects.order_by().values_list('type').annotate(n=Count('pk'), users=Subquery(users))
+        totals = {type_char: n for type_char, n, _ in rows}
+        totals['all'] = rows[0][2] if rows else get_user_model().objects.count()
+        cache.set(ROLE_TOTALS_KEY, totals, getattr(settings, 'USER_COUNTS_CACHE_SECONDS', 60))
+    return totals
+
+
+def forget_role_totals():
+    cache.delete(ROLE_TOTALS_KEY)
+
+
+def import_hasher():
+    """The hasher for passwords given in an import file.
+
+    PBKDF2 with ``IMPORT_PASSWORD_ITERATIONS`` rounds instead of the full
+    count, so thousands of rows hash in seconds. Django verifies the hash as
+    usual and re-hashes it with the full count at the user's first login.
+    """
+    hasher = PBKDF2PasswordHasher()
+    hasher.iterations = getattr(settings, 'IMPORT_PASSWORD_ITERATIONS', 1000)
+    return hasher
+
+
+def read_csv(lines):
+    """Parse and check an import file; returns ``(rows, errors)``.
+
+    The file needs a header row with at least ``username`` and ``email``;
+    ``full_name``, ``type`` (code or name, e.g. ``S`` or ``student``) and
+    ``password`` are optional; given passwords must pass
+    ``AUTH_PASSWORD_VALIDATORS``. ``errors`` lists ``(line, message)`` for
+    the rows that were left out.
+    """
+    User = get_user_model()
+    reader = csv.DictReader(lines)
+    header = {(name or '').strip().lower() for name in reader.fieldnames or ()}
+    missing = {'username', 'email'} - header
+    if missing:
+        return [], [(1, f"missing column{'s' if len(missing) > 1 else ''}: {', '.join(sorted(missing))}")]
+
+    rows, errors, seen = [], [], set()
+    for record in reader:
+        record = {(k or '').strip().lower(): (v or '').strip() for k, v in record.items() if k}
+        line = reader.line_num
+        row = {col: record.get(col, '') for col in COLUMNS}
+        row['email'] = User.objects.normalize_email(row['email'])
+        try:
+            User.username_validator(row['username'])
+            validate_email(row['email'])
+        except ValidationError as exc:
+            errors.append((line, f"{row['username'] or '(blank)'}: {exc.messages[0]}"))
+            continue
+        if len(row['username']) > 150 or len(row['full_name']) > 150:
+            errors.append((line, f"{row['username']}: username and full name are limited to 150 characters"))
+            continue
+        type_char = TYPE_NAMES.get(row['type'].lower(), None if row['type'] else '')
+        if type_char is None:
+            errors.append((line, f"{row['username']}: unknown type {row['type']!r}"))
+            continue
+        row['type'] = type_char
+        if row['password']:
+            try:
+                validate_password(row['password'], User(username=row['username'], email=row['email']))
+            except ValidationError as exc:
+                errors.append((line, f"{row['username']}: {' '.join(exc.messages)}"))
+                continue
+        keys = (row['username'], row['email'].lower())
+        if seen.intersection(keys):
+            errors.append((line, f"{row['username']}: username or email repeated in the file"))
+            continue
+        seen.update(keys)
+        rows.append(row)
+    return rows, errors
+
+
+def create_users(rows, password=None, batch_size=500):
+    """Create a User and Profile for each row from :func:`read_csv`.
+
+    Rows whose username or email (in any case) is already taken are
+    skipped; returns ``(created, skipped)`` lists of usernames. Rows without
+    a password of their own get ``password`` (hashed once for all of them),
+    or an unusable password when that is None too. Everything is written in
+    one transaction.
+    """
+    User = get_user_model()
+    hasher = import_hasher()
+    shared = make_password(password, hasher=hasher) if password else make_password(None)
+    created, skipped = [], []
+    with transaction.atomic():
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            taken = set(User.objects.filter(username__in=[r['username'] for r in batch]).values_list('username', flat=True))
+            # the profiles' lowercased, indexed copy of each email
+            taken_emails = set(
+                Profile.objects.filter(email_key__in=[r['email'].lower() for r in batch])
+                .values_list('email_key', flat=True)
+            )
+            fresh = []
+            for row in batch:
+                if row['username'] in taken or row['email'].lower() in taken_emails:
+                    skipped.append(row['username'])
+                else:
+                    fresh.append(row)
+            users = User.objects.bulk_create([
+                User(
+                    username=row['username'],
+                    email=row['email'],
+                    password=make_password(row['password'], hasher=hasher) if row['password'] else shared,
+                )
+                for row in fresh
+            ])
+            # bulk_create skips Profile.save(), which only guards demotions
+            Profile.objects.bulk_create([
+                Profile(user=user, full_name=row['full_name'], type=row['type'], **Profile.search_keys(user))
+                for user, row in zip(users, fresh)
+            ])
+            created += [row['username'] for row in fresh]
+    forget_role_totals()
+    return created, skipped
+
+
+def _last_admin(admins, user_ids, user_ref):
+    """Condition matching the admin that must keep its role or status.
+
+    That is the first of ``admins`` (by user id, read from the outer query's
+    ``user_ref``), and only when all of them are among ``user_ids``. Written
+    with EXISTS so the check is part of the UPDATE and sees the table as it
+    was before it.
+    """
+    return (
+        ~Exists(admins.exclude(user_id__in=user_ids))
+        & ~Exists(admins.filter(user_id__lt=OuterRef(user_ref)))
+    )
+
+
+def set_role(user_ids, type_char):
+    """Give the users in ``user_ids`` the role ``type_char``; returns the
+    number of profiles changed.
+
+    Users without a profile get one first. The change itself is one UPDATE;
+    demoting every active admin leaves the first one an admin, as
+    ``Profile.save`` would. Inactive admins cannot use the admin pages, so
+    they do not count.
+    """
+    User = get_user_model()
+    user_ids = list(user_ids)
+    missing = User.objects.filter(pk__in=user_ids, profile__isnull=True).only('username', 'email')
+    Profile.objects.bulk_create([Profile(user=user, **Profile.search_keys(user)) for user in missing])
+    profiles = Profile.objects.filter(user_id__in=user_ids).exclude(type=type_char)
+    if type_char != AccType.ADMIN:
+        admins = Profile.objects.filter(type=AccType.ADMIN, user__is_active=True)
+        profiles = profiles.exclude(
+            Exists(admins.filter(pk=OuterRef('pk')))
+            & _last_admin(admins, user_ids, 'user_id')
+        )
+    changed = profiles.update(type=type_char)
+    forget_role_totals()
+    return changed
+
+
+def set_active(user_ids, active):
+    """Activate or deactivate the users in ``user_ids`` in one UPDATE;
+    returns the number changed. Deactivation leaves the last active admin
+    active.
+    """
+    User = get_user_model()
+    user_ids = list(user_ids)
+    users = User.objects.filter(pk__in=user_ids).exclude(is_active=active)
+    if not active:
+        admins = Profile.objects.filter(type=AccType.ADMIN, user__is_active=True)
+        users = users.exclude(
+            Exists(admins.filter(user_id=OuterRef('pk')))
+            & _last_admin(admins, user_ids, 'pk')
+        )
+    return users.update(is_active=active)
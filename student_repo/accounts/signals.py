@@ -1,16 +1,31 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import Profile
+from .provisioning import forget_role_totals
 
 User = get_user_model()
 
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
     # Intentionally do not auto-create Profile on User.save() here.
     # Tests and views in this project explicitly create or get_or_create
     # profiles where needed. Auto-creating here caused duplicate creation
-    # races in some test setups, so keep the signal as a no-op for safety.
-    return
+    # races in some test setups. A new user only changes the directory's
+    # "All" count; for existing ones the profile's search keys follow
+    # username and email changes.
+    if created:
+        forget_role_totals()
+        return
+    if raw or (update_fields is not None and not {'username', 'email'} & set(update_fields)):
+        return
+    Profile.objects.filter(user=instance).update(**Profile.search_keys(instance))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def role_counts_changed(sender, **kwargs):
+    forget_role_totals()
@@ -63,12 +63,19 @@ class AdminUserManagementTests(TestCase):
         # reload profile and ensure type is still 'A'
         self.admin.refresh_from_db()
         self.assertEqual(self.admin.profile.type, 'A')
-from django.test import TestCase
+import io
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 
 User = get_user_model()
 from .models import Profile
+from . import provisioning
 
 
 class AccountsTests(TestCase):
@@ -147,3 +154,220 @@ class AccountsTests(TestCase):
         resp = self.client.post(reverse('login'), {'username': 'staffu', 'password': 'pw'}, follow=True)
         self.assertEqual(resp.request['PATH_INFO'], reverse('dashboard_admin'))
  
+
+
+@override_settings(MANAGE_USERS_PAGE_SIZE=2)
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        from projects.models import Project
+
+        self.admin = User.objects.create_user('dir_admin', email='boss@example.com', password='pw')
+        Profile.objects.create(user=self.admin, type='A')
+        for name, type_char in (('amy', 'S'), ('bob', 'S'), ('cara', 'F'), ('dan', 'S'), ('eve', 'F')):
+            user = User.objects.create_user(name, email=f'{name}@school.edu', password='pw')
+            Profile.objects.create(user=user, type=type_char)
+        amy = User.objects.get(username='amy')
+        Project.objects.create(owner=amy, title='One', description='d')
+        Project.objects.create(owner=amy, title='Two', description='d').soft_delete()
+        self.client.force_login(self.admin)
+        self.url = reverse('accounts:manage_users')
+
+    def _names(self, resp):
+        return [u.username for u in resp.context['users']]
+
+    def test_keyset_pages(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(self._names(resp), ['amy', 'bob'])
+        self.assertIsNone(resp.context['prev_url'])
+        self.assertEqual(resp.context['users'][0].project_count, 1)
+
+        resp = self.client.get(self.url + resp.context['next_url'])
+        self.assertEqual(self._names(resp), ['cara', 'dan'])
+        back = self.client.get(self.url + resp.context['prev_url'])
+        self.assertEqual(self._names(back), ['amy', 'bob'])
+
+        resp = self.client.get(self.url + resp.context['next_url'])
+        self.assertEqual(self._names(resp), ['dir_admin', 'eve'])
+        self.assertIsNone(resp.context['next_url'])
+
+    def test_search_and_role_filter(self):
+        resp = self.client.get(self.url, {'q': 'boss'})
+        self.assertEqual(self._names(resp), ['dir_admin'])
+        resp = self.client.get(self.url, {'q': 'ca'})
+        self.assertEqual(self._names(resp), ['cara'])
+
+        resp = self.client.get(self.url, {'type': 'F'})
+        self.assertEqual(self._names(resp), ['cara', 'eve'])
+        self.assertIsNone(resp.context['next_url'])
+        counts = {r['label']: r['count'] for r in resp.context['roles']}
+        self.assertEqual(counts, {'All': 6, 'Student': 3, 'Faculty': 2, 'Admin': 1})
+        self.assertEqual(resp.context['admin_count'], 1)
+
+        resp = self.client.get(self.url, {'type': 'S', 'q': 'd'})
+        self.assertEqual(self._names(resp), ['dan'])
+        self.assertIn('q=d', resp.context['roles'][2]['url'])
+
+
+    def test_search_ignores_case_and_counts_follow_it(self):
+        zoe = User.objects.create_user('Zoe', email='Carol@School.edu', password='pw')
+        Profile.objects.create(user=zoe)
+        resp = self.client.get(self.url, {'q': 'carol'})
+        self.assertEqual(self._names(resp), ['Zoe'])
+        resp = self.client.get(self.url, {'q': 'ZO'})
+        self.assertEqual(self._names(resp), ['Zoe'])
+
+        # the tabs count the current search; Zoe has no role
+        resp = self.client.get(self.url, {'q': 'CA'})
+        self.assertEqual(self._names(resp), ['Zoe', 'cara'])
+        counts = {r['label']: r['count'] for r in resp.context['roles']}
+        self.assertEqual(counts, {'All': 2, 'Student': 0, 'Faculty': 1, 'Admin': 0})
+        # the last-admin notice is about the whole system
+        self.assertEqual(resp.context['admin_count'], 1)
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.context['roles'][0]['count'], 7)
+
+    def test_search_keys_follow_user_changes(self):
+        eve = User.objects.get(username='eve')
+        eve.username, eve.email = 'Evelyn', 'EVE.L@school.edu'
+        eve.save()
+        resp = self.client.get(self.url, {'q': 'evel'})
+        self.assertEqual(self._names(resp), ['Evelyn'])
+        resp = self.client.get(self.url, {'q': 'eve.l@'})
+        self.assertEqual(self._names(resp), ['Evelyn'])
+        self.assertEqual(self._names(self.client.get(self.url, {'q': 'eve@'})), [])
+
+    def test_search_uses_profile_indexes(self):
+        from django.db import connection
+        from .views import search_users
+
+        query = search_users('ca')
+        sql, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('profile_username_key_idx', plan)
+        self.assertIn('profile_email_key_idx', plan)
+
+    def test_role_totals_are_cached(self):
+        from django.core.cache import cache
+        from .provisioning import ROLE_TOTALS_KEY
+
+        cache.delete(ROLE_TOTALS_KEY)
+        self.client.get(self.url)
+        with self.assertNumQueries(4):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.context['roles'][0]['count'], 6)
+        # a new profile clears them
+        Profile.objects.create(user=User.objects.create_user('fay', password='pw'), type='S')
+        resp = self.client.get(self.url, {'type': 'S'})
+        self.assertEqual({r['label']: r['count'] for r in resp.context['roles']}['Student'], 4)
+
+
+class BulkProvisioningTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('bulk_admin', email='bulk_admin@example.com', password='pw')
+        Profile.objects.create(user=self.admin, type='A')
+        self.client.force_login(self.admin)
+
+    def _csv(self, text):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_command(self):
+        path = self._csv(
+            'Username,Email,Full_Name,Type,Password\n'
+            'ann,ann@school.edu,Ann A,student,secret-1\n'
+            'fred,fred@school.edu,Fred F,F,\n'
+            'bulk_admin,other@example.com,,S,\n'
+            'bad name!,bad@school.edu,,S,\n'
+            'tom,tom@school.edu,,wizard,\n'
+            'ann,ann2@school.edu,,S,\n'
+            'weak,weak@school.edu,,S,12345\n'
+            'newbie,BULK_ADMIN@Example.com,,S,\n'
+        )
+        err = io.StringIO()
+        with self.assertNumQueries(6):
+            # per batch: usernames, emails, users, profiles; plus the savepoint pair
+            call_command('import_users', path, password='shared-pw', stdout=io.StringIO(), stderr=err)
+        ann, fred = User.objects.get(username='ann'), User.objects.get(username='fred')
+        self.assertEqual((ann.profile.type, ann.profile.full_name), ('S', 'Ann A'))
+        self.assertEqual(fred.profile.type, 'F')
+        self.assertFalse(User.objects.filter(username__in=['bad name!', 'tom']).exists())
+        self.assertEqual(User.objects.get(username='bulk_admin').email, 'bulk_admin@example.com')
+        # passwords go through AUTH_PASSWORD_VALIDATORS; emails match in any case
+        self.assertIn('Line 8: weak: This password is too short', err.getvalue())
+        self.assertIn('Skipped newbie', err.getvalue())
+        self.assertFalse(User.objects.filter(username__in=['weak', 'newbie']).exists())
+
+        # cheap import hash, replaced by the full-strength one at first login
+        self.assertIn('$1000$', ann.password)
+        self.assertTrue(self.client.login(username='ann', password='secret-1'))
+        ann.refresh_from_db()
+        self.assertNotIn('$1000$', ann.password)
+        self.assertTrue(self.client.login(username='fred', password='shared-pw'))
+
+    def test_import_page(self):
+        upload = SimpleUploadedFile('users.csv', '\ufeffusername,email\nzed,zed@school.edu\n'.encode('utf-8'))
+        resp = self.client.post(reverse('accounts:bulk_users'), {'action': 'import', 'csv_file': upload})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['result']['created'], ['zed'])
+        zed = User.objects.get(username='zed')
+        self.assertEqual(zed.profile.type, '')
+        self.assertFalse(zed.has_usable_password())
+
+    def test_role_change_keeps_last_admin(self):
+        second = User.objects.create_user('bulk_admin2', password='pw')
+        Profile.objects.create(user=second, type='A')
+        plain = User.objects.create_user('plain', password='pw')
+        ids = [self.admin.pk, second.pk, plain.pk]
+        # find users without a profile, create those, then a single UPDATE
+        with self.assertNumQueries(3):
+            changed = provisioning.set_role(ids, 'F')
+        # plain gets a profile; the first of the two admins stays an admin
+        self.assertEqual(changed, 2)
+        self.assertEqual(
+            dict(Profile.objects.values_list('user__username', 'type')),
+            {'bulk_admin': 'A', 'bulk_admin2': 'F', 'plain': 'F'},
+        )
+        # with another admin left outside the selection, all can be demoted
+        self.assertEqual(provisioning.set_role([second.pk], 'A'), 1)
+        self.assertEqual(provisioning.set_role([self.admin.pk], 'S'), 1)
+        self.assertEqual(Profile.objects.filter(type='A').count(), 1)
+
+    def test_inactive_admins_do_not_count(self):
+        inactive = User.objects.create_user('gone_admin', password='pw', is_active=False)
+        Profile.objects.create(user=inactive, type='A')
+        # the only active admin keeps the role, or nobody could reach the admin pages
+        self.assertEqual(provisioning.set_role([self.admin.pk], 'S'), 0)
+        self.assertEqual(Profile.objects.get(user=self.admin).type, 'A')
+        self.assertEqual(provisioning.set_role([self.admin.pk, inactive.pk], 'S'), 1)
+        self.assertEqual(Profile.objects.get(user=inactive).type, 'S')
+
+    def test_bulk_deactivate(self):
+        second = User.objects.create_user('bulk_admin2', password='pw')
+        Profile.objects.create(user=second, type='A')
+        students = provisioning.create_users([
+            {'username': f's{i}', 'email': f's{i}@school.edu', 'full_name': '', 'type': 'S', 'password': ''}
+            for i in range(3)
+        ])[0]
+        ids = list(User.objects.filter(username__in=students + ['bulk_admin2']).values_list('pk', flat=True))
+        self.assertEqual(provisioning.set_active(ids + [self.admin.pk], False), 4)
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+
+        # through the page, the requesting admin is never deactivated
+        next_url = reverse('accounts:manage_users') + '?type=S'
+        resp = self.client.post(reverse('accounts:bulk_users'), {
+            'action': 'deactivate', 'users': [self.admin.pk], 'next': next_url,
+        })
+        self.assertRedirects(resp, next_url)
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+
+        resp = self.client.post(reverse('accounts:bulk_users'), {
+            'action': 'role:F', 'users': ids, 'next': 'https://elsewhere.example/',
+        })
+        self.assertRedirects(resp, reverse('accounts:manage_users'))
+        self.assertEqual(Profile.objects.filter(type='F').count(), 4)
+        self.assertEqual(provisioning.set_active(ids, True), 4)
@@ -19,6 +19,7 @@ urlpatterns = [
     path('dashboard/', views.post_login_redirect, name='post_login'),
     # Admin user management
     path('manage/', views.manage_users, name='manage_users'),
+    path('manage/bulk/', views.bulk_users, name='bulk_users'),
     path('manage/<int:user_id>/', views.edit_user, name='edit_user'),
     path('manage/<int:user_id>/delete/', views.delete_user, name='delete_user'),
 ]
@@ -1,7 +1,9 @@
+import io
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
-from .forms import RegistrationForm, ProfileForm, UserForm
+from .forms import RegistrationForm, ProfileForm, UserForm, ImportUsersForm
 from .models import Profile, AccType
 from django.contrib.auth import get_user_model
 from django.contrib import messages
@@ -11,8 +13,14 @@ from django.contrib.auth import logout as auth_logout
 from django.conf import settings
 from django.views.decorators.http import require_http_methods
 from .decorators import require_role, forbid_role
+from . import provisioning
+from student_repo.database import read_only_db
+from projects import quota
 from projects.models import Project, Review, ProjectVersion
 from django.urls import reverse
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
 
 
 def register(request):
@@ -158,23 +166,29 @@ from django.shortcuts import render
 # Dashboards
 @login_required
 @require_role('S', message='Access denied: student dashboard only.')
+@read_only_db
 def student_dashboard(request):
     """Simple student dashboard. Only accessible to users with Profile.type == 'S'."""
     profile = getattr(request.user, 'profile', None)
     # compute simple project counts for the student overview
     try:
-        user_projects_qs = Project.objects.filter(owner=request.user, is_deleted=False)
+        user_projects_qs = Project.objects.filter(owner=request.user)
         total_submissions = user_projects_qs.count()
-        # determine pending by evaluating the Project.status property
-        pending_submissions = sum(1 for p in user_projects_qs if getattr(p, 'status', 'Pending') == 'Pending')
+        # count pending in SQL using the same rules as the Project.status property
+        pending_submissions = user_projects_qs.with_status().filter(computed_status='Pending').count()
     except Exception:
         total_submissions = 0
         pending_submissions = 0
+    # read from the running counter, never from the upload storage
+    storage_used = quota.usage(request.user)
+    storage_quota = None if quota.is_exempt(request.user) else quota.quota_bytes()
 
     context = {
         'profile': profile,
         'total_submissions': total_submissions,
         'pending_submissions': pending_submissions,
+        'storage_used': storage_used,
+        'storage_quota': storage_quota,
         'usecases': [
             'Accounts & profiles',
             'Project submission (student-facing)',
@@ -186,6 +200,7 @@ def student_dashboard(request):
 
 @login_required
 @require_role('F', message='Access denied: faculty dashboard only.')
+@read_only_db
 def faculty_dashboard(request):
     """Simple faculty dashboard. Accessible to users with Profile.type == 'F' or staff."""
     profile = getattr(request.user, 'profile', None)
@@ -208,7 +223,7 @@ def faculty_dashboard(request):
                 'owner': getattr(v.project.owner, 'username', '') if hasattr(v.project, 'owner') else v.project.owner,
                 'time': getattr(v, 'created_at', None),
                 # filename shown to faculty so they know what they'll download
-                'filename': (v.uploaded_file.name.split('/')[-1] if getattr(v, 'uploaded_file', None) and getattr(v.uploaded_file, 'name', None) else ''),
+                'filename': v.download_name,
             })
     except Exception:
         recent_submissions = []
@@ -219,7 +234,7 @@ def faculty_dashboard(request):
         'usecases': [
             'Review workflow',
             'Search and filter submissions',
-            'Notifications (placeholder)'
+            'Live notifications'
         ]
     }
     return render(request, 'accounts/dashboards/faculty_dashboard.html', context)
@@ -227,14 +242,14 @@ def faculty_dashboard(request):
 
 @login_required
 @require_role('A', message='Access denied: admin dashboard only.')
+@read_only_db
 def admin_dashboard(request):
     """Admin dashboard. Requires staff privileges or Profile.type == 'A'."""
     profile = getattr(request.user, 'profile', None)
     # compute counts for dashboard cards
     User = get_user_model()
     total_users = User.objects.count()
-    # exclude soft-deleted projects
-    total_projects = Project.objects.filter(is_deleted=False).count()
+    total_projects = Project.objects.count()
 
     # recent activity: combine recent users, projects, and reviews
     recent_activity = []
@@ -248,8 +263,8 @@ def admin_dashboard(request):
                 'message': f"New user: {u.username}",
             })
 
-        # recent projects (exclude soft-deleted)
-        recent_projects = Project.objects.filter(is_deleted=False).order_by('-created_at')[:5]
+        # recent projects
+        recent_projects = Project.objects.order_by('-created_at')[:5]
         for p in recent_projects:
             recent_activity.append({
                 'time': getattr(p, 'created_at', None),
@@ -287,15 +302,157 @@ def admin_dashboard(request):
 # Create your views here.
 
 
+def prefix_filter(field, prefix):
+    """Match values of ``field`` starting with ``prefix`` as an index range.
+
+    SQLite will not use an index for the ``LIKE ... ESCAPE`` that
+    ``__startswith`` produces, but it does for a plain range.
+    """
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+
+
+def search_users(q):
+    """pks of users whose username or email starts with ``q``, ignoring case.
+
+    Searches the lowercased copies on ``Profile``: a UNION of two ranges over
+    their indexes; with OR, SQLite would scan every profile.
+    """
+    q = q.lower()
+    return Profile.objects.filter(prefix_filter('username_key', q)).values('user_id').union(
+        Profile.objects.filter(prefix_filter('email_key', q)).values('user_id'),
+    )
+
+
 @login_required
 @require_role('A', message='Access denied: admin only.')
+@read_only_db
 def manage_users(request):
-    """List users for admin management."""
+    """List users for admin management, a page at a time.
+
+    Pages are keyset-paginated on username (``?after=``/``?before=``), so
+    every page costs the same however many accounts exist. ``q`` matches a
+    username or email prefix (ignoring case) and ``type`` filters by role.
+    """
     User = get_user_model()
-    users = User.objects.all().order_by('username')
-    # number of admin profiles (type 'A') to protect sole admin
-    admin_count = Profile.objects.filter(type='A').count()
-    return render(request, 'accounts/manage_users.html', {'users': users, 'admin_count': admin_count})
+    q = request.GET.get('q', '').strip()
+    role = request.GET.get('type', '')
+    if role not in AccType.values:
+        role = ''
+    after, before = request.GET.get('after', ''), request.GET.get('before', '')
+    size = getattr(settings, 'MANAGE_USERS_PAGE_SIZE', 50)
+
+    live_projects = (
+        Project.objects.filter(owner=OuterRef('pk')).order_by()
+        .values('owner').annotate(n=Count('pk')).values('n')
+    )
+    # profiles are joined in so the template's u.profile does not query per row
+    users = User.objects.select_related('profile', 'storage_usage').annotate(
+        project_count=Coalesce(Subquery(live_projects), Value(0)),
+    )
+    if q:
+        users = users.filter(pk__in=search_users(q))
+    if role:
+        users = users.filter(profile__type=role)
+    if before:
+        page = list(users.filter(username__lt=before).order_by('-username')[:size + 1])
+        has_prev, has_next = len(page) > size, True
+        page = page[:size][::-1]
+    else:
+        if after:
+            users = users.filter(username__gt=after)
+        page = list(users.order_by('username')[:size + 1])
+        has_prev, has_next = bool(after), len(page) > size
+        page = page[:size]
+
+    params = {k: v for k, v in (('q', q), ('type', role)) if v}
+    prev_url = next_url = None
+    if page and has_prev:
+        prev_url = '?' + urlencode(dict(params, before=page[0].username))
+    if page and has_next:
+        next_url = '?' + urlencode(dict(params, after=page[-1].username))
+    # the tabs count the current search, reading only the matching profiles,
+    # or else the cached totals; users without a role count under "All" only
+    totals = provisioning.role_totals()
+    if q:
+        role_counts = dict(
+            Profile.objects.filter(user_id__in=search_users(q)).order_by()
+            .values_list('type').annotate(n=Count('pk'))
+        )
+        role_counts['all'] = sum(role_counts.values())
+    else:
+        role_counts = totals
+    search = {'q': q} if q else {}
+    roles = [{'value': '', 'label': 'All', 'count': role_counts['all'], 'url': '?' + urlencode(search)}]
+    roles += [
+        {'value': t.value, 'label': t.label, 'count': role_counts.get(t.value, 0),
+         'url': '?' + urlencode(dict(search, type=t.value))}
+        for t in AccType
+    ]
+    return render(request, 'accounts/manage_users.html', {
+        'users': page,
+        'q': q,
+        'role': role,
+        'roles': roles,
+        'prev_url': prev_url,
+        'next_url': next_url,
+        # number of admin profiles (type 'A') to protect sole admin
+        'admin_count': totals.get(AccType.ADMIN, 0),
+        'storage_quota': quota.quota_bytes(),
+    })
+
+
+
+@login_required
+@require_role('A', message='Access denied: admin only.')
+def bulk_users(request):
+    """Import accounts from a CSV file, or change the role or status of the
+    users ticked on the user list. Admin-only.
+
+    Imports go through ``bulk_create`` and each change is one UPDATE (see
+    ``accounts.provisioning``), so thousands of accounts take seconds.
+    """
+    form = ImportUsersForm()
+    result = None
+    if request.method == 'POST':
+        action = request.POST.get('action', '')
+        if action == 'import':
+            form = ImportUsersForm(request.POST, request.FILES)
+            if form.is_valid():
+                # utf-8-sig drops the BOM spreadsheet programs write
+                lines = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+                try:
+                    rows, errors = provisioning.read_csv(lines)
+                except UnicodeDecodeError:
+                    rows, errors = [], [(0, 'The file is not UTF-8 text.')]
+                created, skipped = provisioning.create_users(rows, form.cleaned_data['password'] or None)
+                result = {'created': created, 'skipped': skipped, 'errors': errors}
+                if created:
+                    messages.success(request, f'Created {len(created)} user{"s" if len(created) != 1 else ""}.')
+        else:
+            user_ids = [int(pk) for pk in request.POST.getlist('users') if pk.isdigit()]
+            target = request.POST.get('next', '')
+            if not url_has_allowed_host_and_scheme(target, allowed_hosts={request.get_host()}):
+                target = reverse('accounts:manage_users')
+            if not user_ids:
+                messages.error(request, 'Select at least one user.')
+            elif action.startswith('role:') and action[5:] in AccType.values:
+                changed = provisioning.set_role(user_ids, action[5:])
+                messages.success(request, f'Changed the role of {changed} user{"s" if changed != 1 else ""}.')
+            elif action in ('activate', 'deactivate'):
+                if action == 'deactivate' and request.user.pk in user_ids:
+                    # never lock the requesting admin out
+                    user_ids.remove(request.user.pk)
+                    messages.error(request, 'You cannot deactivate your own account.')
+                changed = provisioning.set_active(user_ids, action == 'activate')
+                messages.success(request, f'{action.capitalize()}d {changed} user{"s" if changed != 1 else ""}.')
+            else:
+                messages.error(request, 'Unknown action.')
+            return redirect(target)
+    return render(request, 'accounts/bulk_users.html', {
+        'form': form,
+        'result': result,
+        'columns': provisioning.COLUMNS,
+    })
 
 
 @login_required
@@ -0,0 +1,35 @@
+"""Batched loading of related rows for a page of API results."""
+
+
+class DataLoader:
+    """Collect keys, then load the values for all of them with one call.
+
+    ``batch_fn(keys)`` returns ``{key: value}``; keys missing from it load as
+    ``default``. Keys are queued with :meth:`prime` while a page is read and
+    fetched together by :meth:`dispatch` (or the first :meth:`load` of a key
+    not loaded yet), so a page costs one query per relation however many
+    rows it has. Loaded values are cached for the loader's lifetime.
+    """
+
+    def __init__(self, batch_fn, default=None):
+        self.batch_fn = batch_fn
+        self.default = default
+        self._pending = set()
+        self._cache = {}
+
+    def prime(self, keys):
+        self._pending.update(key for key in keys if key not in self._cache)
+
+    def dispatch(self):
+        if not self._pending:
+            return
+        keys, self._pending = self._pending, set()
+        found = self.batch_fn(list(keys))
+        for key in keys:
+            self._cache[key] = found.get(key, self.default)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending.add(key)
+            self.dispatch()
+        return self._cache[key]
@@ -0,0 +1,147 @@
+"""The resources the API exposes, their fields, and who may read them.
+
+The role rules are the HTML views' (see accounts.decorators): staff and
+faculty read every live project with its versions and reviews, students
+only their own, and the user list is for admins.
+"""
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from accounts.decorators import is_staff_or_type
+from projects.models import Project, ProjectVersion, Review
+
+from .loaders import DataLoader
+
+
+class Resource:
+    """One API collection.
+
+    ``fields`` maps each public field name to the ``values()`` lookup it is
+    read from, or to ``(lookups, func)`` for a value computed from several.
+    ``rows(user, names)`` returns the queryset ``user`` may read (None if
+    the resource is not theirs to read at all). ``includes`` maps a
+    relation name to ``(resource, lookup)``: the related resource and its
+    lookup holding this resource's id.
+    """
+
+    def __init__(self, name, fields, rows, includes=None):
+        self.name = name
+        self.fields = fields
+        self.rows = rows
+        self.includes = includes or {}
+
+    def lookups(self, names):
+        columns = {'id'}
+        for name in names:
+            spec = self.fields[name]
+            columns.update(spec[0] if isinstance(spec, tuple) else [spec])
+        return sorted(columns)
+
+    def serialize(self, row, names):
+        item = {}
+        for name in names:
+            spec = self.fields[name]
+            if isinstance(spec, tuple):
+                lookups, func = spec
+                item[name] = func(*(row[lookup] for lookup in lookups))
+            else:
+                item[name] = row[spec]
+        return item
+
+    def loader(self, user, lookup, names):
+        """A DataLoader of serialized rows, grouped by their ``lookup`` value."""
+        columns = sorted(set(self.lookups(names)) | {lookup})
+
+        def batch(keys):
+            grouped = {}
+            for row in self.rows(user, names).filter(**{f'{lookup}__in': keys}).values(*columns):
+                grouped.setdefault(row[lookup], []).append(self.serialize(row, names))
+            return grouped
+        return DataLoader(batch, default=[])
+
+
+def visible_projects(user):
+    if is_staff_or_type(user, 'F'):
+        return Project.objects.all()
+    return Project.objects.filter(owner=user)
+
+
+def _projects(user, names):
+    projects = visible_projects(user).order_by()
+    # the status subqueries only run when asked for
+    return projects.with_status() if 'status' in names else projects
+
+
+def _versions(user, names):
+    return ProjectVersion.objects.filter(project__in=visible_projects(user).values('pk'))
+
+
+def _reviews(user, names):
+    return Review.objects.filter(project__in=visible_projects(user).values('pk'))
+
+
+def _users(user, names):
+    if not is_staff_or_type(user, 'A'):
+        return None
+    return get_user_model().objects.all()
+
+
+def _download_url(pk, project_id, file_present):
+    return reverse('projects:download_version', args=[project_id, pk]) if file_present else None
+
+
+DECISIONS = dict(Review.DECISION_CHOICES)
+
+VERSIONS = Resource('versions', {
+    'id': 'id',
+    'project': 'project_id',
+    'version_number': 'version_number',
+    'title': 'title_snapshot',
+    'description': 'description_snapshot',
+    'filename': 'original_filename',
+    'size': 'file_size',
+    'content_type': 'content_type',
+    'sha256': 'sha256',
+    'created_at': 'created_at',
+    'download_url': (('id', 'project_id', 'file_present'), _download_url),
+}, _versions)
+
+REVIEWS = Resource('reviews', {
+    'id': 'id',
+    'project': 'project_id',
+    'version': 'version_id',
+    'reviewer': 'reviewer_id',
+    'reviewer_username': 'reviewer__username',
+    'decision': (('decision',), DECISIONS.get),
+    'feedback': 'feedback',
+    'created_at': 'created_at',
+}, _reviews)
+
+PROJECTS = Resource('projects', {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'owner': 'owner_id',
+    'owner_username': 'owner__username',
+    'status': 'computed_status',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'url': (('id',), lambda pk: reverse('projects:project_detail', args=[pk])),
+}, _projects, includes={
+    'versions': (VERSIONS, 'project_id'),
+    'reviews': (REVIEWS, 'project_id'),
+})
+
+USERS = Resource('users', {
+    'id': 'id',
+    'username': 'username',
+    'email': 'email',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'type': 'profile__type',
+    'is_staff': 'is_staff',
+    'is_active': 'is_active',
+    'date_joined': 'date_joined',
+    'last_login': 'last_login',
+    'storage_used': (('storage_usage__bytes_used',), lambda used: used or 0),
+}, _users)
@@ -0,0 +1,107 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Profile
+from projects.models import Project, ProjectVersion, Review
+from .loaders import DataLoader
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('api_student', password='pw')
+        Profile.objects.create(user=cls.student, type='S')
+        cls.other = User.objects.create_user('api_other', password='pw')
+        Profile.objects.create(user=cls.other, type='S')
+        cls.faculty = User.objects.create_user('api_faculty', password='pw')
+        Profile.objects.create(user=cls.faculty, type='F')
+        cls.admin = User.objects.create_user('api_admin', password='pw', is_staff=True)
+        Profile.objects.create(user=cls.admin, type='A')
+        cls.projects = []
+        for i in range(5):
+            owner = cls.student if i % 2 == 0 else cls.other
+            proj = Project.objects.create(owner=owner, title=f'API {i}', description='d')
+            for n in (1, 2):
+                ProjectVersion.objects.create(project=proj, version_number=n)
+            Review.objects.create(project=proj, reviewer=cls.faculty, decision=Review.DECISION_APPROVED)
+            cls.projects.append(proj)
+        cls.projects[-1].soft_delete()
+
+    def _get(self, name, user, **params):
+        self.client.force_login(user)
+        resp = self.client.get(reverse(f'api:{name}'), params)
+        body = b''.join(resp.streaming_content) if resp.streaming else resp.content
+        return resp.status_code, json.loads(body)
+
+    def test_role_rules(self):
+        status, body = self._get('projects', self.faculty)
+        self.assertEqual(status, 200)
+        self.assertEqual([p['id'] for p in body['data']], [p.pk for p in self.projects[:4]])
+        status, body = self._get('projects', self.student)
+        self.assertEqual({p['owner'] for p in body['data']}, {self.student.pk})
+        status, body = self._get('reviews', self.student)
+        self.assertEqual({r['project'] for r in body['data']}, {self.projects[0].pk, self.projects[2].pk})
+
+        self.assertEqual(self._get('users', self.faculty)[0], 404)
+        status, body = self._get('users', self.admin)
+        self.assertEqual(len(body['data']), 4)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api:projects')).status_code, 401)
+
+    def test_sparse_fields_and_includes(self):
+        status, body = self._get('projects', self.faculty, fields='id,status', include='versions,reviews',
+                                 **{'fields[versions]': 'version_number'})
+        first = body['data'][0]
+        self.assertEqual(set(first), {'id', 'status', 'versions', 'reviews'})
+        self.assertEqual(first['status'], 'Approved')
+        self.assertEqual(first['versions'], [{'version_number': 2}, {'version_number': 1}])
+        self.assertEqual(first['reviews'][0]['decision'], 'Approved')
+
+        self.assertEqual(self._get('projects', self.faculty, fields='id,secret')[0], 400)
+        self.assertEqual(self._get('versions', self.faculty, include='reviews')[0], 400)
+
+    def test_cursor_pagination(self):
+        seen, params = [], {'limit': 3, 'fields': 'id'}
+        while True:
+            status, body = self._get('versions', self.faculty, **params)
+            self.assertEqual(status, 200)
+            seen += [v['id'] for v in body['data']]
+            if body['next'] is None:
+                break
+            params['cursor'] = body['next']
+        live = ProjectVersion.objects.filter(project__in=self.projects[:4]).order_by('pk')
+        self.assertEqual(seen, list(live.values_list('pk', flat=True)))
+        self.assertEqual(self._get('versions', self.faculty, cursor='!!')[0], 400)
+
+    def test_includes_cost_one_query_each(self):
+        self.client.force_login(self.faculty)
+        url = reverse('api:projects')
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(url, {'limit': 2})
+        with CaptureQueriesContext(connection) as included:
+            self.client.get(url, {'include': 'versions,reviews'})
+        self.assertEqual(len(included), len(plain) + 2)
+
+
+class DataLoaderTests(TestCase):
+    def test_batches_and_caches(self):
+        calls = []
+
+        def batch(keys):
+            calls.append(sorted(keys))
+            return {key: key * 10 for key in keys if key != 3}
+
+        loader = DataLoader(batch, default=0)
+        loader.prime([1, 2, 3])
+        self.assertEqual(loader.load(2), 20)
+        self.assertEqual(loader.load(3), 0)
+        self.assertEqual(loader.load(1), 10)
+        self.assertEqual(loader.load(4), 40)
+        self.assertEqual(calls, [[1, 2, 3], [4]])
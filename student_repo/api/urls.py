@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('projects/', views.projects, name='projects'),
+    path('versions/', views.versions, name='versions'),
+    path('reviews/', views.reviews, name='reviews'),
+    path('users/', views.users, name='users'),
+]
@@ -0,0 +1,140 @@
+"""Read-only JSON API, version 1.
+
+``GET /api/v1/<resource>/`` lists a resource in id order, one page at a
+time. Query parameters:
+
+- ``fields=a,b``: only these fields; ``fields[<include>]=`` does the same
+  for included rows
+- ``include=versions,reviews``: embed each project's related rows
+- ``limit``: page size, at most ``API_MAX_PAGE_SIZE``
+- ``cursor``: the ``next`` cursor of the previous page
+
+Pages are keyset-paginated on the primary key, so the last page of a large
+table costs what the first one does. Each page and each included relation
+is one query, made before the response starts; the JSON is then written
+out row by row.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from student_repo.database import read_only_db
+from . import resources
+
+# rows serialized per chunk of the streamed response
+STREAM_CHUNK = 100
+
+
+class ApiError(Exception):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    try:
+        return int(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiError('Invalid cursor.')
+
+
+def _limit(request):
+    default = getattr(settings, 'API_PAGE_SIZE', 100)
+    value = request.GET.get('limit', '')
+    if not value:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        raise ApiError('limit must be a positive integer.')
+    return min(int(value), getattr(settings, 'API_MAX_PAGE_SIZE', 1000))
+
+
+def _field_names(request, resource, param='fields'):
+    value = request.GET.get(param)
+    if value is None:
+        return list(resource.fields)
+    names = [name for name in value.split(',') if name]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown {resource.name} field(s): {', '.join(unknown)}.")
+    return names or ['id']
+
+
+def _includes(request, resource):
+    names = [name for name in request.GET.get('include', '').split(',') if name]
+    unknown = [name for name in names if name not in resource.includes]
+    if unknown:
+        raise ApiError(f"Cannot include {', '.join(unknown)} with {resource.name}.")
+    return names
+
+
+def _stream(resource, rows, names, loaders, next_cursor):
+    yield '{"data":['
+    for start in range(0, len(rows), STREAM_CHUNK):
+        items = []
+        for row in rows[start:start + STREAM_CHUNK]:
+            item = resource.serialize(row, names)
+            for relation, loader in loaders.items():
+                item[relation] = loader.load(row['id'])
+            items.append(json.dumps(item, cls=DjangoJSONEncoder))
+        yield (',' if start else '') + ','.join(items)
+    yield '],"next":' + json.dumps(next_cursor) + '}'
+
+
+def resource_view(resource):
+    """Build the list view for ``resource``."""
+    @require_safe
+    @read_only_db
+    def view(request):
+        user = request.user
+        if not user.is_authenticated:
+            return _error('Authentication required.', status=401)
+        try:
+            names = _field_names(request, resource)
+            includes = {
+                relation: _field_names(request, resource.includes[relation][0], f'fields[{relation}]')
+                for relation in _includes(request, resource)
+            }
+            limit = _limit(request)
+            cursor = request.GET.get('cursor', '')
+            after = decode_cursor(cursor) if cursor else 0
+        except ApiError as exc:
+            return _error(str(exc))
+
+        queryset = resource.rows(user, names)
+        if queryset is None:
+            return _error('Not found.', status=404)
+        # `id > 0` on the first page too, so every page is a primary key range
+        rows = list(queryset.filter(pk__gt=after).order_by('pk').values(*resource.lookups(names))[:limit + 1])
+        next_cursor = encode_cursor(rows[limit - 1]['id']) if len(rows) > limit else None
+        rows = rows[:limit]
+
+        loaders = {}
+        for relation, child_names in includes.items():
+            child, lookup = resource.includes[relation]
+            loaders[relation] = loader = child.loader(user, lookup, child_names)
+            loader.prime(row['id'] for row in rows)
+            loader.dispatch()
+
+        return StreamingHttpResponse(
+            _stream(resource, rows, names, loaders, next_cursor),
+            content_type='application/json',
+        )
+    view.__name__ = view.__qualname__ = f'{resource.name}_list'
+    return view
+
+
+projects = resource_view(resources.PROJECTS)
+versions = resource_view(resources.VERSIONS)
+reviews = resource_view(resources.REVIEWS)
+users = resource_view(resources.USERS)
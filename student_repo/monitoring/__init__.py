@@ -0,0 +1 @@
+# monitoring app package
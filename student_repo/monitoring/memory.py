@@ -0,0 +1,169 @@
+"""Sampled per-request memory high-water tracking.
+
+``MemoryMiddleware`` traces a fraction (``MEMORY_SAMPLE_RATE``) of requests
+with :mod:`tracemalloc`. For each one it records the peak traced memory in
+the ``memory_peak_bytes`` histogram and the allocation sites holding the most
+memory, attributed to the innermost frame in project code so ``list(qs)`` in
+a view shows up rather than Django's model constructor. Requests peaking
+above ``MEMORY_BUDGET_BYTES`` are counted and logged with those sites.
+
+tracemalloc is process wide and slows allocations down considerably, so it
+only runs while a sampled request is in flight, one request at a time; with
+threaded workers the figures also include whatever other threads allocate
+meanwhile.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('monitoring.memory')
+
+_THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# traceback depth kept per allocation, enough to reach project code from the ORM
+FRAMES = 25
+
+metrics.histogram('memory_peak_bytes', 'Peak traced memory of sampled requests.', metrics.BYTES_BUCKETS)
+metrics.counter('memory_over_budget_total', 'Sampled requests whose peak exceeded MEMORY_BUDGET_BYTES.')
+
+_trace_lock = threading.Lock()
+_lock = threading.Lock()
+# view -> {'samples', 'max_peak', 'total_peak', 'path', 'sites'}; sites are
+# those of the request with the highest peak
+_views = {}
+
+current_tracker = contextvars.ContextVar('current_memory_tracker', default=None)
+
+
+def sample_rate():
+    return getattr(settings, 'MEMORY_SAMPLE_RATE', 0.0)
+
+
+def budget():
+    return getattr(settings, 'MEMORY_BUDGET_BYTES', 64 * 1024 * 1024)
+
+
+def _site(traceback):
+    """Label a traceback by its innermost frame in project code."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback):
+        filename = frame.filename
+        if (
+            filename.startswith(base)
+            and not filename.startswith(_THIS_DIR)
+            and os.sep + 'site-packages' + os.sep not in filename
+        ):
+            return f'{os.path.relpath(filename, base)}:{frame.lineno}'
+    frame = traceback[-1]
+    return f'{frame.filename}:{frame.lineno}'
+
+
+class MemoryTracker:
+    """Trace allocations between :meth:`start` and :meth:`stop`.
+
+    :meth:`checkpoint` keeps a snapshot whenever traced memory is higher than
+    at the previous one; it is called after the outermost template render,
+    while the view's context is still alive, which is usually the peak.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.snapshot_size = 0
+
+    def start(self):
+        tracemalloc.start(FRAMES)
+
+    def checkpoint(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.snapshot_size:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_size = current
+
+    def stop(self, top=10):
+        """Stop tracing and return ``(peak_bytes, [(site, bytes, blocks), ...])``."""
+        try:
+            self.checkpoint()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        sizes, counts = Counter(), Counter()
+        snapshot = self.snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        for stat in snapshot.statistics('traceback'):
+            site = _site(stat.traceback)
+            sizes[site] += stat.size
+            counts[site] += stat.count
+        return peak, [(site, size, counts[site]) for site, size in sizes.most_common(top)]
+
+
+def checkpoint():
+    tracker = current_tracker.get()
+    if tracker is not None:
+        tracker.checkpoint()
+
+
+def should_sample():
+    rate = sample_rate()
+    return bool(rate) and random.random() < rate
+
+
+def track_request(request, get_response):
+    """Run ``get_response`` under tracemalloc unless another request is traced."""
+    if tracemalloc.is_tracing() or not _trace_lock.acquire(blocking=False):
+        return get_response(request)
+    tracker = MemoryTracker()
+    token = current_tracker.set(tracker)
+    try:
+        tracker.start()
+        try:
+            response = get_response(request)
+        finally:
+            peak, sites = tracker.stop(top=getattr(settings, 'MEMORY_TOP_SITES', 10))
+    finally:
+        current_tracker.reset(token)
+        _trace_lock.release()
+
+    from .middleware import view_label
+    record(view_label(request), request.get_full_path(), peak, sites)
+    return response
+
+
+def record(view, path, peak, sites):
+    metrics.observe('memory_peak_bytes', peak, view=view)
+    with _lock:
+        stats = _views.setdefault(view, {'view': view, 'samples': 0, 'max_peak': 0, 'total_peak': 0})
+        stats['samples'] += 1
+        stats['total_peak'] += peak
+        if peak >= stats['max_peak']:
+            stats.update(max_peak=peak, path=path, sites=sites)
+    if peak > budget():
+        metrics.inc('memory_over_budget_total', view=view)
+        logger.warning(
+            'memory budget exceeded: peak=%d bytes budget=%d view=%s path=%s top sites: %s',
+            peak, budget(), view, path,
+            '; '.join(f'{site} {size} B in {count} blocks' for site, size, count in sites),
+        )
+
+
+def view_stats():
+    """Per-view stats sorted by the highest peak first."""
+    with _lock:
+        rows = [dict(s) for s in _views.values()]
+    for row in rows:
+        row['mean_peak'] = row['total_peak'] // row['samples']
+    return sorted(rows, key=lambda r: r['max_peak'], reverse=True)
+
+
+def reset():
+    with _lock:
+        _views.clear()
@@ -0,0 +1,320 @@
+"""Process-safe counters and histograms with Prometheus text exposition.
+
+Each worker process keeps its samples in memory and periodically writes a
+snapshot to ``METRICS_DIR/metrics_<pid>_<start>.json`` (write to a temp file,
+then ``os.replace``, so readers never see a partial file). Scraping merges the
+snapshots of every process, which is the same model ``prometheus_client``
+uses in multiprocess mode, without adding the dependency.
+
+Snapshots of processes that have exited are folded into one
+``dead.json`` file and removed, so the directory does not grow with every
+restart and counters never go backwards. The start time in the file name
+keeps a process that reuses an old pid from overwriting its predecessor's
+snapshot.
+"""
+import atexit
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+PREFIX = 'studentrepo_'
+
+# Default bucket upper bounds per unit
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+# name -> (type, help, buckets)
+_definitions = {}
+# name -> {labels_key: sample}; a histogram sample is
+# {'buckets': [...], 'sum': float, 'count': int} and a counter sample is a float
+_samples = {}
+_lock = threading.Lock()
+_last_flush = 0.0
+# (pid, snapshot file name) of this process; recomputed after a fork
+_identity = (None, None)
+
+SNAPSHOT_RE = re.compile(r'metrics_(\d+)(?:_\d+)?\.json$')
+DEAD_FILE = 'dead.json'
+LOCK_FILE = '.fold.lock'
+# a fold lock older than this was left by a crashed process
+STALE_LOCK_SECONDS = 60
+
+
+def metrics_dir():
+    return str(getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'student_repo_metrics')))
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0)
+
+
+def histogram(name, help_text, buckets=TIME_BUCKETS):
+    _definitions[name] = ('histogram', help_text, tuple(buckets))
+
+
+def counter(name, help_text):
+    _definitions[name] = ('counter', help_text, ())
+
+
+def _key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Record ``value`` in histogram ``name``."""
+    _, _, buckets = _definitions[name]
+    with _lock:
+        series = _samples.setdefault(name, {})
+        sample = series.get(_key(labels))
+        if sample is None:
+            sample = series[_key(labels)] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                sample['buckets'][i] += 1
+        sample['sum'] += value
+        sample['count'] += 1
+    _maybe_flush()
+
+
+def inc(name, amount=1, **labels):
+    """Increment counter ``name``."""
+    with _lock:
+        series = _samples.setdefault(name, {})
+        key = _key(labels)
+        series[key] = series.get(key, 0) + amount
+    _maybe_flush()
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= flush_interval():
+        flush()
+
+
+def _snapshot_name():
+    """This process's snapshot file name; a new process (even one reusing a
+    pid) gets a new name."""
+    global _identity
+    pid = os.getpid()
+    if _identity[0] != pid:
+        _identity = (pid, f'metrics_{pid}_{time.time_ns()}.json')
+        # any other snapshot under our pid belongs to a process that is gone
+        directory = metrics_dir()
+        try:
+            _fold(directory, [n for n in _snapshot_names(directory) if SNAPSHOT_RE.match(n).group(1) == str(pid)])
+        except OSError:
+            pass
+    return _identity[1]
+
+
+def flush():
+    """Write this process's samples to the shared metrics directory."""
+    global _last_flush
+    directory = metrics_dir()
+    own = _snapshot_name()
+    with _lock:
+        payload = json.dumps(_samples)
+        _last_flush = time.monotonic()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(payload)
+        os.replace(tmp, os.path.join(directory, own))
+    except OSError:
+        # metrics must never break a request
+        pass
+
+
+atexit.register(flush)
+
+
+def _merge_into(merged, samples):
+    for name, series in samples.items():
+        if name not in _definitions:
+            continue
+        kind = _definitions[name][0]
+        target = merged.setdefault(name, {})
+        for key, sample in series.items():
+            if kind == 'counter':
+                target[key] = target.get(key, 0) + sample
+                continue
+            current = target.get(key)
+            if current is None or len(current['buckets']) != len(sample['buckets']):
+                target[key] = {'buckets': list(sample['buckets']), 'sum': sample['sum'], 'count': sample['count']}
+            else:
+                current['buckets'] = [a + b for a, b in zip(current['buckets'], sample['buckets'])]
+                current['sum'] += sample['sum']
+                current['count'] += sample['count']
+
+
+def _snapshot_names(directory):
+    try:
+        return [n for n in os.listdir(directory) if SNAPSHOT_RE.match(n)]
+    except OSError:
+        return []
+
+
+def _is_running(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; assume running
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g. EPERM: it exists but belongs to someone else
+        return True
+    return True
+
+
+def _read_dead(directory):
+    try:
+        with open(os.path.join(directory, DEAD_FILE)) as fh:
+            data = json.load(fh)
+        return data['samples'], set(data['folded'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}, set()
+
+
+def _fold(directory, names):
+    """Merge the snapshots ``names`` of exited processes into ``dead.json``
+    and remove them.
+
+    ``dead.json`` records which snapshots it already holds, so a crash
+    between writing it and removing them never counts one twice. Only one
+    process folds at a time; the others skip it and leave it for a later
+    scrape.
+    """
+    if not names:
+        return
+    lock = os.path.join(directory, LOCK_FILE)
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+                os.remove(lock)
+        except OSError:
+            pass
+        return
+    os.close(fd)
+    try:
+        samples, folded = _read_dead(directory)
+        # forget snapshots that were folded and removed earlier
+        existing = set(_snapshot_names(directory))
+        folded &= existing
+        for name in names:
+            if name in folded:
+                continue
+            try:
+                with open(os.path.join(directory, name)) as fh:
+                    snapshot = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            _merge_into(samples, snapshot)
+            folded.add(name)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'samples': samples, 'folded': sorted(folded)}, fh)
+        os.replace(tmp, os.path.join(directory, DEAD_FILE))
+        for name in folded:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    finally:
+        os.remove(lock)
+
+
+def _read_snapshots(directory, own):
+    """Merge ``dead.json`` and the other live snapshots; None when a snapshot
+    was folded away while reading, since it may be missing from both."""
+    merged = {}
+    samples, folded = _read_dead(directory)
+    _merge_into(merged, samples)
+    for name in _snapshot_names(directory):
+        if name == own or name in folded:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                _merge_into(merged, json.load(fh))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            continue
+    return merged
+
+
+def collect():
+    """Return the samples of every process merged together."""
+    own = _snapshot_name()
+    directory = metrics_dir()
+    names = [n for n in _snapshot_names(directory) if n != own]
+    dead = [n for n in names if not _is_running(int(SNAPSHOT_RE.match(n).group(1)))]
+    try:
+        _fold(directory, dead)
+    except OSError:
+        pass
+    for _ in range(3):
+        merged = _read_snapshots(directory, own)
+        if merged is not None:
+            break
+    else:
+        merged = {}
+    with _lock:
+        _merge_into(merged, json.loads(json.dumps(_samples)))
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs, extra=None):
+    items = [f'{k}="{_escape(v)}"' for k, v in pairs]
+    if extra:
+        items.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def _fmt(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format (0.0.4)."""
+    merged = collect()
+    lines = []
+    for name in sorted(_definitions):
+        kind, help_text, buckets = _definitions[name]
+        full = PREFIX + name
+        lines.append(f'# HELP {full} {help_text}')
+        lines.append(f'# TYPE {full} {kind}')
+        for key, sample in sorted(merged.get(name, {}).items()):
+            pairs = json.loads(key)
+            if kind == 'counter':
+                lines.append(f'{full}{_labels(pairs)} {_fmt(sample)}')
+                continue
+            # bucket counts are stored cumulatively already (value <= bound)
+            for bound, count in zip(buckets, sample['buckets']):
+                lines.append(f'{full}_bucket{_labels(pairs, ("le", _fmt(float(bound))))} {count}')
+            lines.append(f'{full}_bucket{_labels(pairs, ("le", "+Inf"))} {sample["count"]}')
+            lines.append(f'{full}_sum{_labels(pairs)} {_fmt(float(sample["sum"]))}')
+            lines.append(f'{full}_count{_labels(pairs)} {sample["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forget this process's in-memory samples (used by tests)."""
+    with _lock:
+        _samples.clear()
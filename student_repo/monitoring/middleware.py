@@ -0,0 +1,177 @@
+import contextvars
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.db import connections
+
+from . import memory, metrics, profiler
+from .slowlog import QueryRecorder
+
+metrics.histogram('request_duration_seconds', 'Total time spent handling the request.')
+metrics.histogram('db_duration_seconds', 'Time spent executing SQL per request.')
+metrics.histogram('db_queries', 'Number of SQL queries per request.', metrics.COUNT_BUCKETS)
+metrics.histogram('template_render_seconds', 'Time spent rendering templates per request.')
+metrics.histogram('response_size_bytes', 'Size of the response body.', metrics.BYTES_BUCKETS)
+metrics.counter('requests_total', 'Requests handled, by view, method and status.')
+
+
+class RequestTimings:
+    """Per-request accumulators filled in by the DB wrapper and template timer."""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+
+def install_template_timer():
+    """Wrap the Django template backend's render() to time it per request.
+
+    Only the outermost render is counted so included or nested templates are
+    not double counted. Lazy ORM queries run from templates are counted in
+    both the template and the db timings.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_timed', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, *args, **kwargs):
+        timings = current_timings.get()
+        if timings is None:
+            return original(self, *args, **kwargs)
+        timings._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            timings._template_depth -= 1
+            if timings._template_depth == 0:
+                timings.template_time += time.perf_counter() - start
+                # the view's context is still referenced here, so this is
+                # usually the request's memory high-water mark
+                memory.checkpoint()
+
+    render._timed = True
+    Template.render = render
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+def response_size(response):
+    if response.streaming:
+        try:
+            return int(response.get('Content-Length', 0))
+        except ValueError:
+            return 0
+    return len(response.content)
+
+
+class PerformanceMiddleware:
+    """Record total, DB and template time, query count and response size.
+
+    Per-request values are sent back in a ``Server-Timing`` header, and
+    aggregates go into histograms labelled by URL name (see ``/metrics``).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - start
+
+        size = response_size(response)
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries"',
+            f'tpl;dur={timings.template_time * 1000:.1f}',
+        ])
+
+        view = view_label(request)
+        metrics.observe('request_duration_seconds', total, view=view)
+        metrics.observe('db_duration_seconds', timings.db_time, view=view)
+        metrics.observe('db_queries', timings.db_queries, view=view)
+        metrics.observe('template_render_seconds', timings.template_time, view=view)
+        metrics.observe('response_size_bytes', size, view=view)
+        metrics.inc('requests_total', view=view, method=request.method, status=str(response.status_code))
+        return response
+
+
+class SlowQueryMiddleware:
+    """Feed every query into the fingerprint table and log slow ones.
+
+    See ``monitoring.slowlog``; threshold is ``SLOW_QUERY_THRESHOLD_MS``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(request)
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """Profile single requests on demand (``?_profile=1`` or ``X-Profile: 1``).
+
+    Admins only; must come after ``AuthenticationMiddleware``. See
+    ``monitoring.profiler``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiler.requested(request):
+            return self.get_response(request)
+        return profiler.profile_request(request, self.get_response)
+
+
+class MemoryMiddleware:
+    """Trace peak memory for a sample of requests (``MEMORY_SAMPLE_RATE``).
+
+    See ``monitoring.memory``; disabled while the rate is 0.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not memory.should_sample():
+            return self.get_response(request)
+        return memory.track_request(request, self.get_response)
+
@@ -0,0 +1,204 @@
+"""On-demand per-request profiler for admins.
+
+A request from an admin (staff or Profile.type 'A') carrying ``?_profile=1``
+or an ``X-Profile: 1`` header is run under a sampling profiler and cProfile.
+The sampler is a background thread that reads the request thread's stack
+from ``sys._current_frames()`` every ``PROFILE_SAMPLE_INTERVAL_MS``; unlike a
+SIGPROF timer it also works when requests are served from worker threads.
+
+Each run is stored in ``PROFILE_DIR`` as three files sharing an id:
+
+* ``<id>.collapsed`` - folded stacks, one ``frame;frame;... count`` per line,
+  ready for flamegraph.pl or https://www.speedscope.app
+* ``<id>.txt`` - the cProfile summary sorted by cumulative time
+* ``<id>.json`` - request metadata shown on the admin page
+
+Only the newest ``PROFILE_KEEP`` runs are kept.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+
+from accounts.decorators import is_staff_or_type
+
+# timestamp first so ids sort chronologically
+PROFILE_ID = re.compile(r'^\d{8}-\d{6}-\d{6}-[0-9a-f]{6}$')
+KINDS = ('collapsed', 'txt')
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'student_repo_profiles')))
+
+
+def requested(request):
+    """True when an admin asked for this request to be profiled."""
+    flag = request.GET.get('_profile') or request.headers.get('X-Profile')
+    if not flag or flag == '0':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and is_staff_or_type(user, 'A'))
+
+
+@lru_cache(maxsize=4096)
+def _location(filename):
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        return os.path.relpath(filename, base)
+    for marker in ('site-packages' + os.sep, 'lib' + os.sep + 'python'):
+        idx = filename.rfind(marker)
+        if idx != -1:
+            return filename[idx + len(marker):]
+    return os.path.basename(filename)
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f'{code.co_name} ({_location(code.co_filename)}:{code.co_firstlineno})'.replace(';', ','))
+        frame = frame.f_back
+    parts.reverse()
+    return ';'.join(parts)
+
+
+class StackSampler(threading.Thread):
+    """Count the stacks of one thread at a fixed interval until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def profile_request(request, get_response):
+    """Run ``get_response`` under both profilers and store the result."""
+    interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL_MS', 2) / 1000.0
+    sampler = StackSampler(threading.get_ident(), interval)
+    profile = cProfile.Profile()
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        profile.enable()
+    except ValueError:
+        # another profiler (e.g. a debugger or coverage) already owns the hook
+        profile = None
+    try:
+        # a streaming body is not consumed here: it may be a large download
+        # or an endless (possibly async) event stream, so only the view runs
+        # under the profilers
+        response = get_response(request)
+    finally:
+        if profile is not None:
+            profile.disable()
+        duration = time.perf_counter() - start
+        sampler.stop()
+
+    from .middleware import view_label
+    profile_id = save(
+        sampler.stacks,
+        profile,
+        {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view_label(request),
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'duration_ms': round(duration * 1000, 1),
+            'samples': sampler.samples,
+            'interval_ms': interval * 1000,
+        },
+    )
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def save(stacks, profile, meta):
+    """Write one profile run to the store and prune old ones; return its id."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = datetime.now().strftime('%Y%m%d-%H%M%S-%f') + '-' + uuid.uuid4().hex[:6]
+    meta = dict(meta, id=profile_id, created=time.time())
+
+    summary = io.StringIO()
+    if profile is None:
+        summary.write('cProfile was unavailable for this request.\n')
+    else:
+        pstats.Stats(profile, stream=summary).strip_dirs().sort_stats('cumulative').print_stats(60)
+
+    base = os.path.join(directory, profile_id)
+    with open(base + '.collapsed', 'w') as fh:
+        for stack, count in stacks.most_common():
+            fh.write(f'{stack} {count}\n')
+    with open(base + '.txt', 'w') as fh:
+        fh.write(summary.getvalue())
+    # metadata last: a run is listed only once all its files exist
+    with open(base + '.json', 'w') as fh:
+        json.dump(meta, fh)
+    prune()
+    return profile_id
+
+
+def _ids():
+    try:
+        names = os.listdir(profile_dir())
+    except OSError:
+        return []
+    return sorted((n[:-5] for n in names if n.endswith('.json') and PROFILE_ID.match(n[:-5])), reverse=True)
+
+
+def prune(keep=None):
+    keep = getattr(settings, 'PROFILE_KEEP', 50) if keep is None else keep
+    for profile_id in _ids()[keep:]:
+        for ext in ('json',) + KINDS:
+            try:
+                os.remove(os.path.join(profile_dir(), f'{profile_id}.{ext}'))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """Metadata of stored runs, newest first."""
+    runs = []
+    for profile_id in _ids():
+        try:
+            with open(os.path.join(profile_dir(), profile_id + '.json')) as fh:
+                runs.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return runs
+
+
+def profile_path(profile_id, kind):
+    """Path of a stored profile file, or None for unknown ids and kinds."""
+    if kind not in KINDS or not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(profile_dir(), f'{profile_id}.{kind}')
+    return path if os.path.exists(path) else None
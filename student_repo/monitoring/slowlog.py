@@ -0,0 +1,168 @@
+"""Slow-query log and query fingerprint table.
+
+:class:`QueryRecorder` is installed with ``connection.execute_wrapper`` for
+every request (see ``SlowQueryMiddleware``). Every query is folded into an
+in-memory table of normalised fingerprints (count, total and max time) so
+repeated patterns such as an N+1 stand out. Queries slower than
+``SLOW_QUERY_THRESHOLD_MS`` are also logged, together with their parameters,
+the resolved view and the template line or Python frame that issued them.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger('monitoring.slow_queries')
+
+_DJANGO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__import__('django').__file__)))
+_THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+# fingerprint -> stats, least recently seen first
+_fingerprints = OrderedDict()
+_recent_slow = deque(maxlen=100)
+
+
+def threshold():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000.0
+
+
+def max_fingerprints():
+    return getattr(settings, 'SLOW_QUERY_FINGERPRINTS', 500)
+
+
+_IN_LIST = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalise SQL so queries differing only in literals share a key."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _origin():
+    """Return (template, python_frame) describing who issued the query.
+
+    ``template`` is "name:line" of the innermost template node being rendered,
+    ``python_frame`` the innermost frame in project code (outside Django and
+    this module).
+    """
+    template = python_frame = None
+    frame = sys._getframe(2)
+    while frame is not None and (template is None or python_frame is None):
+        code = frame.f_code
+        filename = code.co_filename
+        if template is None and code.co_name == 'render_annotated':
+            # Node.render_annotated(self, context): the parser stamps every
+            # node with the origin and token it was compiled from
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = f'{origin.template_name or origin.name}:{token.lineno}'
+        elif (
+            python_frame is None
+            and not filename.startswith(_DJANGO_DIR)
+            and not filename.startswith(_THIS_DIR)
+            and filename.startswith(str(settings.BASE_DIR))
+        ):
+            python_frame = f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return template, python_frame
+
+
+def record(sql, duration, view):
+    key = fingerprint(sql)
+    with _lock:
+        stats = _fingerprints.pop(key, None)
+        if stats is None:
+            stats = {'fingerprint': key, 'count': 0, 'total': 0.0, 'max': 0.0, 'views': set()}
+        stats['count'] += 1
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+        if len(stats['views']) < 10:
+            stats['views'].add(view)
+        _fingerprints[key] = stats
+        while len(_fingerprints) > max_fingerprints():
+            _fingerprints.popitem(last=False)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook feeding the fingerprint table and slow log.
+
+    The view is looked up per query because URL resolution happens after the
+    middleware installs the wrapper.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def view(self):
+        from .middleware import view_label
+        return view_label(self.request)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            view = self.view
+            record(sql, duration, view)
+            if duration >= threshold():
+                self.log_slow(sql, params, duration, view)
+
+    def log_slow(self, sql, params, duration, view):
+        template, python_frame = _origin()
+        entry = {
+            'time': time.time(),
+            'duration_ms': round(duration * 1000, 2),
+            'sql': sql,
+            'params': repr(params)[:500],
+            'view': view,
+            'template': template,
+            'frame': python_frame,
+        }
+        with _lock:
+            _recent_slow.append(entry)
+        logger.warning(
+            'slow query %.1fms view=%s template=%s frame=%s sql=%s params=%s',
+            entry['duration_ms'], view, template, python_frame, sql, entry['params'],
+        )
+
+
+def top_fingerprints(order_by='total', limit=50):
+    """Return fingerprint stats sorted descending by ``total``, ``count``, ``max`` or ``avg``."""
+    with _lock:
+        rows = [dict(s, views=sorted(s['views'])) for s in _fingerprints.values()]
+    for row in rows:
+        row['avg'] = row['total'] / row['count'] if row['count'] else 0.0
+        for key in ('total', 'max', 'avg'):
+            row[f'{key}_ms'] = row[key] * 1000
+    rows.sort(key=lambda r: r.get(order_by, r['total']), reverse=True)
+    return rows[:limit]
+
+
+def recent_slow_queries():
+    with _lock:
+        return list(reversed(_recent_slow))
+
+
+def reset():
+    with _lock:
+        _fingerprints.clear()
+        _recent_slow.clear()
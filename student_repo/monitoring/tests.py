@@ -0,0 +1,236 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import Profile
+from . import memory, metrics, profiler, slowlog
+
+User = get_user_model()
+
+
+class PerformanceMetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp(prefix='metrics-test-')
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        override = override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN='s3cret')
+        override.enable()
+        self.addCleanup(override.disable)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+        self.admin = User.objects.create_user('metrics_admin', password='pw')
+        Profile.objects.create(user=self.admin, type='A')
+        self.student = User.objects.create_user('metrics_student', password='pw')
+        Profile.objects.create(user=self.student, type='S')
+
+    def test_server_timing_header(self):
+        self.client.login(username='metrics_student', password='pw')
+        resp = self.client.get(reverse('projects:my_projects'))
+        self.assertEqual(resp.status_code, 200)
+        timing = resp['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.client.login(username='metrics_student', password='pw')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.client.logout()
+        resp = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_metrics_exposition_merges_worker_files(self):
+        self.client.login(username='metrics_student', password='pw')
+        self.client.get(reverse('projects:my_projects'))
+        # pretend another worker process already recorded two requests
+        with open(os.path.join(self.metrics_dir, 'metrics_999999.json'), 'w') as fh:
+            json.dump({'requests_total': {json.dumps([['method', 'GET'], ['status', '200'], ['view', 'projects:my_projects']]): 2}}, fh)
+
+        self.client.login(username='metrics_admin', password='pw')
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp.status_code, 200)
+        body = resp.content.decode()
+        self.assertIn('# TYPE studentrepo_request_duration_seconds histogram', body)
+        self.assertIn('studentrepo_request_duration_seconds_count{view="projects:my_projects"} 1', body)
+        self.assertIn('studentrepo_requests_total{method="GET",status="200",view="projects:my_projects"} 3', body)
+
+
+    @unittest.skipIf(os.name == 'nt', 'exited processes are not detected on Windows')
+    def test_exited_worker_snapshots_are_folded(self):
+        key = json.dumps([['method', 'GET'], ['status', '200'], ['view', 'home']])
+
+        def exited_worker(count):
+            proc = subprocess.Popen([sys.executable, '-c', ''])
+            proc.wait()
+            name = f'metrics_{proc.pid}_1.json'
+            with open(os.path.join(self.metrics_dir, name), 'w') as fh:
+                json.dump({'requests_total': {key: count}}, fh)
+            return name
+
+        first = exited_worker(2)
+        self.assertEqual(metrics.collect()['requests_total'][key], 2)
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, first)))
+        self.assertTrue(os.path.exists(os.path.join(self.metrics_dir, metrics.DEAD_FILE)))
+        # totals keep growing as more workers exit
+        second = exited_worker(1)
+        self.assertEqual(metrics.collect()['requests_total'][key], 3)
+        self.assertEqual(metrics.collect()['requests_total'][key], 3)
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, second)))
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        slowlog.reset()
+        self.addCleanup(slowlog.reset)
+        self.admin = User.objects.create_user('slow_admin', password='pw')
+        Profile.objects.create(user=self.admin, type='A')
+        self.student = User.objects.create_user('slow_student', password='pw')
+        Profile.objects.create(user=self.student, type='S')
+
+    def test_fingerprint_normalises_literals(self):
+        a = slowlog.fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'bob'")
+        b = slowlog.fingerprint("SELECT  *  FROM t WHERE id = 7 AND name = 'it''s'")
+        self.assertEqual(a, b)
+        self.assertEqual(a, 'SELECT * FROM t WHERE id = ? AND name = ?')
+        self.assertEqual(
+            slowlog.fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s)'),
+            slowlog.fingerprint('SELECT 1 FROM t WHERE id IN (%s)'),
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_attributed_to_view_and_template(self):
+        from projects.models import Project
+        Project.objects.create(owner=self.student, title='Slow', description='d')
+        self.client.login(username='slow_student', password='pw')
+        with self.assertLogs('monitoring.slow_queries', level='WARNING'):
+            self.client.get(reverse('projects:my_projects'))
+
+        entries = slowlog.recent_slow_queries()
+        self.assertTrue(entries)
+        self.assertTrue(all(e['view'] == 'projects:my_projects' for e in entries if 'projects_project' in e['sql']))
+        # the lazy queryset is evaluated while rendering, so a template line is recorded
+        self.assertTrue(any((e['template'] or '').startswith('projects/my_projects.html:') for e in entries))
+        views = {v for row in slowlog.top_fingerprints() for v in row['views']}
+        self.assertIn('projects:my_projects', views)
+
+    def test_query_log_page_is_admin_only(self):
+        url = reverse('monitoring:slow_queries')
+        self.client.login(username='slow_student', password='pw')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username='slow_admin', password='pw')
+        resp = self.client.get(url + '?order=count')
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Query Fingerprints')
+        self.client.post(url)
+        self.assertEqual(slowlog.recent_slow_queries(), [])
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp(prefix='profiles-test-')
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        override = override_settings(PROFILE_DIR=self.profile_dir, PROFILE_KEEP=2)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = User.objects.create_user('prof_admin', password='pw', is_staff=True)
+        Profile.objects.create(user=self.admin, type='A')
+        self.student = User.objects.create_user('prof_student', password='pw')
+        Profile.objects.create(user=self.student, type='S')
+        from projects.models import Project
+        self.proj = Project.objects.create(owner=self.student, title='Profiled', description='d')
+
+    def test_admin_request_is_profiled(self):
+        self.client.login(username='prof_admin', password='pw')
+        url = reverse('projects:project_detail', args=[self.proj.pk])
+        resp = self.client.get(url + '?_profile=1')
+        self.assertEqual(resp.status_code, 200)
+        profile_id = resp['X-Profile-Id']
+
+        [run] = profiler.list_profiles()
+        self.assertEqual(run['id'], profile_id)
+        self.assertEqual(run['view'], 'projects:project_detail')
+        with open(profiler.profile_path(profile_id, 'txt')) as fh:
+            self.assertIn('cumulative', fh.read())
+        with open(profiler.profile_path(profile_id, 'collapsed')) as fh:
+            for line in fh:
+                stack, count = line.rsplit(' ', 1)
+                self.assertTrue(int(count) > 0 and stack)
+
+        page = self.client.get(reverse('monitoring:profiles'))
+        self.assertContains(page, profile_id)
+        summary = self.client.get(reverse('monitoring:profile_file', args=[profile_id, 'txt']))
+        self.assertEqual(summary.status_code, 200)
+        summary.close()
+
+    def test_streaming_body_is_not_consumed(self):
+        from itertools import count
+
+        from django.http import StreamingHttpResponse
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/events/?_profile=1')
+        request.user = self.admin
+        # an endless stream: reading it while profiling would never return
+        endless = (f'data: {i}\n\n' for i in count())
+        resp = profiler.profile_request(request, lambda r: StreamingHttpResponse(endless))
+        self.assertTrue(resp.streaming)
+        self.assertEqual(next(iter(resp.streaming_content)), b'data: 0\n\n')
+        [run] = profiler.list_profiles()
+        self.assertTrue(run['streaming'])
+
+    def test_non_admins_cannot_trigger_profiles(self):
+        self.client.login(username='prof_student', password='pw')
+        resp = self.client.get(reverse('projects:my_projects'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', resp)
+        self.assertEqual(profiler.list_profiles(), [])
+
+    def test_store_keeps_newest_runs(self):
+        self.client.login(username='prof_admin', password='pw')
+        ids = [
+            self.client.get(reverse('projects:my_projects'), HTTP_X_PROFILE='1')['X-Profile-Id']
+            for _ in range(3)
+        ]
+        self.assertEqual([r['id'] for r in profiler.list_profiles()], ids[:0:-1])
+        self.assertEqual(len(os.listdir(self.profile_dir)), 6)
+        self.assertIsNone(profiler.profile_path(ids[0], 'txt'))
+        self.assertIsNone(profiler.profile_path('../secret', 'txt'))
+
+
+class MemoryTrackingTests(TestCase):
+    def setUp(self):
+        memory.reset()
+        self.addCleanup(memory.reset)
+        self.admin = User.objects.create_user('mem_admin', password='pw', is_staff=True)
+        Profile.objects.create(user=self.admin, type='A')
+
+    @override_settings(MEMORY_SAMPLE_RATE=1.0, MEMORY_BUDGET_BYTES=1)
+    def test_sampled_request_records_peak_and_sites(self):
+        self.client.login(username='mem_admin', password='pw')
+        with self.assertLogs('monitoring.memory', level='WARNING') as logs:
+            resp = self.client.get(reverse('accounts:manage_users'))
+            page = self.client.get(reverse('monitoring:memory'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('view=accounts:manage_users', logs.output[0])
+
+        [stats] = [s for s in memory.view_stats() if s['view'] == 'accounts:manage_users']
+        self.assertEqual(stats['samples'], 1)
+        self.assertGreater(stats['max_peak'], 0)
+        self.assertTrue(stats['sites'])
+        self.assertIn('studentrepo_memory_over_budget_total{view="accounts:manage_users"}', metrics.render_prometheus())
+        self.assertContains(page, 'accounts:manage_users')
+
+    def test_sampling_is_off_by_default(self):
+        self.client.login(username='mem_admin', password='pw')
+        self.client.get(reverse('accounts:manage_users'))
+        self.assertEqual(memory.view_stats(), [])
+
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('queries/', views.slow_queries, name='slow_queries'),
+    path('memory/', views.memory_usage, name='memory'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<str:profile_id>.<str:kind>', views.profile_file, name='profile_file'),
+]
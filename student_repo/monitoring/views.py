@@ -0,0 +1,90 @@
+import hmac
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect, render
+
+from accounts.decorators import is_staff_or_type, require_role
+from . import memory, metrics, profiler, slowlog
+
+
+def _is_admin_or_scraper(request):
+    """Admins (staff or Profile.type 'A') or a scraper presenting METRICS_TOKEN."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    auth = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(auth, f'Bearer {token}'):
+        return True
+    return request.user.is_authenticated and is_staff_or_type(request.user, 'A')
+
+
+def metrics_view(request):
+    """Expose aggregated request metrics in the Prometheus text format."""
+    if not _is_admin_or_scraper(request):
+        raise Http404
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+SORT_OPTIONS = (('total', 'Total'), ('count', 'Count'), ('avg', 'Average'), ('max', 'Max'))
+
+
+@login_required
+@require_role('A', message='Access denied: admin only.')
+def slow_queries(request):
+    """Show this process's query fingerprints and the most recent slow queries."""
+    if request.method == 'POST':
+        slowlog.reset()
+        messages.success(request, 'Query statistics cleared.')
+        return redirect('monitoring:slow_queries')
+    order = request.GET.get('order', 'total')
+    if order not in dict(SORT_OPTIONS):
+        order = 'total'
+    return render(request, 'monitoring/slow_queries.html', {
+        'fingerprints': slowlog.top_fingerprints(order_by=order),
+        'recent': slowlog.recent_slow_queries(),
+        'order': order,
+        'sort_options': SORT_OPTIONS,
+        'threshold_ms': slowlog.threshold() * 1000,
+    })
+
+
+@login_required
+@require_role('A', message='Access denied: admin only.')
+def profiles(request):
+    """List stored request profiles, newest first."""
+    return render(request, 'monitoring/profiles.html', {
+        'profiles': profiler.list_profiles(),
+        'keep': getattr(settings, 'PROFILE_KEEP', 50),
+    })
+
+
+@login_required
+@require_role('A', message='Access denied: admin only.')
+def profile_file(request, profile_id, kind):
+    """Serve a stored profile's folded stacks or cProfile summary."""
+    path = profiler.profile_path(profile_id, kind)
+    if path is None:
+        raise Http404
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=kind == 'collapsed',
+        filename=f'{profile_id}.{kind}',
+        content_type='text/plain; charset=utf-8',
+    )
+
+
+@login_required
+@require_role('A', message='Access denied: admin only.')
+def memory_usage(request):
+    """Show per-view peak memory of sampled requests in this process."""
+    if request.method == 'POST':
+        memory.reset()
+        messages.success(request, 'Memory statistics cleared.')
+        return redirect('monitoring:memory')
+    return render(request, 'monitoring/memory.html', {
+        'views': memory.view_stats(),
+        'sample_rate': memory.sample_rate(),
+        'budget': memory.budget(),
+    })
+
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'kind', 'message', 'created_at', 'read_at')
+    list_filter = ('kind',)
+    raw_id_fields = ('recipient',)
@@ -0,0 +1,42 @@
+"""In-process wake-ups for notification streams.
+
+Each open stream registers an :class:`asyncio.Event` for its user.
+:func:`publish` sets the events of the given users from any thread, and the
+streams then read the new rows from the database. Only streams served by this
+process are woken; streams in other worker processes find the rows on their
+next periodic check (``NOTIFICATIONS_POLL_SECONDS``).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+# user id -> {(event loop, asyncio.Event)}
+_waiters = defaultdict(set)
+
+
+def subscribe(user_id):
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _lock:
+        _waiters[user_id].add(waiter)
+    return waiter
+
+
+def unsubscribe(user_id, waiter):
+    with _lock:
+        waiters = _waiters.get(user_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del _waiters[user_id]
+
+
+def publish(user_ids):
+    with _lock:
+        targets = [w for user_id in user_ids for w in _waiters.get(user_id, ())]
+    for loop, event in targets:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # the stream's loop has closed
+            pass
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import bus
+from .models import Notification, UnreadCount
+
+
+def notify(user_ids, kind, message, url=''):
+    """Create one notification per user and wake their open streams.
+
+    Streams are woken once the surrounding transaction commits, so they never
+    look for rows that are not visible yet.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    Notification.objects.bulk_create([
+        Notification(recipient_id=user_id, kind=kind, message=message[:255], url=url)
+        for user_id in user_ids
+    ])
+    UnreadCount.objects.bulk_create([UnreadCount(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+    UnreadCount.objects.filter(user_id__in=user_ids).update(count=F('count') + 1)
+    transaction.on_commit(lambda: bus.publish(user_ids))
+
+
+def mark_read(user, up_to=None):
+    """Mark the user's unread notifications (up to id ``up_to``) read."""
+    unread = Notification.objects.filter(recipient=user, read_at__isnull=True)
+    if up_to is not None:
+        unread = unread.filter(pk__lte=up_to)
+    with transaction.atomic():
+        marked = unread.update(read_at=timezone.now())
+        if marked:
+            # subtract rather than zero: notifications may arrive meanwhile
+            UnreadCount.objects.filter(user=user).update(count=F('count') - marked)
+    if marked:
+        transaction.on_commit(lambda: bus.publish([user.pk]))
+    return marked
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+
+class Notification(models.Model):
+    KIND_NEW_VERSION = 'version'
+    KIND_REVIEW = 'review'
+    KIND_CHOICES = [
+        (KIND_NEW_VERSION, 'New version uploaded'),
+        (KIND_REVIEW, 'Review posted'),
+    ]
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    message = models.CharField(max_length=255)
+    url = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-pk']
+        indexes = [
+            # streams fetch "newer than the last id sent" per recipient
+            models.Index(fields=['recipient', 'id'], name='notification_recipient_idx'),
+            models.Index(fields=['recipient'], condition=Q(read_at__isnull=True), name='notification_unread_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.recipient_id}: {self.message}"
+
+    def as_event(self):
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'message': self.message,
+            'url': self.url,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+class UnreadCount(models.Model):
+    """Running count of a user's unread notifications (see notifications.events)."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='unread_notifications')
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count} unread"
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from projects.models import ProjectVersion, Review
+from .events import notify
+from .models import Notification
+
+
+@receiver(post_save, sender=ProjectVersion)
+def notify_faculty_of_upload(sender, instance, created, raw=False, **kwargs):
+    # bulk_create (seeding) sends no signal, so only real uploads notify
+    if not created or raw:
+        return
+    project = instance.project
+    faculty = get_user_model().objects.filter(profile__type='F', is_active=True).values_list('pk', flat=True)
+    notify(
+        faculty,
+        Notification.KIND_NEW_VERSION,
+        f'{project.owner.username} uploaded version {instance.version_number} of "{project.title}".',
+        reverse('projects:project_detail', args=[project.pk]),
+    )
+
+
+@receiver(post_save, sender=Review)
+def notify_owner_of_review(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    project = instance.project
+    if project.owner_id == instance.reviewer_id:
+        return
+    notify(
+        [project.owner_id],
+        Notification.KIND_REVIEW,
+        f'{instance.reviewer.username} reviewed "{project.title}": {instance.get_decision_display()}.',
+        reverse('projects:project_detail', args=[project.pk]),
+    )
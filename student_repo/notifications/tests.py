@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import Profile
+from projects.models import Project, ProjectVersion, Review
+from . import bus
+from .events import notify
+from .models import Notification, UnreadCount
+
+User = get_user_model()
+
+
+def parse_events(body):
+    """(event, data) pairs from an SSE body, skipping comments and retry lines."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith((':', 'retry')))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user('notif_student', password='pw')
+        Profile.objects.create(user=self.student, type='S')
+        self.faculty = User.objects.create_user('notif_faculty', password='pw')
+        Profile.objects.create(user=self.faculty, type='F')
+        self.proj = Project.objects.create(owner=self.student, title='Notify', description='d')
+
+    def _unread(self, user):
+        return UnreadCount.objects.filter(user=user).values_list('count', flat=True).first() or 0
+
+    def test_upload_and_review_notify(self):
+        ProjectVersion.objects.create(project=self.proj, uploaded_file=SimpleUploadedFile('a.py', b'1'))
+        n = Notification.objects.get(recipient=self.faculty)
+        self.assertEqual(n.kind, Notification.KIND_NEW_VERSION)
+        self.assertIn('notif_student uploaded version 1 of "Notify"', n.message)
+        self.assertEqual(self._unread(self.faculty), 1)
+        self.assertFalse(Notification.objects.filter(recipient=self.student).exists())
+
+        Review.objects.create(project=self.proj, reviewer=self.faculty, decision=Review.DECISION_APPROVED)
+        n = Notification.objects.get(recipient=self.student)
+        self.assertEqual(n.kind, Notification.KIND_REVIEW)
+        self.assertIn('Approved', n.message)
+        self.assertEqual(self._unread(self.student), 1)
+
+    def test_stream_polls_under_wsgi(self):
+        notify([self.student.pk], Notification.KIND_REVIEW, 'first')
+        self.client.login(username='notif_student', password='pw')
+        url = reverse('notifications:stream')
+
+        resp = self.client.get(url)
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        body = resp.content.decode()
+        self.assertIn('retry: 15000', body)
+        # a fresh connection gets the count, not the history
+        self.assertEqual(parse_events(body), [('unread', {'unread': 1})])
+        last_id = Notification.objects.get().pk
+        self.assertIn(f'id: {last_id}\n', body)
+
+        notify([self.student.pk], Notification.KIND_REVIEW, 'second')
+        events = parse_events(self.client.get(url, HTTP_LAST_EVENT_ID=str(last_id)).content.decode())
+        self.assertEqual([e for e, _ in events], ['notification', 'unread'])
+        self.assertEqual(events[0][1]['message'], 'second')
+        self.assertEqual(events[1][1], {'unread': 2})
+
+    def test_mark_read(self):
+        notify([self.student.pk], Notification.KIND_REVIEW, 'one')
+        self.client.login(username='notif_student', password='pw')
+        resp = self.client.get(reverse('notifications:list'))
+        self.assertContains(resp, 'one')
+        last_id = resp.context['last_id']
+        notify([self.student.pk], Notification.KIND_REVIEW, 'arrived later')
+        self.client.post(reverse('notifications:list'), {'last_id': last_id})
+        self.assertEqual(self._unread(self.student), 1)
+        self.assertEqual(Notification.objects.filter(read_at__isnull=True).get().message, 'arrived later')
+
+
+@override_settings(NOTIFICATIONS_POLL_SECONDS=5, NOTIFICATIONS_STREAM_SECONDS=10)
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user('stream_student', password='pw')
+
+    def _notify(self, message):
+        # run the on_commit callback (bus.publish) the test transaction would hold back
+        with self.captureOnCommitCallbacks(execute=True):
+            notify([self.student.pk], Notification.KIND_REVIEW, message)
+
+    async def test_published_notification_is_pushed(self):
+        await self.async_client.aforce_login(self.student)
+        resp = await self.async_client.get(reverse('notifications:stream'))
+        content = resp.streaming_content
+        try:
+            first = await asyncio.wait_for(anext(content), 5)
+            self.assertEqual(parse_events(first.decode()), [('unread', {'unread': 0})])
+            self.assertEqual(len(bus._waiters[self.student.pk]), 1)
+
+            await sync_to_async(self._notify)('pushed')
+            events = parse_events((await asyncio.wait_for(anext(content), 5)).decode())
+        finally:
+            await content.aclose()
+        self.assertEqual(events[0][0], 'notification')
+        self.assertEqual(events[0][1]['message'], 'pushed')
+        self.assertEqual(events[1], ('unread', {'unread': 1}))
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+
+from . import bus
+from .events import mark_read
+from .models import Notification, UnreadCount
+
+# most notifications sent in one message batch
+BATCH = 50
+
+
+def _poll_seconds():
+    return getattr(settings, 'NOTIFICATIONS_POLL_SECONDS', 15)
+
+
+def _message(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_id', '')
+    return int(value) if value.isdigit() else None
+
+
+async def _pending(user, last_id):
+    """Messages for the notifications after ``last_id``, then the unread count.
+
+    Returns ``(messages, last_id, found_any)``. With no ``last_id`` (a fresh
+    connection) nothing is replayed; the stream starts at the newest id. The
+    unread message carries that id so a reconnecting client resumes there.
+    """
+    rows = []
+    if last_id is None:
+        last_id = await Notification.objects.filter(recipient=user).values_list('pk', flat=True).afirst() or 0
+    else:
+        rows = [n async for n in Notification.objects.filter(recipient=user, pk__gt=last_id).order_by('pk')[:BATCH]]
+        if rows:
+            last_id = rows[-1].pk
+    unread = await UnreadCount.objects.filter(user=user).values_list('count', flat=True).afirst() or 0
+    messages = [_message('notification', n.as_event(), n.pk) for n in rows]
+    messages.append(_message('unread', {'unread': unread}, last_id))
+    return messages, last_id, bool(rows)
+
+
+async def _stream(user, last_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'NOTIFICATIONS_STREAM_SECONDS', 300)
+    waiter = bus.subscribe(user.pk)
+    wake = waiter[1]
+    try:
+        messages, last_id, _ = await _pending(user, last_id)
+        # reconnect quickly once the server ends the stream
+        yield 'retry: 1000\n\n' + ''.join(messages)
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                await asyncio.wait_for(wake.wait(), min(_poll_seconds(), remaining))
+                woken = True
+            except asyncio.TimeoutError:
+                # nothing published here; rows written by other processes are
+                # only seen by checking the database
+                woken = False
+            wake.clear()
+            messages, last_id, found = await _pending(user, last_id)
+            yield ''.join(messages) if woken or found else ': keepalive\n\n'
+    finally:
+        bus.unsubscribe(user.pk, waiter)
+
+
+@login_required
+async def stream(request):
+    """Server-Sent Events: new notifications and the unread count, pushed live.
+
+    Under ASGI the response stays open for ``NOTIFICATIONS_STREAM_SECONDS``
+    and is woken through :mod:`notifications.bus`. A WSGI worker cannot hold
+    connections open cheaply, so there it answers with what is pending and
+    tells the EventSource to reconnect after ``NOTIFICATIONS_POLL_SECONDS``,
+    which turns the same endpoint into a poll.
+    """
+    user = await request.auser()
+    last_id = _last_event_id(request)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_stream(user, last_id), content_type='text/event-stream')
+    else:
+        messages, _, _ = await _pending(user, last_id)
+        response = HttpResponse(f'retry: {_poll_seconds() * 1000}\n\n' + ''.join(messages), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # stop proxies (nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def notification_list(request):
+    """Recent notifications for the current user; POST marks them all read."""
+    if request.method == 'POST':
+        # only what the page showed; newer notifications stay unread
+        up_to = request.POST.get('last_id', '')
+        mark_read(request.user, int(up_to) if up_to.isdigit() else None)
+        return redirect('notifications:list')
+    notifications = list(request.user.notifications.all()[:BATCH])
+    return render(request, 'notifications/list.html', {
+        'notifications': notifications,
+        'last_id': notifications[0].pk if notifications else 0,
+    })
@@ -1,20 +1,37 @@
 from django.contrib import admin
-from .models import Project, ProjectVersion, Review
+from .models import ArchivedProject, Project, ProjectVersion, Review
 
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
-    list_display = ('title', 'owner', 'created_at', 'updated_at')
+    list_display = ('title', 'owner', 'created_at', 'updated_at', 'is_deleted')
+    list_filter = ('is_deleted',)
     search_fields = ('title', 'description', 'owner__username')
 
+    def get_queryset(self, request):
+        # the default manager hides soft-deleted projects; admins see them all
+        return Project.all_objects.get_queryset()
+
 
 @admin.register(ProjectVersion)
 class ProjectVersionAdmin(admin.ModelAdmin):
-    list_display = ('project', 'version_number', 'created_at')
+    list_display = ('project', 'version_number', 'original_filename', 'file_size', 'file_present', 'is_archived', 'created_at')
+    list_filter = ('file_present', 'is_archived')
     raw_id_fields = ('project',)
+    readonly_fields = ('original_filename', 'file_size', 'content_type', 'sha256', 'file_present', 'pack_name', 'archived_at', 'restored_at')
     
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('project', 'reviewer', 'decision', 'created_at')
     list_filter = ('decision', 'created_at')
     search_fields = ('project__title', 'reviewer__username', 'feedback')
+
+
+@admin.register(ArchivedProject)
+class ArchivedProjectAdmin(admin.ModelAdmin):
+    list_display = ('title', 'project_id', 'owner_id', 'deleted_at', 'archived_at')
+    search_fields = ('title',)
+    readonly_fields = ('project_id', 'owner_id', 'title', 'deleted_at', 'archived_at', 'data')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,108 @@
+"""Reading the files inside uploaded project archives.
+
+Uploads are usually zip or tar archives of a student's project. Zip members
+are listed from the central directory without touching their data; tar
+archives (plain or compressed) are read in one forward pass, so they work
+on the non-seekable decoded stream of a compressed upload too. Any other
+upload is treated as an archive holding that one file.
+"""
+import os
+import tarfile
+import zipfile
+import zlib
+from contextlib import contextmanager, nullcontext
+
+from .compression import CHUNK_SIZE, open_decoded
+
+ZIP_TYPES = {'application/zip'}
+TAR_TYPES = {'application/x-tar', 'application/gzip', 'application/x-bzip2', 'application/x-xz'}
+
+# a NUL byte in the first block marks a file as binary
+SNIFF_TEXT = 8192
+
+
+class Member:
+    """One regular file in an upload.
+
+    ``crc`` is the zip CRC-32 when the listing carries one, else None.
+    ``open()`` returns a context manager for reading the file; for tar
+    archives it only works until the next member is reached.
+    """
+
+    def __init__(self, name, size, crc, open):
+        self.name = name
+        self.size = size
+        self.crc = crc
+        self.open = open
+
+    def read(self, limit=-1):
+        """At most ``limit`` bytes from the start of the file."""
+        with self.open() as src:
+            return src.read(limit)
+
+    def checksum(self):
+        """The listed CRC-32, or one computed by reading the file."""
+        if self.crc is not None:
+            return self.crc
+        crc = 0
+        with self.open() as src:
+            while chunk := src.read(CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+
+@contextmanager
+def open_upload(version):
+    """The version's original bytes, decoded from any storage compression."""
+    f = version.uploaded_file
+    with f.storage.open(f.name, 'rb') as fh:
+        yield open_decoded(fh, version.content_encoding)
+
+
+def _zip_members(reader):
+    with zipfile.ZipFile(reader) as zf:
+        for info in zf.infolist():
+            if not info.is_dir():
+                yield Member(info.filename, info.file_size, info.CRC, lambda info=info: zf.open(info))
+
+
+def _tar_members(reader):
+    with tarfile.open(fileobj=reader, mode='r|*') as tf:
+        for info in tf:
+            if info.isfile():
+                yield Member(info.name, info.size, None, lambda info=info: tf.extractfile(info))
+
+
+def iter_members(version):
+    """Yield a :class:`Member` for every regular file in the version's upload.
+
+    Raises OSError if the file is missing, and zipfile/tarfile errors for
+    archives that cannot be read.
+    """
+    if version.content_type in ZIP_TYPES:
+        with open_upload(version) as reader:
+            yield from _zip_members(reader)
+        return
+    if version.content_type in TAR_TYPES:
+        found = False
+        try:
+            with open_upload(version) as reader:
+                for member in _tar_members(reader):
+                    found = True
+                    yield member
+            return
+        except tarfile.ReadError:
+            # a compressed single file rather than a tarball
+            if found:
+                raise
+    # not an archive; the upload itself is the only member
+    name = version.original_filename or os.path.basename(version.uploaded_file.name)
+    with open_upload(version) as reader:
+        yield Member(name, version.file_size, None, lambda: nullcontext(reader))
+
+
+def as_text(data):
+    """Decode ``data`` as UTF-8 text, or return None if it looks binary."""
+    if b'\x00' in data[:SNIFF_TEXT]:
+        return None
+    return data.decode('utf-8', errors='replace')
@@ -0,0 +1,145 @@
+"""Reading stored upload files to (re)compute their ProjectVersion metadata.
+
+``manage.py scrub_uploads`` checks files from a thread pool;
+``manage.py backfill_uploads`` runs :func:`inspect_task` in worker processes
+for large corpora. Storage reads happen in the workers and both commands
+write the results with :func:`save_found` from the main process, so workers
+never open a database connection.
+
+Workers may be started by ``spawn`` (the default on Windows and macOS), in
+which case they begin without Django set up; :func:`init_worker` handles
+that.
+"""
+import hashlib
+import os
+import time
+from collections import Counter
+
+from .compression import CHUNK_SIZE, SUFFIXES, open_decoded
+from .uploads import SNIFF_BYTES, detect_content_type
+
+# settings a spawned worker copies from the command, so it reads the same
+# storage even when they were changed at runtime
+STORAGE_SETTINGS = ('MEDIA_ROOT', 'STORAGES')
+
+FIELDS = ['original_filename', 'file_size', 'content_type', 'sha256', 'file_present', 'stored_size']
+
+
+class Throttle:
+    """Keep reads in this process to ``rate`` bytes per second (0 is unlimited)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.total = 0
+
+    def __call__(self, nbytes):
+        if not self.rate:
+            return
+        self.total += nbytes
+        ahead = self.total / self.rate - (time.monotonic() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def inspect_file(storage, with_digest, name, encoding, throttle=None):
+    """Read what storage actually holds for ``name``.
+
+    Compressed files are decoded, since the recorded size, type and digest
+    describe the original upload. ``throttle`` is called with the size of
+    each chunk read.
+    """
+    try:
+        with storage.open(name, 'rb') as fh:
+            reader = open_decoded(fh, encoding)
+            found = {'file_present': True}
+            if with_digest:
+                hasher, head, size = hashlib.sha256(), b'', 0
+                for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    if len(head) < SNIFF_BYTES:
+                        head += chunk[:SNIFF_BYTES - len(head)]
+                    if throttle:
+                        throttle(len(chunk))
+                found.update(file_size=size, sha256=hasher.hexdigest())
+            else:
+                head = reader.read(SNIFF_BYTES)
+                if not encoding:
+                    found['file_size'] = storage.size(name)
+            if encoding:
+                found['stored_size'] = storage.size(name)
+    except (OSError, EOFError):
+        return {'file_present': False}
+    found['content_type'] = detect_content_type(head, name.removesuffix(SUFFIXES.get(encoding, '')))
+    return found
+
+
+def apply_found(version, found):
+    """Copy the values in ``found`` that differ onto ``version``; returns them."""
+    if not version.original_filename:
+        found['original_filename'] = version.uploaded_file.name.rsplit('/', 1)[-1][:255]
+    diffs = {f: value for f, value in found.items() if getattr(version, f) != value}
+    for field, value in diffs.items():
+        setattr(version, field, value)
+    return diffs
+
+
+def save_found(versions, batch_size=None):
+    """Write the ``FIELDS`` of ``versions`` in one transaction, charging any
+    change in ``file_size`` to the storage quota.
+
+    Legacy rows get their first ``file_size`` here, and deleting a version
+    releases its whole ``file_size``, so the counters must include it.
+    """
+    from django.db import transaction
+
+    from .models import Project, ProjectVersion
+    from .quota import charge
+
+    with transaction.atomic():
+        old = dict(ProjectVersion.objects.filter(pk__in=[v.pk for v in versions]).values_list('pk', 'file_size'))
+        ProjectVersion.objects.bulk_update(versions, FIELDS, batch_size=batch_size)
+        deltas = Counter()
+        for version in versions:
+            deltas[version.project_id] += (version.file_size or 0) - (old.get(version.pk) or 0)
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        owners = dict(Project.all_objects.filter(pk__in=deltas).values_list('pk', 'owner_id'))
+        for project_id, delta in deltas.items():
+            charge(project_id, owners.get(project_id), delta)
+
+
+# per-process state of backfill_uploads workers
+_worker = {}
+
+
+def storage_settings():
+    """The values of ``STORAGE_SETTINGS`` to hand to :func:`init_worker`."""
+    from django.conf import settings
+
+    return {name: getattr(settings, name) for name in STORAGE_SETTINGS}
+
+
+def init_worker(rate, niceness, storage=None):
+    """ProcessPoolExecutor initializer: set up Django if the process was
+    spawned, lower the priority and start the throttle."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        # a spawned interpreter; a forked one inherits the parent's state
+        django.setup()
+        if storage:
+            from django.test.utils import override_settings
+            override_settings(**storage).enable()
+    from .models import ProjectVersion
+
+    # os.nice does not exist on Windows
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+    _worker['storage'] = ProjectVersion._meta.get_field('uploaded_file').storage
+    _worker['throttle'] = Throttle(rate)
+
+
+def inspect_task(name, encoding):
+    return inspect_file(_worker['storage'], True, name, encoding, _worker['throttle'])
@@ -0,0 +1,21 @@
+"""Small statistics helpers shared by the benchmark commands."""
+import statistics
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+
+def summarize(latencies, percentiles=(50, 95)):
+    """Summarise a list of latencies in seconds as milliseconds."""
+    out = {'ops': len(latencies)}
+    for pct in percentiles:
+        out[f'p{pct}_ms'] = round(percentile(latencies, pct) * 1000, 3)
+    out['max_ms'] = round(max(latencies) * 1000, 3) if latencies else 0.0
+    out['mean_ms'] = round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0
+    return out
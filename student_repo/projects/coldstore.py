@@ -0,0 +1,124 @@
+"""Cold tier for old ProjectVersion files.
+
+``manage.py archive_versions`` packs files that match an age or superseded
+policy into zip pack files under ``COLD_STORAGE_ROOT``. The zip central
+directory is the pack's index. Each file is stored under its upload name,
+the row records which pack holds it, and the hot copy is removed.
+
+``download_version`` calls :func:`restore` for archived rows. It copies the
+member back into hot storage, so later downloads are ordinary reads. That
+restored copy acts as a cache: ``archive_versions --cache-days`` evicts it
+again once it is old enough, without rewriting the pack.
+"""
+import os
+import shutil
+import threading
+import uuid
+import zipfile
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .compression import CHUNK_SIZE, INCOMPRESSIBLE
+
+# restores of the same file wait for each other instead of copying it twice
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def cold_root():
+    return str(getattr(settings, 'COLD_STORAGE_ROOT', os.path.join(settings.BASE_DIR, 'cold_storage')))
+
+
+def pack_path(pack_name):
+    return os.path.join(cold_root(), pack_name)
+
+
+def _storage():
+    from .models import ProjectVersion
+    return ProjectVersion._meta.get_field('uploaded_file').storage
+
+
+def pack_members(pack_name):
+    """Names stored in a pack, or an empty set if the pack is unreadable."""
+    try:
+        with zipfile.ZipFile(pack_path(pack_name)) as zf:
+            return set(zf.namelist())
+    except (OSError, zipfile.BadZipFile):
+        return set()
+
+
+def write_pack(versions):
+    """Copy the hot files of ``versions`` into a new pack.
+
+    Returns ``(pack_name, packed)`` where ``packed`` lists the versions whose
+    file made it into the pack; versions whose file is missing are skipped.
+    The pack is written under a temporary name, fsynced, CRC-checked and only
+    then renamed into place.
+    """
+    storage = _storage()
+    root = cold_root()
+    os.makedirs(root, exist_ok=True)
+    pack_name = datetime.now().strftime('pack-%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6] + '.zip'
+    final = pack_path(pack_name)
+    tmp = final + '.tmp'
+    packed = []
+    try:
+        with zipfile.ZipFile(tmp, 'w', allowZip64=True) as zf:
+            for v in versions:
+                name = v.uploaded_file.name
+                info = zipfile.ZipInfo(name, date_time=v.created_at.timetuple()[:6])
+                # compressed uploads and archives would not shrink any further
+                if v.content_encoding or v.content_type in INCOMPRESSIBLE:
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                try:
+                    src = storage.open(name, 'rb')
+                except OSError:
+                    continue
+                size = v.stored_size or v.file_size or 0
+                with src, zf.open(info, 'w', force_zip64=size > 2 ** 31) as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                packed.append(v)
+        with open(tmp, 'rb+') as fh:
+            os.fsync(fh.fileno())
+        with zipfile.ZipFile(tmp) as zf:
+            bad = zf.testzip()
+        if bad is not None:
+            raise zipfile.BadZipFile(f'CRC mismatch for {bad} in {pack_name}')
+        os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return pack_name, packed
+
+
+def restore(version):
+    """Bring an archived version's file back into hot storage.
+
+    Returns False when the pack or member is missing. Only the first caller
+    copies the file; concurrent callers wait and then find it in place.
+    """
+    from .models import ProjectVersion
+
+    storage = _storage()
+    name = version.uploaded_file.name
+    with _locks[hash(name) % len(_locks)]:
+        if not storage.exists(name):
+            try:
+                with zipfile.ZipFile(pack_path(version.pack_name)) as zf, zf.open(name) as src:
+                    saved = storage.save(name, File(src, name=name))
+            except (OSError, KeyError, zipfile.BadZipFile, zlib.error):
+                return False
+            if saved != name:
+                # another process restored it first
+                storage.delete(saved)
+        now = timezone.now()
+        ProjectVersion.objects.filter(pk=version.pk).update(is_archived=False, restored_at=now)
+    version.is_archived = False
+    version.restored_at = now
+    return True
@@ -0,0 +1,109 @@
+"""Optional compression of stored upload files.
+
+With ``UPLOAD_COMPRESSION`` set to ``'gzip'`` or ``'zstd'`` (the latter
+needs the optional ``zstandard`` package and falls back to gzip without it),
+compressible uploads are written to storage compressed and the version
+records the encoding. Downloads send the stored bytes untouched with a
+``Content-Encoding`` header to clients that accept it, and decompress on the
+fly only for those that don't.
+"""
+import gzip
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+# formats that are compressed already; compressing them again wastes CPU
+INCOMPRESSIBLE = {
+    'application/zip', 'application/gzip', 'application/x-bzip2', 'application/x-xz',
+    'application/x-7z-compressed', 'application/vnd.rar', 'image/png', 'image/jpeg',
+}
+
+# files smaller than this are stored as they are
+MIN_SIZE = 1024
+# keep the compressed copy only if it is at most this fraction of the original
+MAX_RATIO = 0.9
+
+CHUNK_SIZE = 64 * 1024
+
+
+def configured_encoding():
+    encoding = getattr(settings, 'UPLOAD_COMPRESSION', '')
+    if encoding == 'zstd' and zstandard is None:
+        return 'gzip'
+    return encoding if encoding in SUFFIXES else ''
+
+
+def _compress(f, encoding):
+    out = tempfile.TemporaryFile()
+    if encoding == 'gzip':
+        writer = gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6, mtime=0)
+    else:
+        writer = zstandard.ZstdCompressor(level=10).stream_writer(out, closefd=False)
+    with writer:
+        for chunk in f.chunks():
+            writer.write(chunk)
+    f.seek(0)
+    size = out.tell()
+    out.seek(0)
+    return out, size
+
+
+def compress_for_storage(f, content_type, size):
+    """Return ``(file_to_store, content_encoding, stored_size)`` for upload ``f``."""
+    encoding = configured_encoding()
+    if not encoding or size < MIN_SIZE or content_type in INCOMPRESSIBLE:
+        return f, '', size
+    out, stored_size = _compress(f, encoding)
+    if stored_size > size * MAX_RATIO:
+        out.close()
+        return f, '', size
+    return File(out, name=f.name + SUFFIXES[encoding]), encoding, stored_size
+
+
+def open_decoded(fileobj, encoding):
+    """Wrap a stored file so reading it yields the original bytes."""
+    if not encoding:
+        return fileobj
+    if encoding == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured('The zstandard package is needed to read zstd-compressed uploads.')
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    raise ValueError(f'Unknown content encoding {encoding!r}')
+
+
+def iter_decoded(fileobj, encoding, chunk_size=CHUNK_SIZE):
+    """Yield the original bytes of a stored file, closing it when done."""
+    with fileobj, open_decoded(fileobj, encoding) as reader:
+        while chunk := reader.read(chunk_size):
+            yield chunk
+
+
+def accepts_encoding(request, encoding):
+    """True if the request's Accept-Encoding allows ``encoding`` (q > 0)."""
+    wildcard = False
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name == encoding:
+            return q > 0
+        if name == '*':
+            wildcard = q > 0
+    return wildcard
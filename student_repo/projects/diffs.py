@@ -0,0 +1,127 @@
+"""Differences between two uploaded versions of a project.
+
+Files are matched by their path inside the archive. A file whose CRC-32 is
+the same in both uploads counts as unchanged without being read: zip
+listings carry the CRC, and tar members are read once to compute it. Only
+files that were changed, added or removed are read again and diffed.
+
+Results are stored in ``VersionDiff`` under the pair of upload digests, so
+any two uploads are compared once and repeat views are a single lookup.
+"""
+import difflib
+import tarfile
+import zipfile
+from itertools import islice
+
+from django.conf import settings
+
+from .archives import as_text, iter_members
+from .coldstore import restore
+
+# lines of context around each change
+CONTEXT = 3
+
+UNREADABLE = (zipfile.BadZipFile, tarfile.TarError)
+
+
+def max_file_bytes():
+    return getattr(settings, 'DIFF_MAX_FILE_BYTES', 512 * 1024)
+
+
+def max_lines():
+    return getattr(settings, 'DIFF_MAX_LINES', 2000)
+
+
+def _listing(version):
+    """``{path: (size, crc)}`` for the files in a version's upload."""
+    try:
+        return {m.name: (m.size, m.checksum()) for m in iter_members(version)}
+    except UNREADABLE:
+        # a damaged archive is compared as one opaque file
+        return {version.download_name: (version.file_size, version.sha256)}
+
+
+def _read(version, names):
+    """``{path: text}`` for ``names``; None for binary or oversized files."""
+    limit, found = max_file_bytes(), {}
+    if not names:
+        return found
+    try:
+        for member in iter_members(version):
+            if member.name in names:
+                data = member.read(limit + 1)
+                found[member.name] = as_text(data) if len(data) <= limit else None
+    except UNREADABLE:
+        pass
+    return found
+
+
+def _diff_lines(before, after):
+    """``([kind, text], ...)`` rows of a unified diff and whether it was cut short."""
+    rows = []
+    diff = difflib.unified_diff(before.splitlines(), after.splitlines(), n=CONTEXT, lineterm='')
+    # the first two lines are the ---/+++ file headers
+    for line in islice(diff, 2, None):
+        if len(rows) >= max_lines():
+            return rows, True
+        kind = {'@': 'hunk', '+': 'add', '-': 'del'}.get(line[:1], 'ctx')
+        rows.append([kind, line if kind == 'hunk' else line[1:]])
+    return rows, False
+
+
+def compute_diff(old, new):
+    """Compare two versions' uploads; see :func:`version_diff` for the result."""
+    before, after = _listing(old), _listing(new)
+    changed = {name for name in before.keys() & after.keys() if before[name] != after[name]}
+    removed, added = before.keys() - after.keys(), after.keys() - before.keys()
+    old_text = _read(old, changed | removed)
+    new_text = _read(new, changed | added)
+
+    files = []
+    for name in sorted(changed | removed | added):
+        status = 'added' if name in added else 'removed' if name in removed else 'changed'
+        entry = {
+            'name': name,
+            'status': status,
+            'old_size': before.get(name, (None,))[0],
+            'new_size': after.get(name, (None,))[0],
+            'lines': None,
+            'truncated': False,
+        }
+        a = old_text.get(name) if name in before else ''
+        b = new_text.get(name) if name in after else ''
+        if a is not None and b is not None:
+            entry['lines'], entry['truncated'] = _diff_lines(a, b)
+        files.append(entry)
+    return {'files': files, 'unchanged': len(before.keys() & after.keys()) - len(changed)}
+
+
+def version_diff(old, new):
+    """What changed from version ``old`` to ``new``.
+
+    Returns ``{'files': [...], 'unchanged': count}``; each file has its
+    ``name``, ``status`` (added, removed or changed), sizes, and ``lines``
+    of ``[kind, text]`` diff rows, or None for binary and oversized files.
+    Raises OSError if a needed file cannot be read from storage.
+    """
+    from .models import VersionDiff
+
+    if old.sha256 and old.sha256 == new.sha256:
+        return {'files': [], 'unchanged': None}
+    cacheable = bool(old.sha256 and new.sha256)
+    if cacheable:
+        cached = (
+            VersionDiff.objects.filter(old_sha256=old.sha256, new_sha256=new.sha256)
+            .values_list('data', flat=True).first()
+        )
+        if cached is not None:
+            return cached
+    for version in (old, new):
+        if version.is_archived and not restore(version):
+            raise OSError(f'Version {version.pk} could not be restored')
+    data = compute_diff(old, new)
+    if cacheable:
+        VersionDiff.objects.bulk_create(
+            [VersionDiff(old_sha256=old.sha256, new_sha256=new.sha256, data=data)], ignore_conflicts=True,
+        )
+    return data
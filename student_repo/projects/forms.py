@@ -16,7 +16,15 @@ class ProjectVersionForm(forms.ModelForm):
         model = ProjectVersion
         fields = ['uploaded_file', 'title_snapshot', 'description_snapshot']
 
+    def __init__(self, *args, upload_error=None, **kwargs):
+        # upload_error: why the streaming upload handler dropped the file
+        # (see projects.uploads), reported as an error on uploaded_file
+        super().__init__(*args, **kwargs)
+        self.upload_error = upload_error
+
     def clean_uploaded_file(self):
+        if self.upload_error:
+            raise ValidationError(self.upload_error)
         f = self.cleaned_data.get('uploaded_file')
         if not f:
             return f
@@ -0,0 +1,125 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from projects.coldstore import pack_members, pack_path, write_pack
+from projects.models import ProjectVersion
+
+FIELDS = ['pk', 'uploaded_file', 'created_at', 'content_type', 'content_encoding', 'file_size', 'stored_size', 'pack_name']
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the files of old project versions to the cold tier: pack them into '
+        'compressed zip packs under COLD_STORAGE_ROOT, mark the rows archived and '
+        'remove the hot copies. Downloads restore archived files on first access; '
+        'restored copies are evicted again after --cache-days.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='DAYS', help='archive versions uploaded more than DAYS days ago')
+        parser.add_argument('--superseded', action='store_true', help="archive versions that are not their project's latest")
+        parser.add_argument('--cache-days', type=int, default=30, help='keep restored files hot for this many days')
+        parser.add_argument('--pack-size', type=int, default=512, metavar='MB', help='start a new pack after this many megabytes')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='report what would be archived without changing anything')
+
+    def handle(self, *args, **options):
+        if options['older_than'] is None and not options['superseded']:
+            raise CommandError('Give --older-than DAYS, --superseded, or both.')
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        self.storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        self.stats = Counter()
+        now = timezone.now()
+
+        versions = (
+            ProjectVersion.objects.filter(file_present=True, is_archived=False)
+            .exclude(uploaded_file__isnull=True).exclude(uploaded_file='')
+            # restored files stay hot for a while after their last restore
+            .exclude(restored_at__gte=now - timedelta(days=options['cache_days']))
+        )
+        if options['older_than'] is not None:
+            versions = versions.filter(created_at__lt=now - timedelta(days=options['older_than']))
+        if options['superseded']:
+            newer = ProjectVersion.objects.filter(project=OuterRef('project'), version_number__gt=OuterRef('version_number'))
+            versions = versions.filter(Exists(newer))
+        versions = versions.only(*FIELDS).order_by('pk')
+
+        limit = options['pack_size'] * 1024 * 1024
+        members = {}
+        pending, pending_bytes, last = [], 0, 0
+        # keyset batches rather than a cursor, since the loop updates the same table
+        while batch := list(versions.filter(pk__gt=last)[:options['batch_size']]):
+            last = batch[-1].pk
+            evict = []
+            for v in batch:
+                if v.pack_name:
+                    if v.pack_name not in members:
+                        members[v.pack_name] = pack_members(v.pack_name)
+                    if v.uploaded_file.name in members[v.pack_name]:
+                        # restored copy whose pack still holds it: just drop the hot file
+                        evict.append(v)
+                        continue
+                pending.append(v)
+                pending_bytes += v.stored_size or v.file_size or 0
+                if pending_bytes >= limit:
+                    self._pack(pending)
+                    pending, pending_bytes = [], 0
+            if evict:
+                self._archive(evict)
+                self.stats['evicted'] += len(evict)
+        if pending:
+            self._pack(pending)
+
+        stats = self.stats
+        verb = 'Would pack' if self.dry_run else 'Packed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['packed']} files into {stats['packs']} packs; "
+            f"evicted {stats['evicted']} restored files; {stats['missing']} missing."
+        ))
+
+    def _pack(self, versions):
+        self.stats['packs'] += 1
+        if self.dry_run:
+            for v in versions:
+                self.stdout.write(f'{v.uploaded_file.name}')
+            self.stats['packed'] += len(versions)
+            return
+        pack_name, packed = write_pack(versions)
+        done = {v.pk for v in packed}
+        for v in versions:
+            if v.pk not in done:
+                self.stats['missing'] += 1
+                self.stderr.write(f'Missing: version {v.pk} {v.uploaded_file.name}')
+        if not packed:
+            os.remove(pack_path(pack_name))
+            self.stats['packs'] -= 1
+            return
+        self._archive(packed, pack_name)
+        self.stats['packed'] += len(packed)
+        if self.verbosity > 1:
+            self.stdout.write(f'Wrote {pack_name} with {len(packed)} files')
+
+    def _archive(self, versions, pack_name=None):
+        """Mark ``versions`` archived, then delete hot files no live row still uses."""
+        if self.dry_run:
+            return
+        values = {'is_archived': True, 'archived_at': timezone.now()}
+        if pack_name:
+            values['pack_name'] = pack_name
+        ProjectVersion.objects.filter(pk__in=[v.pk for v in versions]).update(**values)
+        names = {v.uploaded_file.name for v in versions}
+        shared = set(
+            ProjectVersion.objects.filter(uploaded_file__in=names, is_archived=False)
+            .values_list('uploaded_file', flat=True)
+        )
+        for name in names - shared:
+            try:
+                self.storage.delete(name)
+            except OSError:
+                pass
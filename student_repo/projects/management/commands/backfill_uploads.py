@@ -0,0 +1,143 @@
+import json
+import multiprocessing
+import os
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from projects import watermarks
+from projects.backfill import FIELDS, apply_found, init_worker, inspect_task, save_found, storage_settings
+from projects.models import ProjectVersion
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the stored file metadata (presence, size, content type, SHA-256 and stored '
+        'size) for existing uploads on a pool of worker processes. Versions are streamed in '
+        'primary key order with a bounded number of files in flight, results are written back '
+        'with bulk_update, and progress is checkpointed to a file so an interrupted run resumes '
+        'where it stopped. Use --max-mb-per-sec and --nice to keep the load off the live site.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+        parser.add_argument('--queue-size', type=int, default=0, help='files in flight at once (default: 4 per worker)')
+        parser.add_argument('--batch-size', type=int, default=500, help='rows read and written per query')
+        parser.add_argument('--max-mb-per-sec', type=float, default=0, help='read bandwidth for all workers together; 0 is unlimited')
+        parser.add_argument('--nice', type=int, default=10, help='niceness added to the worker processes (ignored on Windows)')
+        parser.add_argument(
+            '--start-method', choices=multiprocessing.get_all_start_methods(),
+            help="how worker processes are started (default: the platform's)",
+        )
+        parser.add_argument('--checkpoint', default='backfill_uploads.checkpoint', help='file recording progress')
+        parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start from the first version')
+        parser.add_argument('--all', action='store_true', help='recompute every version, not only those missing metadata')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        self.checkpoint = options['checkpoint']
+        workers = max(options['workers'], 1)
+        queue_size = options['queue_size'] or 4 * workers
+        rate = options['max_mb_per_sec'] * 1024 * 1024 / workers
+
+        self.last = 0 if options['restart'] else self._load_checkpoint()
+        start = self.last
+        versions = (
+            ProjectVersion.objects.filter(is_archived=False)
+            .exclude(uploaded_file__isnull=True).exclude(uploaded_file='')
+        )
+        if not options['all']:
+            versions = versions.filter(Q(sha256='') | Q(content_type='') | Q(file_size__isnull=True))
+        versions = versions.only('pk', 'project_id', 'uploaded_file', 'content_encoding', *FIELDS).order_by('pk')
+
+        self.stats = Counter()
+        self.in_flight = {}
+        # pks in submission order and the finished ones, to find how far
+        # everything is done when results arrive out of order
+        self.order, self.finished = deque(), set()
+        self.changed, self.unsaved = [], 0
+        context = multiprocessing.get_context(options['start_method'])
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=init_worker, initargs=(rate, options['nice'], storage_settings()),
+        ) as pool:
+            for version in self._stream(versions, start):
+                if len(self.in_flight) >= queue_size:
+                    self._collect(wait(self.in_flight, return_when=FIRST_COMPLETED).done)
+                future = pool.submit(inspect_task, version.uploaded_file.name, version.content_encoding)
+                self.in_flight[future] = version
+                self.order.append(version.pk)
+            while self.in_flight:
+                self._collect(wait(self.in_flight, return_when=FIRST_COMPLETED).done)
+        self._flush()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+        stats = self.stats
+        resumed = f' (resumed after version {start})' if start else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {stats['checked']} files{resumed}: {stats['missing']} missing, "
+            f"{stats['failed']} failed, updated {stats['changed']}."
+        ))
+
+    def _stream(self, versions, last):
+        # keyset batches rather than a cursor, since the loop updates the same table
+        while batch := list(versions.filter(pk__gt=last)[:self.batch_size]):
+            yield from batch
+            last = batch[-1].pk
+
+    def _collect(self, done):
+        for future in done:
+            version = self.in_flight.pop(future)
+            self.stats['checked'] += 1
+            try:
+                found = future.result()
+            except Exception as exc:
+                self.stats['failed'] += 1
+                self.stderr.write(f'Failed: version {version.pk} {version.uploaded_file.name}: {exc}')
+            else:
+                if not found['file_present']:
+                    self.stats['missing'] += 1
+                    self.stderr.write(f'Missing: version {version.pk} {version.uploaded_file.name}')
+                diffs = apply_found(version, found)
+                if diffs:
+                    self.changed.append(version)
+                    if self.verbosity > 1:
+                        self.stdout.write(f"Version {version.pk}: set {', '.join(sorted(diffs))}")
+            self.finished.add(version.pk)
+            self.unsaved += 1
+        if self.unsaved >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        """Write the collected changes, then move the checkpoint past every
+        version that is done."""
+        if self.changed:
+            # charges recorded sizes to the quota in the same transaction
+            save_found(self.changed, self.batch_size)
+            # file_present is shown on the project pages
+            watermarks.touch({v.project_id for v in self.changed})
+            self.stats['changed'] += len(self.changed)
+            self.changed = []
+        self.unsaved = 0
+        while self.order and self.order[0] in self.finished:
+            self.last = self.order.popleft()
+            self.finished.remove(self.last)
+        self._save_checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint) as fh:
+                return json.load(fh)['last_pk']
+        except FileNotFoundError:
+            return 0
+
+    def _save_checkpoint(self):
+        # write then rename, so a crash mid-write never leaves a torn file
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'last_pk': self.last}, fh)
+        os.replace(tmp, self.checkpoint)
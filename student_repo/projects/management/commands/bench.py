@@ -0,0 +1,170 @@
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from projects.benchmarking import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database with synthetic users, projects, versions and reviews, '
+        'then drive the main views through the test client and report latency '
+        'percentiles, query counts and throughput as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--faculty', type=int, default=10)
+        parser.add_argument('--projects', type=int, default=2000)
+        parser.add_argument('--versions', type=int, default=2, help='versions per project')
+        parser.add_argument('--archive-bytes', type=int, default=2048, help='approximate size of each generated archive')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--iterations', type=int, default=30, help='timed requests per view')
+        parser.add_argument('--warmup', type=int, default=3, help='untimed requests per view')
+        parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp(prefix='bench-media-')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                seed_started = time.perf_counter()
+                fixtures = self._seed(options)
+                seed_seconds = time.perf_counter() - seed_started
+                results = {
+                    label: self._drive(url, user, options)
+                    for label, url, user in self._scenarios(fixtures)
+                }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            'meta': {
+                'commit': self._git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'seed_seconds': round(seed_seconds, 3),
+                'sizes': {k: options[k] for k in ('students', 'faculty', 'projects', 'versions', 'archive_bytes')},
+                'iterations': options['iterations'],
+            },
+            'results': results,
+        }
+        out = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(out + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(out)
+
+    def _seed(self, options):
+        from projects.seeding import seed_projects, seed_users
+
+        batch = options['batch_size']
+        students = seed_users(options['students'], 'S', 'bench_student', batch_size=batch)
+        faculty = seed_users(max(1, options['faculty']), 'F', 'bench_faculty', batch_size=batch)
+        admin = seed_users(1, 'A', 'bench_admin', batch_size=batch)[0]
+        admin.is_staff = True
+        admin.save()
+        projects = seed_projects(
+            students,
+            options['projects'],
+            reviewers=faculty,
+            versions_per_project=options['versions'],
+            archive_bytes=options['archive_bytes'],
+            batch_size=batch,
+        )
+        project = projects[0]
+        return {
+            'student': project.owner,
+            'faculty': faculty[0],
+            'admin': admin,
+            'project': project,
+            'version': project.versions.first(),
+        }
+
+    def _scenarios(self, f):
+        stu, fac, adm, proj = f['student'], f['faculty'], f['admin'], f['project']
+        search = reverse('projects:search_projects')
+        scenarios = [
+            ('my_projects', reverse('projects:my_projects'), stu),
+            ('project_detail', reverse('projects:project_detail', args=[proj.pk]), fac),
+            ('search_projects', search, fac),
+            ('search_projects?status=Pending', search + '?status=Pending', fac),
+            ('search_projects?status=Approved', search + '?status=Approved', fac),
+            ('search_projects?status=Rejected', search + '?status=Rejected', fac),
+            ('dashboard_student', reverse('dashboard_student'), stu),
+            ('dashboard_faculty', reverse('dashboard_faculty'), fac),
+            ('dashboard_admin', reverse('dashboard_admin'), adm),
+        ]
+        if f['version'] is not None and f['version'].uploaded_file:
+            scenarios.append((
+                'download_version',
+                reverse('projects:download_version', args=[proj.pk, f['version'].pk]),
+                stu,
+            ))
+        return scenarios
+
+    def _drive(self, url, user, options):
+        client = Client()
+        client.force_login(user)
+        for _ in range(options['warmup']):
+            self._get(client, url)
+
+        latencies, queries, status = [], [], None
+        started = time.perf_counter()
+        for _ in range(options['iterations']):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                status = self._get(client, url)
+                latencies.append(time.perf_counter() - t0)
+            queries.append(len(ctx.captured_queries))
+        elapsed = time.perf_counter() - started
+
+        result = summarize(latencies, percentiles=(50, 95, 99))
+        result.update({
+            'status': status,
+            'queries': max(queries) if queries else 0,
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        })
+        return result
+
+    def _get(self, client, url):
+        resp = client.get(url)
+        if resp.streaming:
+            # consume the body so file reads are part of the measurement
+            for _ in resp.streaming_content:
+                pass
+        resp.close()
+        return resp.status_code
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
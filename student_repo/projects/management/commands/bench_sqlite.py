@@ -0,0 +1,132 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.benchmarking import summarize
+from student_repo.database import SQLITE_PRAGMAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark mixed concurrent readers and writers against a scratch SQLite '
+        'file, comparing SQLite defaults with the tuned profile in student_repo.database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=20000, help='rows seeded before the run')
+        parser.add_argument('--json', action='store_true', help='print raw JSON only')
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile, pragmas in (('default', {}), ('tuned', SQLITE_PRAGMAS)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self._seed(path, pragmas, options['rows'])
+                results[profile] = self._run(path, pragmas, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for profile, res in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(profile))
+            for kind in ('read', 'write'):
+                r = res[kind]
+                self.stdout.write(
+                    f"  {kind:5} {r['ops']:>8} ops  {r['ops_per_sec']:>10.1f}/s  "
+                    f"p50 {r['p50_ms']:.2f}ms  p95 {r['p95_ms']:.2f}ms  max {r['max_ms']:.2f}ms  "
+                    f"locked errors {r['errors']}"
+                )
+
+    def _connect(self, path, pragmas):
+        # Like Django, keep sqlite3's default 5s busy timeout unless the
+        # profile sets busy_timeout itself.
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def _seed(self, path, pragmas, rows):
+        conn = self._connect(path, pragmas)
+        conn.execute(
+            'CREATE TABLE item (id INTEGER PRIMARY KEY, owner INTEGER, title TEXT, '
+            'created REAL)'
+        )
+        conn.execute('CREATE INDEX item_owner ON item (owner, created)')
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO item (owner, title, created) VALUES (?, ?, ?)',
+            ((i % 500, f'title {i}', time.time()) for i in range(rows)),
+        )
+        conn.execute('COMMIT')
+        conn.close()
+
+    def _run(self, path, pragmas, options):
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        stats = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+
+        def reader():
+            conn = self._connect(path, pragmas)
+            local, errors = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    conn.execute(
+                        'SELECT id, title FROM item WHERE owner = ? ORDER BY created DESC LIMIT 20',
+                        (random.randrange(500),),
+                    ).fetchall()
+                    local.append(time.perf_counter() - start)
+                except sqlite3.OperationalError:
+                    errors += 1
+            conn.close()
+            with lock:
+                stats['read'].extend(local)
+                stats['read_errors'] += errors
+
+        def writer():
+            conn = self._connect(path, pragmas)
+            local, errors = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute(
+                        'INSERT INTO item (owner, title, created) VALUES (?, ?, ?)',
+                        (random.randrange(500), 'new', time.time()),
+                    )
+                    conn.execute('COMMIT')
+                    local.append(time.perf_counter() - start)
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+            conn.close()
+            with lock:
+                stats['write'].extend(local)
+                stats['write_errors'] += errors
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(options['writers'])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        out = {}
+        for kind in ('read', 'write'):
+            summary = summarize(stats[kind])
+            summary['ops_per_sec'] = round(summary['ops'] / elapsed, 1)
+            summary['errors'] = stats[f'{kind}_errors']
+            out[kind] = summary
+        return out
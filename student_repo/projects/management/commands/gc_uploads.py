@@ -0,0 +1,94 @@
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from projects.models import ProjectVersion
+from projects.storage import UPLOAD_ROOT
+
+
+def iter_files(storage, root):
+    """Yield ``(name, size, mtime)`` for every file under ``root`` in storage.
+
+    Local storage is walked with ``os.scandir`` so sizes and times come from
+    the directory entries; other backends go through the storage API. Only
+    the directory currently being walked is held in memory.
+    """
+    try:
+        base = storage.path('')
+    except NotImplementedError:
+        base = None
+    if base is not None:
+        stack = [os.path.join(base, root)]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        name = os.path.relpath(entry.path, base).replace(os.sep, '/')
+                        yield name, st.st_size, st.st_mtime
+        return
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        dirs, files = storage.listdir(path)
+        stack.extend(f'{path}/{d}' for d in dirs)
+        for f in files:
+            name = f'{path}/{f}'
+            yield name, storage.size(name), storage.get_modified_time(name).timestamp()
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete upload files that no ProjectVersion points at any more (left behind by '
+        'hard deletes of users and projects). Streams the storage listing and checks it '
+        'against the indexed uploaded_file column one batch at a time; files younger '
+        'than --grace-hours are kept so uploads still being saved are never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24, help='never delete files modified more recently than this')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='list orphaned files without deleting them')
+
+    def handle(self, *args, **options):
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        cutoff = time.time() - options['grace_hours'] * 3600
+        files = iter_files(storage, UPLOAD_ROOT)
+        stats = Counter()
+        while batch := list(islice(files, options['batch_size'])):
+            stats['scanned'] += len(batch)
+            old = {name: size for name, size, mtime in batch if mtime < cutoff}
+            if not old:
+                continue
+            # checked right before deleting, so rows saved during the scan count
+            referenced = set(
+                ProjectVersion.objects.filter(uploaded_file__in=list(old))
+                .values_list('uploaded_file', flat=True)
+            )
+            for name, size in old.items():
+                if name in referenced:
+                    continue
+                stats['orphaned'] += 1
+                stats['bytes'] += size
+                if options['dry_run'] or options['verbosity'] > 1:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    try:
+                        storage.delete(name)
+                    except OSError:
+                        continue
+                    stats['deleted'] += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {stats['scanned']} files: {stats['orphaned']} orphaned "
+            f"({stats['bytes']} bytes), deleted {stats['deleted']}."
+        ))
@@ -0,0 +1,88 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from projects.coldstore import pack_path, write_pack
+from projects.models import ArchivedProject, Project, ProjectVersion, Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Move projects that were soft-deleted more than --older-than days ago out of the '
+        'hot tables: each one becomes an ArchivedProject row holding the project, its '
+        'versions and its reviews, its files are packed into the cold tier, and the '
+        'original rows are deleted. Works in batches, one transaction per batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=90, metavar='DAYS', help='purge projects deleted more than DAYS days ago')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--dry-run', action='store_true', help='count what would be purged without changing anything')
+
+    def handle(self, *args, **options):
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        projects = Project.all_objects.deleted().filter(deleted_at__lt=cutoff).order_by('pk')
+        stats = Counter()
+        last = 0
+        while batch := list(projects.filter(pk__gt=last).values()[:options['batch_size']]):
+            last = batch[-1]['id']
+            ids = [p['id'] for p in batch]
+            if options['dry_run']:
+                stats['projects'] += len(ids)
+                stats['versions'] += ProjectVersion.objects.filter(project__in=ids).count()
+                continue
+
+            # files go to the cold tier first; a crash before the commit below
+            # only leaves an unused pack behind
+            hot = list(
+                ProjectVersion.objects.filter(project__in=ids, is_archived=False, file_present=True)
+                .exclude(uploaded_file__isnull=True).exclude(uploaded_file='')
+            )
+            packed = {}
+            if hot:
+                pack_name, done = write_pack(hot)
+                packed = {v.pk: pack_name for v in done}
+                if not done:
+                    os.remove(pack_path(pack_name))
+
+            versions, reviews = {}, {}
+            for v in ProjectVersion.objects.filter(project__in=ids).values():
+                if v['id'] in packed:
+                    v.update(is_archived=True, pack_name=packed[v['id']])
+                versions.setdefault(v['project_id'], []).append(v)
+            for r in Review.objects.filter(project__in=ids).values():
+                reviews.setdefault(r['project_id'], []).append(r)
+
+            with transaction.atomic():
+                ArchivedProject.objects.bulk_create([
+                    ArchivedProject(
+                        project_id=p['id'], owner_id=p['owner_id'], title=p['title'], deleted_at=p['deleted_at'],
+                        data={'project': p, 'versions': versions.get(p['id'], []), 'reviews': reviews.get(p['id'], [])},
+                    )
+                    for p in batch
+                ])
+                # cascades to the versions and reviews
+                Project.all_objects.filter(pk__in=ids).delete()
+
+            for v in hot:
+                if v.pk in packed:
+                    try:
+                        storage.delete(v.uploaded_file.name)
+                    except OSError:
+                        pass
+            stats['projects'] += len(ids)
+            stats['versions'] += sum(len(vs) for vs in versions.values())
+            stats['files'] += len(packed)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Purged {stats['projects']} projects so far")
+
+        verb = 'Would purge' if options['dry_run'] else 'Purged'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['projects']} projects with {stats['versions']} versions; "
+            f"{stats['files']} files moved to cold storage."
+        ))
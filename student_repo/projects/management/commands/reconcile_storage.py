@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from projects.models import StorageUsage
+from projects.quota import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the storage counters behind the upload quota (Project.bytes_used and '
+        'StorageUsage.bytes_used) from the ProjectVersion rows, fixing any drift. Each '
+        'counter table is rewritten by a single UPDATE, so it is safe to run while uploads happen.'
+    )
+
+    def handle(self, *args, **options):
+        before = dict(StorageUsage.objects.values_list('user_id', 'bytes_used'))
+        projects = reconcile()
+        after = StorageUsage.objects.values_list('user_id', 'bytes_used')
+        corrected = sum(1 for user_id, used in after if before.get(user_id, 0) != used)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {projects} projects and {len(after)} users; corrected {corrected} user totals.'
+        ))
@@ -0,0 +1,63 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from projects import watermarks
+from projects.backfill import FIELDS, apply_found, inspect_file, save_found
+from projects.models import ProjectVersion
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-check the file metadata stored on every ProjectVersion (presence, size, '
+        'content type, SHA-256 and stored size) against the upload storage, reading files in '
+        'parallel, and correct any rows that disagree.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='files read concurrently')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--no-digest', action='store_true', help='only check presence, size and type')
+        parser.add_argument('--dry-run', action='store_true', help='report differences without saving them')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        inspect = partial(inspect_file, storage, not options['no_digest'])
+        versions = (
+            ProjectVersion.objects.filter(is_archived=False)
+            .exclude(uploaded_file__isnull=True).exclude(uploaded_file='')
+            .only('pk', 'project_id', 'uploaded_file', 'content_encoding', *FIELDS)
+            .order_by('pk')
+            .iterator(chunk_size=options['batch_size'])
+        )
+        stats = Counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while batch := list(islice(versions, options['batch_size'])):
+                # storage reads happen in the pool; all DB access stays here
+                results = pool.map(inspect, [v.uploaded_file.name for v in batch], [v.content_encoding for v in batch])
+                changed = [v for v, found in zip(batch, results) if self._apply(v, found, stats)]
+                if changed and not options['dry_run']:
+                    save_found(changed)
+                    # file_present is shown on the project pages
+                    watermarks.touch({v.project_id for v in changed})
+                stats['changed'] += len(changed)
+
+        verb = 'would update' if options['dry_run'] else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {stats['checked']} files: {stats['missing']} missing, {verb} {stats['changed']}."
+        ))
+
+    def _apply(self, version, found, stats):
+        """Copy differing values from ``found`` onto ``version``; True if any changed."""
+        stats['checked'] += 1
+        if not found['file_present']:
+            stats['missing'] += 1
+            self.stderr.write(f'Missing: version {version.pk} {version.uploaded_file.name}')
+        diffs = apply_found(version, found)
+        if diffs and found['file_present'] and self.verbosity > 1:
+            self.stdout.write(f"Version {version.pk}: corrected {', '.join(sorted(diffs))}")
+        return bool(diffs)
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Value, When
+
+from projects.models import ProjectVersion
+from projects.storage import is_sharded, shard_path
+
+
+def target_name(old_name):
+    # derived from the old name, so an interrupted run picks the same target again
+    return shard_path(hashlib.sha256(old_name.encode()).hexdigest()[:16], old_name)
+
+
+def copy_file(storage, old, new):
+    """Make ``new`` hold the bytes of ``old``; return False if neither exists.
+
+    Local storage uses a hard link (instant, no extra disk) and falls back to
+    a copy; other backends go through the storage API.
+    """
+    try:
+        old_path, new_path = storage.path(old), storage.path(new)
+    except NotImplementedError:
+        if storage.exists(new):
+            return True
+        try:
+            with storage.open(old, 'rb') as fh:
+                storage.save(new, fh)
+        except OSError:
+            return False
+        return True
+
+    if os.path.exists(new_path):
+        return True
+    if not os.path.exists(old_path):
+        return False
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    try:
+        os.link(old_path, new_path)
+        # a link shares the old file's mtime; gc_uploads' grace period is
+        # based on it, and no row points at the new name yet
+        os.utime(new_path)
+    except OSError:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(new_path), prefix='.tmp_')
+        os.close(fd)
+        shutil.copyfile(old_path, tmp)
+        os.replace(tmp, new_path)
+    return True
+
+
+def delete_file(storage, name):
+    try:
+        storage.delete(name)
+    except OSError:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Move upload files from the flat project_uploads/ directory into the '
+        'hash-sharded layout and rewrite ProjectVersion paths in batches. Safe to '
+        'interrupt and re-run: files are copied before rows are updated, and old '
+        'files are only removed once no row points at them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='files moved concurrently')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='list what would move without changing anything')
+
+    def handle(self, *args, **options):
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        stats = Counter()
+        last = ''
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                # keyset over distinct names, so rows sharing a file move together
+                names = list(
+                    # archived files live in cold-tier packs under their current name
+                    ProjectVersion.objects.filter(uploaded_file__gt=last, is_archived=False)
+                    .order_by('uploaded_file')
+                    .values_list('uploaded_file', flat=True)
+                    .distinct()[:options['batch_size']]
+                )
+                if not names:
+                    break
+                last = names[-1]
+                moves = {old: target_name(old) for old in names if not is_sharded(old)}
+                if not moves:
+                    continue
+                if options['dry_run']:
+                    for old, new in moves.items():
+                        self.stdout.write(f'{old} -> {new}')
+                    stats['moved'] += len(moves)
+                    continue
+
+                copied = pool.map(lambda pair: copy_file(storage, *pair), moves.items())
+                done = {}
+                for (old, new), ok in zip(moves.items(), copied):
+                    if ok:
+                        done[old] = new
+                    else:
+                        stats['missing'] += 1
+                        self.stderr.write(f'Missing: {old}')
+                if not done:
+                    continue
+                # one UPDATE per batch
+                ProjectVersion.objects.filter(uploaded_file__in=list(done), is_archived=False).update(
+                    uploaded_file=Case(*[When(uploaded_file=old, then=Value(new)) for old, new in done.items()])
+                )
+                # rows the UPDATE skipped (archived, or added during the run)
+                # still point at the old name; those files stay
+                kept = set(
+                    ProjectVersion.objects.filter(uploaded_file__in=list(done))
+                    .values_list('uploaded_file', flat=True).distinct()
+                )
+                list(pool.map(lambda old: delete_file(storage, old), [old for old in done if old not in kept]))
+                stats['kept'] += len(kept)
+                stats['moved'] += len(done)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Moved {stats['moved']} files so far")
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['moved']} files; {stats['missing']} missing, "
+            f"{stats['kept']} old files kept for rows still using them."
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_review_version_fk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['created_at'], name='project_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['owner', 'is_deleted', 'created_at'], name='project_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectversion',
+            index=models.Index(fields=['project', 'version_number', 'created_at'], name='version_project_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectversion',
+            index=models.Index(fields=['created_at'], name='version_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['project', 'created_at'], name='review_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='review_created_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:42
+
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    # Mark existing files as present and remember their names without touching
+    # storage; `manage.py scrub_uploads` fills in size, type and digest.
+    ProjectVersion = apps.get_model('projects', 'ProjectVersion')
+    batch = []
+    versions = ProjectVersion.objects.exclude(uploaded_file__isnull=True).exclude(uploaded_file='')
+    for v in versions.only('pk', 'uploaded_file').iterator(chunk_size=1000):
+        v.original_filename = v.uploaded_file.name.rsplit('/', 1)[-1][:255]
+        v.file_present = True
+        batch.append(v)
+        if len(batch) >= 1000:
+            ProjectVersion.objects.bulk_update(batch, ['original_filename', 'file_present'])
+            batch = []
+    ProjectVersion.objects.bulk_update(batch, ['original_filename', 'file_present'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectversion',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='file_present',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
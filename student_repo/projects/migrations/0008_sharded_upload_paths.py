@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:46
+
+import projects.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_version_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='projectversion',
+            name='uploaded_file',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=projects.storage.version_upload_to),
+        ),
+    ]
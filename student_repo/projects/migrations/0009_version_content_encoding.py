@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_sharded_upload_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectversion',
+            name='content_encoding',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='stored_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_version_content_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectversion',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='is_archived',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='pack_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='projectversion',
+            name='restored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
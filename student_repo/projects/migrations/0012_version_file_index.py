@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_soft_delete_manager_and_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectversion',
+            index=models.Index(fields=['uploaded_file'], name='version_file_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def forwards(apps, schema_editor):
+    # same computation as `manage.py reconcile_storage`
+    Project = apps.get_model('projects', 'Project')
+    ProjectVersion = apps.get_model('projects', 'ProjectVersion')
+    StorageUsage = apps.get_model('projects', 'StorageUsage')
+    version_total = (
+        ProjectVersion.objects.filter(project=OuterRef('pk')).order_by()
+        .values('project').annotate(total=Sum('file_size')).values('total')
+    )
+    Project.objects.update(bytes_used=Coalesce(Subquery(version_total), Value(0)))
+    owner_total = (
+        Project.objects.filter(owner=OuterRef('user'), is_deleted=False).order_by()
+        .values('owner').annotate(total=Sum('bytes_used')).values('total')
+    )
+    owners = Project.objects.filter(is_deleted=False).values_list('owner_id', flat=True).distinct()
+    StorageUsage.objects.bulk_create([StorageUsage(user_id=pk) for pk in owners])
+    StorageUsage.objects.update(bytes_used=Coalesce(Subquery(owner_total), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('projects', '0012_version_file_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='storage_usage', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('bytes_used', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='bytes_used',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:18
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def forwards(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Watermark = apps.get_model('projects', 'Watermark')
+    latest = Project.objects.order_by().values('owner_id').annotate(latest=Max('updated_at'))
+    marks = [Watermark(key=f"owner:{row['owner_id']}", changed_at=row['latest']) for row in latest]
+    if marks:
+        marks.append(Watermark(key='all', changed_at=max(m.changed_at for m in marks)))
+    Watermark.objects.bulk_create(marks, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_storage_quota_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
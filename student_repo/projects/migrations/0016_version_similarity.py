@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0015_change_watermarks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionSignature',
+            fields=[
+                ('version', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='projects.projectversion')),
+                ('shingles', models.PositiveIntegerField(default=0)),
+                ('minhash', models.BinaryField(blank=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='projects.projectversion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket'], name='signature_bucket_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('found_at', models.DateTimeField(auto_now_add=True)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.projectversion')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar', to='projects.projectversion')),
+            ],
+            options={
+                'ordering': ['-similarity'],
+                'constraints': [models.UniqueConstraint(fields=('version', 'other'), name='similar_version_pair_uniq')],
+            },
+        ),
+    ]
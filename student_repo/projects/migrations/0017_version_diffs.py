@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0016_version_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDiff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_sha256', models.CharField(max_length=64)),
+                ('new_sha256', models.CharField(max_length=64)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('old_sha256', 'new_sha256'), name='version_diff_pair_uniq')],
+            },
+        ),
+    ]
@@ -1,7 +1,51 @@
 from django.conf import settings
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
 from django.utils import timezone
 
+from .compression import compress_for_storage
+from .quota import charge
+from .storage import version_upload_to
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_status(self):
+        """Annotate ``computed_status`` with the same rules as ``Project.status``.
+
+        The status is resolved in SQL (one correlated subquery per input) so
+        list views and status filters do not run two queries per project.
+        """
+        latest_review = Review.objects.filter(project=OuterRef('pk')).order_by('-created_at')
+        latest_version = ProjectVersion.objects.filter(project=OuterRef('pk')).order_by('-version_number', '-created_at')
+        return self.alias(
+            last_review_decision=Subquery(latest_review.values('decision')[:1]),
+            last_review_at=Subquery(latest_review.values('created_at')[:1]),
+            last_version_at=Subquery(latest_version.values('created_at')[:1]),
+        ).annotate(
+            computed_status=Case(
+                When(last_review_at__isnull=True, then=Value('Pending')),
+                When(last_version_at__gt=F('last_review_at'), then=Value('Pending')),
+                When(last_review_decision=Review.DECISION_APPROVED, then=Value('Approved')),
+                When(last_review_decision=Review.DECISION_REJECTED, then=Value('Rejected')),
+                default=Value('Pending'),
+                output_field=models.CharField(),
+            )
+        )
+
+    def deleted(self):
+        return self.filter(is_deleted=True)
+
+
+class LiveProjectManager(models.Manager.from_queryset(ProjectQuerySet)):
+    """Default manager: soft-deleted projects are left out of every query.
+
+    ``Project.all_objects`` sees them too, for the admin, audits and purges.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
 
 class Project(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='projects')
@@ -12,15 +56,46 @@ class Project(models.Model):
     # soft-delete flag and timestamp for auditability
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    # running total of the versions' file sizes (see projects.quota)
+    bytes_used = models.BigIntegerField(default=0)
+
+    objects = LiveProjectManager()
+    all_objects = ProjectQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # partial: SQLite cannot use a plain index for `NOT is_deleted`,
+            # and deleted rows never bloat the indexes the live queries use
+            models.Index(fields=['created_at'], condition=Q(is_deleted=False), name='project_live_created_idx'),
+            models.Index(fields=['owner', 'created_at'], condition=Q(is_deleted=False), name='project_live_owner_idx'),
+            # `manage.py purge_deleted_projects` looks up long-deleted rows
+            models.Index(fields=['deleted_at'], condition=Q(is_deleted=True), name='project_deleted_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.owner.username})"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # bytes_used only changes through F() updates (projects.quota);
+            # writing back the loaded value would undo concurrent ones
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'bytes_used'
+            ]
+        super().save(*args, **kwargs)
+
     def soft_delete(self):
         """Soft-delete the project instead of hard removing it from the DB."""
+        was_live = not self.is_deleted
         self.is_deleted = True
         self.deleted_at = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self.save()
+            if was_live:
+                # the owner's quota no longer counts this project
+                StorageUsage.objects.filter(user_id=self.owner_id).update(
+                    bytes_used=F('bytes_used') - Subquery(Project.all_objects.filter(pk=self.pk).values('bytes_used'))
+                )
 
     @property
     def latest_version(self):
@@ -31,18 +106,72 @@ class Project(models.Model):
 
 class ProjectVersion(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='versions')
-    uploaded_file = models.FileField(upload_to='project_uploads/', blank=True, null=True)
+    uploaded_file = models.FileField(upload_to=version_upload_to, max_length=255, blank=True, null=True)
     version_number = models.PositiveIntegerField(default=1)
     title_snapshot = models.CharField(max_length=200, blank=True)
     description_snapshot = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Recorded when the file is uploaded so downloads and listings never need
+    # to ask the storage backend; `manage.py scrub_uploads` re-checks them.
+    original_filename = models.CharField(max_length=255, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    file_present = models.BooleanField(default=False)
+    # set when the stored bytes are compressed (see projects.compression);
+    # file_size and sha256 always describe the original file
+    content_encoding = models.CharField(max_length=10, blank=True)
+    stored_size = models.BigIntegerField(null=True, blank=True)
+    # set by `manage.py archive_versions` once the file lives in a cold-tier
+    # pack (see projects.coldstore); downloads restore it on first access
+    is_archived = models.BooleanField(default=False)
+    pack_name = models.CharField(max_length=100, blank=True)
+    archived_at = models.DateTimeField(null=True, blank=True)
+    restored_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-version_number', '-created_at']
+        indexes = [
+            models.Index(fields=['project', 'version_number', 'created_at'], name='version_project_number_idx'),
+            models.Index(fields=['created_at'], name='version_created_idx'),
+            # file name lookups by shard_uploads and gc_uploads
+            models.Index(fields=['uploaded_file'], name='version_file_idx'),
+        ]
 
     def __str__(self):
         return f"{self.project.title} v{self.version_number}"
 
+    def save(self, *args, **kwargs):
+        f = self.uploaded_file
+        if f and not f._committed:
+            # a new file is about to be written to storage
+            self.set_file_metadata(f.file)
+            stored, self.content_encoding, self.stored_size = compress_for_storage(
+                f.file, self.content_type, self.file_size,
+            )
+            if stored is not f.file:
+                self.uploaded_file = stored
+        elif not f:
+            self.file_present = False
+        if not (self._state.adding and self.file_size):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            charge(self.project_id, self.project.owner_id, self.file_size)
+
+    def set_file_metadata(self, f):
+        from .uploads import file_metadata
+        for field, value in file_metadata(f).items():
+            setattr(self, field, value)
+        self.file_present = True
+
+    @property
+    def download_name(self):
+        if self.original_filename:
+            return self.original_filename
+        return self.uploaded_file.name.rsplit('/', 1)[-1] if self.uploaded_file else ''
+
 
 class Review(models.Model):
     DECISION_PENDING = 'P'
@@ -64,17 +193,133 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='review_project_created_idx'),
+            models.Index(fields=['created_at'], name='review_created_idx'),
+        ]
 
     def __str__(self):
         return f"Review {self.get_decision_display()} by {self.reviewer.username} on {self.project.title}"
 
 
+class StorageUsage(models.Model):
+    """Bytes stored by a user's live projects, maintained by projects.quota."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='storage_usage')
+    bytes_used = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.bytes_used} bytes"
+
+
+class Watermark(models.Model):
+    """When a set of projects last changed, maintained by projects.watermarks.
+
+    ``key`` is ``'all'`` for every project or ``'owner:<user id>'`` for one
+    owner's projects.
+    """
+    key = models.CharField(max_length=50, primary_key=True)
+    changed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key}: {self.changed_at}"
+
+
+class ArchivedProject(models.Model):
+    """A purged soft-deleted project, kept out of the hot tables.
+
+    ``data`` holds the project row with its versions and reviews as written
+    by ``manage.py purge_deleted_projects``; version files live in the cold
+    tier pack each version names (see projects.coldstore).
+    """
+    project_id = models.PositiveIntegerField(unique=True)
+    owner_id = models.PositiveIntegerField(db_index=True)
+    title = models.CharField(max_length=200)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['-archived_at']
+
+    def __str__(self):
+        return f"{self.title} (archived project {self.project_id})"
+
+
+class VersionSignature(models.Model):
+    """MinHash signature of the text in a version's upload (projects.similarity).
+
+    ``minhash`` holds the signature as little-endian uint32 values and is
+    empty when the upload had no text.
+    """
+    version = models.OneToOneField(ProjectVersion, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    shingles = models.PositiveIntegerField(default=0)
+    minhash = models.BinaryField(blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Signature of version {self.version_id}"
+
+
+class SignatureBand(models.Model):
+    """One LSH band bucket of a version's signature; versions that share a
+    bucket are candidate near-duplicates."""
+    version = models.ForeignKey(ProjectVersion, on_delete=models.CASCADE, related_name='signature_bands')
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket'], name='signature_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"Version {self.version_id} bucket {self.bucket}"
+
+
+class SimilarVersion(models.Model):
+    """A pair of near-duplicate versions by different owners, stored once in
+    each direction so either version's project lists the other."""
+    version = models.ForeignKey(ProjectVersion, on_delete=models.CASCADE, related_name='similar')
+    other = models.ForeignKey(ProjectVersion, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()
+    found_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-similarity']
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'other'], name='similar_version_pair_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Version {self.version_id} ~ {self.other_id} ({self.similarity:.0%})"
+
+
+class VersionDiff(models.Model):
+    """A computed diff between two uploads, keyed by their SHA-256 digests
+    (projects.diffs); any two versions with the same files share it."""
+    old_sha256 = models.CharField(max_length=64)
+    new_sha256 = models.CharField(max_length=64)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['old_sha256', 'new_sha256'], name='version_diff_pair_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Diff {self.old_sha256[:12]}..{self.new_sha256[:12]}"
+
+
 @property
 def project_status(self):
     """Return the project status derived from the latest review.
 
     Possible values: 'Approved', 'Rejected', 'Pending', 'No Reviews'.
+    Querysets built with ``Project.objects.with_status()`` already carry the
+    answer, so no extra queries are made for them.
     """
+    if 'computed_status' in self.__dict__:
+        return self.computed_status
     latest_review = self.reviews.first()
     latest_version = self.versions.first()
 
@@ -0,0 +1,102 @@
+"""Per-user storage quota.
+
+Usage is kept as running byte counters rather than summed from storage:
+``Project.bytes_used`` per project and ``StorageUsage.bytes_used`` per owner,
+counting the original size of every version of the owner's live projects.
+Both are adjusted in the same transaction that creates or deletes a
+ProjectVersion, so reading usage is a single-row lookup.
+``manage.py reconcile_storage`` recomputes them from the version rows.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.template.defaultfilters import filesizeformat
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def quota_bytes():
+    """The per-user limit in bytes; 0 means unlimited."""
+    return getattr(settings, 'STORAGE_QUOTA_BYTES', 0)
+
+
+def is_exempt(user):
+    return not quota_bytes() or user.is_staff
+
+
+def usage(user):
+    from .models import StorageUsage
+    return StorageUsage.objects.filter(user_id=user.pk).values_list('bytes_used', flat=True).first() or 0
+
+
+def exceeded_message(used):
+    return f'Storage quota exceeded: {filesizeformat(used)} of {filesizeformat(quota_bytes())} used.'
+
+
+def check(user):
+    """Raise QuotaExceeded if ``user`` is over quota.
+
+    Call it inside the transaction that created the version: the counter row
+    was just updated and stays locked until commit, so concurrent uploads
+    cannot both squeeze under the limit.
+    """
+    if is_exempt(user):
+        return
+    used = usage(user)
+    if used > quota_bytes():
+        raise QuotaExceeded(exceeded_message(used))
+
+
+def charge(project_id, owner_id, delta):
+    """Add ``delta`` bytes to a project's and its owner's counters.
+
+    Counters stop at zero, so releasing bytes that were never charged (a
+    version whose size was filled in without going through here) cannot
+    make usage negative.
+    """
+    from .models import Project, StorageUsage
+
+    total = F('bytes_used') + delta
+    if delta < 0:
+        total = Greatest(total, Value(0))
+    with transaction.atomic():
+        Project.all_objects.filter(pk=project_id).update(bytes_used=total)
+        # deleted projects no longer count against their owner
+        live_owner = Project.objects.filter(pk=project_id).values('owner_id')
+        updated = StorageUsage.objects.filter(user_id=Subquery(live_owner)).update(bytes_used=total)
+        if updated or delta <= 0 or owner_id is None:
+            return
+        try:
+            with transaction.atomic():
+                StorageUsage.objects.create(user_id=owner_id, bytes_used=delta)
+        except IntegrityError:
+            # created concurrently
+            StorageUsage.objects.filter(user_id=owner_id).update(bytes_used=F('bytes_used') + delta)
+
+
+def reconcile():
+    """Recompute every counter from the version rows; returns the project count.
+
+    Each counter table is rewritten by one UPDATE, so this is safe to run
+    while uploads happen.
+    """
+    from .models import Project, ProjectVersion, StorageUsage
+
+    version_total = (
+        ProjectVersion.objects.filter(project=OuterRef('pk')).order_by()
+        .values('project').annotate(total=Sum('file_size')).values('total')
+    )
+    # Project.objects counts live projects only
+    owner_total = (
+        Project.objects.filter(owner=OuterRef('user')).order_by()
+        .values('owner').annotate(total=Sum('bytes_used')).values('total')
+    )
+    with transaction.atomic():
+        projects = Project.all_objects.update(bytes_used=Coalesce(Subquery(version_total), Value(0)))
+        owners = Project.objects.filter(owner__storage_usage__isnull=True).values_list('owner_id', flat=True).distinct()
+        StorageUsage.objects.bulk_create([StorageUsage(user_id=pk) for pk in owners], ignore_conflicts=True)
+        StorageUsage.objects.update(bytes_used=Coalesce(Subquery(owner_total), Value(0)))
+    return projects
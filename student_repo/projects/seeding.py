@@ -0,0 +1,134 @@
+"""Synthetic data generator for tests and benchmarks.
+
+Everything is written with ``bulk_create`` in batches so thousands of rows
+can be seeded in well under a second on SQLite.
+"""
+import io
+import random
+import zipfile
+from itertools import cycle
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+
+from accounts.models import Profile
+from .models import Project, ProjectVersion, Review
+from .quota import reconcile
+from .storage import version_upload_to
+
+
+def seed_users(count, type_char, prefix, password=None, batch_size=500, start=0):
+    """Create ``count`` users (with profiles of ``type_char``) and return them.
+
+    All users share one password hash, so hashing is only paid once.
+    """
+    User = get_user_model()
+    encoded = make_password(password)
+    users = [
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=encoded)
+        for i in range(start, start + count)
+    ]
+    users = User.objects.bulk_create(users, batch_size=batch_size)
+    Profile.objects.bulk_create(
+        [Profile(user=u, type=type_char, full_name=u.username.title(), **Profile.search_keys(u)) for u in users],
+        batch_size=batch_size,
+    )
+    return users
+
+
+WORDS = (
+    'def', 'class', 'return', 'import', 'project', 'student', 'review', 'version',
+    'data', 'model', 'view', 'test', 'value', 'result', 'list', 'index', 'print',
+)
+
+
+def make_archive(seed, size):
+    """Return the bytes of a small zip archive of roughly ``size`` bytes of source text."""
+    rng = random.Random(seed)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        remaining, n = size, 0
+        while remaining > 0:
+            text = ' '.join(rng.choice(WORDS) for _ in range(max(1, min(remaining, 4096) // 6)))
+            zf.writestr(f'src/module_{n}.py', text)
+            remaining -= len(text)
+            n += 1
+        zf.writestr('README.txt', f'Synthetic submission {seed}')
+    return buf.getvalue()
+
+
+def _save_archive(version, seed, size, storage):
+    # bulk_create skips ProjectVersion.save(), so record the metadata here
+    content = ContentFile(make_archive(seed, size), name=f'seed_{seed}.zip')
+    version.set_file_metadata(content)
+    version.uploaded_file.name = storage.save(version_upload_to(version, content.name), content)
+
+
+def seed_projects(owners, count, reviewers=(), versions_per_project=2, archive_bytes=0,
+                  batch_size=500):
+    """Create ``count`` projects round-robin across ``owners``.
+
+    Each project gets ``versions_per_project`` versions; with ``archive_bytes``
+    every version also gets a generated zip archive of about that size in the
+    upload storage. When reviewers are
+    given, two projects out of three get a review (alternating approved and
+    rejected) and some rejected projects get a newer version afterwards, so
+    the three statuses are all represented.
+    """
+    owner_iter = cycle(owners)
+    projects = Project.objects.bulk_create(
+        [
+            Project(owner=next(owner_iter), title=f'Project {i}', description=f'Synthetic project number {i}')
+            for i in range(count)
+        ],
+        batch_size=batch_size,
+    )
+
+    versions = [
+        ProjectVersion(
+            project=p,
+            version_number=n,
+            title_snapshot=p.title,
+            description_snapshot=p.description,
+        )
+        for p in projects
+        for n in range(1, versions_per_project + 1)
+    ]
+    if archive_bytes:
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        for i, v in enumerate(versions):
+            _save_archive(v, f'{v.project.pk}_{i}', archive_bytes, storage)
+    ProjectVersion.objects.bulk_create(versions, batch_size=batch_size)
+
+    if reviewers:
+        reviewer_iter = cycle(reviewers)
+        reviews, resubmitted = [], []
+        for i, p in enumerate(projects):
+            if i % 3 == 2:
+                continue
+            decision = Review.DECISION_APPROVED if i % 2 == 0 else Review.DECISION_REJECTED
+            reviews.append(Review(
+                project=p,
+                reviewer=next(reviewer_iter),
+                version=versions[(i + 1) * versions_per_project - 1] if versions_per_project else None,
+                decision=decision,
+                feedback='Synthetic review',
+            ))
+            if decision == Review.DECISION_REJECTED and i % 4 == 1:
+                resubmitted.append(ProjectVersion(
+                    project=p,
+                    version_number=versions_per_project + 1,
+                    title_snapshot=p.title,
+                    description_snapshot=p.description,
+                ))
+        Review.objects.bulk_create(reviews, batch_size=batch_size)
+        if archive_bytes:
+            for v in resubmitted:
+                _save_archive(v, f'{v.project.pk}_r', archive_bytes, storage)
+        # created after the reviews, so these projects read as Pending again
+        ProjectVersion.objects.bulk_create(resubmitted, batch_size=batch_size)
+    if archive_bytes:
+        # bulk_create skips the quota counters too
+        reconcile()
+    return projects
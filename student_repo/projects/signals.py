@@ -0,0 +1,42 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import similarity, watermarks
+from .models import Project, ProjectVersion, Review
+from .quota import charge
+
+
+@receiver(post_delete, sender=ProjectVersion)
+def release_version_storage(sender, instance, **kwargs):
+    # also runs for versions removed by cascades (project and user deletes)
+    if instance.file_size:
+        charge(instance.project_id, None, -instance.file_size)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        watermarks.bump([instance.owner_id])
+
+
+@receiver(post_save, sender=ProjectVersion)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=ProjectVersion)
+@receiver(post_delete, sender=Review)
+def touch_project(sender, instance, raw=False, **kwargs):
+    # a project's status and latest version come from these rows
+    if not raw:
+        watermarks.touch([instance.project_id])
+
+
+@receiver(post_save, sender=ProjectVersion)
+def index_new_version(sender, instance, created, raw=False, **kwargs):
+    # opt-in, since it runs inside the upload request; after commit, so the
+    # file is in storage and a failure cannot undo the upload
+    if created and not raw and instance.uploaded_file and getattr(settings, 'SIMILARITY_ON_UPLOAD', False):
+        transaction.on_commit(partial(similarity.index_version_id, instance.pk))
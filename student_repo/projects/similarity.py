@@ -0,0 +1,221 @@
+"""Near-duplicate detection between uploaded versions (MinHash with LSH).
+
+The text files inside each upload are split into overlapping runs of
+``SHINGLE_TOKENS`` words, and the set of run hashes is summarised by a
+MinHash signature of ``NUM_PERM`` values: the fraction of positions where
+two signatures agree estimates the Jaccard similarity of the two uploads.
+
+Signatures are cut into ``BANDS`` bands and each band is hashed into a
+bucket stored in ``SignatureBand``. Versions sharing a bucket are the only
+candidates compared, so checking a new upload is one indexed lookup rather
+than a scan of every signature. With 16 bands of 8 rows a pair at 0.7
+similarity shares a bucket with probability ~0.8 and a pair at 0.3 almost
+never does.
+
+Signatures are computed with NumPy when it is installed and in pure Python
+otherwise; both give identical results.
+"""
+import hashlib
+import logging
+import random
+import re
+import struct
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from . import watermarks
+from .archives import as_text, iter_members
+
+try:
+    import numpy
+except ImportError:  # optional dependency
+    numpy = None
+
+logger = logging.getLogger('projects.similarity')
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_TOKENS = 5
+
+# h(x) = (a * x + b) mod PRIME over 32-bit shingle hashes; a * x stays
+# below 2**63 so NumPy can do the arithmetic in uint64
+PRIME = (1 << 31) - 1
+_rng = random.Random(1)
+COEFFS = [(_rng.randrange(1, PRIME), _rng.randrange(0, PRIME)) for _ in range(NUM_PERM)]
+
+# shingles hashed against all permutations at once in the NumPy path
+CHUNK = 4096
+
+TOKEN_RE = re.compile(r'\w+')
+SIGNATURE_FORMAT = f'<{NUM_PERM}I'
+
+
+def threshold():
+    return getattr(settings, 'SIMILARITY_THRESHOLD', 0.7)
+
+
+def max_text_bytes():
+    return getattr(settings, 'SIMILARITY_MAX_TEXT_BYTES', 1024 * 1024)
+
+
+def max_candidates():
+    return getattr(settings, 'SIMILARITY_MAX_CANDIDATES', 1000)
+
+
+def shingles(text):
+    """The set of hashed ``SHINGLE_TOKENS``-word runs in ``text``."""
+    tokens = TOKEN_RE.findall(text.lower())
+    if len(tokens) < SHINGLE_TOKENS:
+        return {zlib.crc32(' '.join(tokens).encode())} if tokens else set()
+    return {
+        zlib.crc32(' '.join(tokens[i:i + SHINGLE_TOKENS]).encode())
+        for i in range(len(tokens) - SHINGLE_TOKENS + 1)
+    }
+
+
+def version_shingles(version):
+    """Shingles of the text files in a version's upload.
+
+    Binary members are skipped and at most ``SIMILARITY_MAX_TEXT_BYTES`` of
+    text is read in total.
+    """
+    found, budget = set(), max_text_bytes()
+    for member in iter_members(version):
+        if budget <= 0:
+            break
+        data = member.read(budget)
+        text = as_text(data)
+        if text is not None:
+            budget -= len(data)
+            found |= shingles(text)
+    return found
+
+
+def _minhash_numpy(values):
+    x = numpy.fromiter(values, dtype=numpy.uint64, count=len(values))
+    a = numpy.array([c[0] for c in COEFFS], dtype=numpy.uint64)[:, None]
+    b = numpy.array([c[1] for c in COEFFS], dtype=numpy.uint64)[:, None]
+    sig = numpy.full(NUM_PERM, PRIME, dtype=numpy.uint64)
+    for start in range(0, len(x), CHUNK):
+        hashed = (a * x[None, start:start + CHUNK] + b) % PRIME
+        numpy.minimum(sig, hashed.min(axis=1), out=sig)
+    return [int(v) for v in sig]
+
+
+def _minhash_python(values):
+    return [min((a * x + b) % PRIME for x in values) for a, b in COEFFS]
+
+
+def minhash(shingle_set):
+    """The MinHash signature (``NUM_PERM`` ints) of a non-empty shingle set.
+
+    Vectorised with NumPy when it is installed; the pure-Python fallback
+    gives the same signature, only more slowly.
+    """
+    if numpy is not None:
+        return _minhash_numpy(shingle_set)
+    return _minhash_python(shingle_set)
+
+
+def pack(signature):
+    return struct.pack(SIGNATURE_FORMAT, *signature)
+
+
+def unpack(data):
+    return struct.unpack(SIGNATURE_FORMAT, bytes(data))
+
+
+def buckets(signature):
+    """One signed 64-bit bucket per band; the band number is part of the hash."""
+    result = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f'<B{ROWS}I', band, *rows), digest_size=8).digest()
+        result.append(int.from_bytes(digest, 'little', signed=True))
+    return result
+
+
+def estimate(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def find_similar(version, signature):
+    """``(other version id, other project id, similarity)`` for stored
+    versions at least ``SIMILARITY_THRESHOLD`` similar to ``signature``.
+
+    Only versions sharing a band bucket are compared, most shared bands
+    first, and versions owned by the same student are left out.
+    """
+    from .models import SignatureBand, VersionSignature
+
+    candidates = (
+        SignatureBand.objects.filter(bucket__in=buckets(signature))
+        .exclude(version_id=version.pk)
+        .values('version_id').annotate(shared=Count('pk')).order_by('-shared')
+        .values_list('version_id', flat=True)[:max_candidates()]
+    )
+    rows = (
+        VersionSignature.objects.filter(version_id__in=list(candidates))
+        .exclude(version__project__owner_id=version.project.owner_id)
+        .values_list('version_id', 'version__project_id', 'minhash')
+    )
+    limit = threshold()
+    found = []
+    for other_id, project_id, data in rows:
+        score = estimate(signature, unpack(data))
+        if score >= limit:
+            found.append((other_id, project_id, score))
+    return found
+
+
+def index_version(version):
+    """Compute and store a version's signature, bands and matches.
+
+    Replaces anything stored for the version before. Returns the number of
+    similar versions found.
+    """
+    from .models import SignatureBand, SimilarVersion, VersionSignature
+
+    found = version_shingles(version)
+    signature = minhash(found) if found else None
+    matches = find_similar(version, signature) if signature else []
+    with transaction.atomic():
+        # projects whose pages list a pair that is about to be replaced
+        changed = set(SimilarVersion.objects.filter(other=version).values_list('version__project_id', flat=True))
+        SignatureBand.objects.filter(version=version).delete()
+        SimilarVersion.objects.filter(version=version).delete()
+        SimilarVersion.objects.filter(other=version).delete()
+        VersionSignature.objects.update_or_create(version=version, defaults={
+            'shingles': len(found),
+            'minhash': pack(signature) if signature else b'',
+        })
+        if signature:
+            SignatureBand.objects.bulk_create(SignatureBand(version=version, bucket=b) for b in buckets(signature))
+            pairs = []
+            for other_id, _, score in matches:
+                pairs.append(SimilarVersion(version=version, other_id=other_id, similarity=score))
+                pairs.append(SimilarVersion(version_id=other_id, other=version, similarity=score))
+            SimilarVersion.objects.bulk_create(pairs, ignore_conflicts=True)
+            changed.update(p for _, p, _ in matches)
+        if changed:
+            # both sides of every removed or added pair show it
+            watermarks.touch(changed | {version.project_id})
+    return len(matches)
+
+
+def index_version_id(pk):
+    """Index one version after its upload commits; errors are only logged."""
+    from .models import ProjectVersion
+
+    version = ProjectVersion.objects.select_related('project').filter(pk=pk, is_archived=False).first()
+    if version is None or not version.uploaded_file:
+        return
+    try:
+        index_version(version)
+    except Exception:
+        logger.exception('Could not index version %s for similarity', pk)
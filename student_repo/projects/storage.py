@@ -0,0 +1,28 @@
+"""Where and how project upload files are stored."""
+import os
+import re
+import uuid
+
+UPLOAD_ROOT = 'project_uploads'
+
+# project_uploads/ab/cd/abcd0123456789ef_name.zip
+SHARDED_NAME = re.compile(rf'^{UPLOAD_ROOT}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{16}}_')
+
+
+def shard_path(key, filename):
+    """Place ``filename`` under two levels of directories taken from ``key``.
+
+    With 256 x 256 directories no single directory grows large enough to
+    slow down lookups, listings or backups, and the key prefix keeps names
+    unique so the storage never has to probe for a free ``_xyz`` suffix.
+    """
+    return f'{UPLOAD_ROOT}/{key[:2]}/{key[2:4]}/{key}_{os.path.basename(filename)}'
+
+
+def version_upload_to(instance, filename):
+    """``upload_to`` for ProjectVersion.uploaded_file: a random sharded path."""
+    return shard_path(uuid.uuid4().hex[:16], filename)
+
+
+def is_sharded(name):
+    return bool(SHARDED_NAME.match(name or ''))
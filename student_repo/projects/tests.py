@@ -62,11 +62,28 @@ class ProjectSoftDeleteAndSubmittedTests(TestCase):
         self.assertEqual(resp.status_code, 302)
         self.proj.refresh_from_db()
         self.assertTrue(self.proj.is_deleted)
-from django.test import TestCase
+
+    def test_approved_project_cannot_be_deleted(self):
+        Review.objects.create(project=self.proj, reviewer=self.faculty, decision=Review.DECISION_APPROVED)
+        del_url = reverse('projects:delete_project', args=[self.proj.pk])
+        self.client.login(username='student', password='pass')
+        resp = self.client.post(del_url, follow=True)
+        self.assertContains(resp, 'Cannot delete a project in this state.')
+        self.proj.refresh_from_db()
+        self.assertFalse(self.proj.is_deleted)
+import importlib.util
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import Project, ProjectVersion
+from django.utils import timezone
+from .models import Project, ProjectVersion, Review
 from accounts.models import Profile
 
 User = get_user_model()
@@ -338,3 +355,1246 @@ class ProjectsTests(TestCase):
         body = resp2.content.decode('utf-8')
         self.assertIn('Beta Project', body)
         self.assertNotIn('Alpha Project', body)
+
+
+
+class StreamingUploadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('streamer', password='pw')
+        Profile.objects.create(user=self.user, type='S')
+        self.proj = Project.objects.create(owner=self.user, title='Stream', description='d')
+        self.client.login(username='streamer', password='pw')
+
+    def _handler(self, content_length, max_bytes=10):
+        from django.test import RequestFactory
+        from .uploads import ProjectUploadHandler
+
+        request = RequestFactory().post('/')
+        with self.settings(PROJECT_UPLOAD_MAX_BYTES=max_bytes):
+            handler = ProjectUploadHandler(request)
+        handler.handle_raw_input(None, {}, content_length, b'boundary')
+        return handler, request
+
+    def test_oversized_upload_is_rejected_by_content_length(self):
+        from django.core.files.uploadhandler import StopUpload
+
+        handler, request = self._handler(content_length=100 * 1024 ** 3)
+        with self.assertRaises(StopUpload):
+            handler.new_file('uploaded_file', 'huge.zip', 'application/zip', None)
+        self.assertEqual(request.upload_error, 'File too large. Max size is 10 bytes.')
+
+    def test_unlimited_form_field_size_setting(self):
+        media_root = tempfile.mkdtemp(prefix='stream-media-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=None, MEDIA_ROOT=media_root):
+            handler, _ = self._handler(content_length=200, max_bytes=1024)
+            handler.new_file('uploaded_file', 'small.zip', 'application/zip', None)
+            url = reverse('projects:upload_version', args=[self.proj.pk])
+            resp = self.client.post(url, {'uploaded_file': SimpleUploadedFile('a.zip', b'PK\x03\x04 body')})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.proj.versions.count(), 1)
+
+    def test_upload_is_aborted_mid_stream(self):
+        from django.core.files.uploadhandler import StopUpload
+
+        handler, request = self._handler(content_length=200)
+        handler.new_file('uploaded_file', 'small.zip', 'application/zip', None)
+        handler.receive_data_chunk(b'PK\x03\x04', 0)
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b'x' * 10, 4)
+        self.assertTrue(handler.file.closed)
+        self.assertIn('too large', request.upload_error)
+
+    def test_digest_and_type_are_computed_while_receiving(self):
+        import hashlib
+
+        handler, _ = self._handler(content_length=200, max_bytes=1024)
+        handler.new_file('uploaded_file', 'upload.bin', 'application/octet-stream', None)
+        handler.receive_data_chunk(b'PK\x03\x04', 0)
+        handler.receive_data_chunk(b'rest of the archive', 4)
+        f = handler.file_complete(23)
+        self.assertEqual(f.size, 23)
+        self.assertEqual(f.sha256, hashlib.sha256(b'PK\x03\x04rest of the archive').hexdigest())
+        self.assertEqual(f.detected_content_type, 'application/zip')
+        f.close()
+
+    def test_too_large_upload_reports_error_and_saves_nothing(self):
+        url = reverse('projects:upload_version', args=[self.proj.pk])
+        with self.settings(PROJECT_UPLOAD_MAX_BYTES=100):
+            resp = self.client.post(url, {'uploaded_file': SimpleUploadedFile('big.zip', b'x' * 1000)}, follow=True)
+        self.assertEqual(self.proj.versions.count(), 0)
+        self.assertContains(resp, 'File too large')
+
+    def test_upload_views_still_check_csrf(self):
+        from django.test import Client
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = reverse('projects:upload_version', args=[self.proj.pk])
+        resp = client.post(url, {'uploaded_file': SimpleUploadedFile('a.zip', b'PK\x03\x04')})
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(self.proj.versions.count(), 0)
+
+
+
+class FileMetadataTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='metadata-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('meta_student', password='pw')
+        Profile.objects.create(user=self.user, type='S')
+        self.proj = Project.objects.create(owner=self.user, title='Meta', description='d')
+        self.client.login(username='meta_student', password='pw')
+        self.data = b'PK\x03\x04' + b'archive body' * 100
+
+    def _upload(self):
+        url = reverse('projects:upload_version', args=[self.proj.pk])
+        self.client.post(url, {'uploaded_file': SimpleUploadedFile('My Work.zip', self.data)})
+        return self.proj.versions.get()
+
+    def test_upload_records_metadata(self):
+        import hashlib
+
+        v = self._upload()
+        self.assertTrue(v.file_present)
+        self.assertEqual(v.file_size, len(self.data))
+        self.assertEqual(v.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(v.content_type, 'application/zip')
+        self.assertEqual(v.original_filename, 'My Work.zip')
+
+    def test_download_uses_recorded_metadata(self):
+        v = self._upload()
+        resp = self.client.get(reverse('projects:download_version', args=[self.proj.pk, v.pk]))
+        self.assertEqual(resp['Content-Type'], 'application/zip')
+        self.assertEqual(resp['Content-Length'], str(len(self.data)))
+        self.assertIn('My Work.zip', resp['Content-Disposition'])
+        self.assertEqual(b''.join(resp.streaming_content), self.data)
+        resp.close()
+
+        v.uploaded_file.storage.delete(v.uploaded_file.name)
+        resp = self.client.get(reverse('projects:download_version', args=[self.proj.pk, v.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_download_of_row_without_metadata(self):
+        # as migrated by 0007, before scrub_uploads has run
+        v = self._upload()
+        ProjectVersion.objects.filter(pk=v.pk).update(content_type='', file_size=None)
+        resp = self.client.get(reverse('projects:download_version', args=[self.proj.pk, v.pk]))
+        self.assertEqual(resp['Content-Type'], 'application/zip')
+        self.assertEqual(resp['Content-Length'], str(len(self.data)))
+        resp.close()
+
+    def test_scrub_uploads_corrects_metadata(self):
+        import io
+        from django.core.management import call_command
+
+        ok = self._upload()
+        ProjectVersion.objects.filter(pk=ok.pk).update(sha256='0' * 64, file_size=1)
+        gone = ProjectVersion.objects.create(
+            project=self.proj, version_number=2, uploaded_file=SimpleUploadedFile('gone.txt', b'bye'),
+        )
+        gone.uploaded_file.storage.delete(gone.uploaded_file.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('scrub_uploads', workers=2, stdout=out, stderr=err)
+        self.assertIn('Checked 2 files: 1 missing, updated 2', out.getvalue())
+        ok.refresh_from_db()
+        gone.refresh_from_db()
+        self.assertEqual(ok.file_size, len(self.data))
+        self.assertNotEqual(ok.sha256, '0' * 64)
+        self.assertFalse(gone.file_present)
+
+    def test_backfill_uploads_resumes_from_checkpoint(self):
+        import hashlib
+        import io
+        import json
+        import os
+        from django.core.management import call_command
+
+        versions = [
+            ProjectVersion.objects.create(
+                project=self.proj, version_number=n, uploaded_file=SimpleUploadedFile(f'v{n}.py', b'x = %d\n' % n),
+            )
+            for n in range(1, 5)
+        ]
+        ProjectVersion.objects.update(sha256='', content_type='', file_size=None)
+        checkpoint = os.path.join(self.media_root, 'backfill.checkpoint')
+        with open(checkpoint, 'w') as fh:
+            json.dump({'last_pk': versions[1].pk}, fh)
+
+        out = io.StringIO()
+        call_command('backfill_uploads', workers=2, checkpoint=checkpoint, batch_size=1, nice=0, stdout=out)
+        self.assertIn(f'Backfilled 2 files (resumed after version {versions[1].pk})', out.getvalue())
+        self.assertIn('updated 2', out.getvalue())
+        self.assertFalse(os.path.exists(checkpoint))
+        done = ProjectVersion.objects.exclude(sha256='').order_by('pk')
+        self.assertEqual([v.pk for v in done], [v.pk for v in versions[2:]])
+        self.assertEqual(done[0].sha256, hashlib.sha256(b'x = 3\n').hexdigest())
+        self.assertEqual(done[0].content_type, 'text/x-python')
+
+        # a fresh run picks up the rest; finished rows are no longer selected
+        out = io.StringIO()
+        call_command('backfill_uploads', workers=2, checkpoint=checkpoint, nice=0, stdout=out)
+        self.assertIn('Backfilled 2 files: 0 missing, 0 failed, updated 2', out.getvalue())
+        self.assertFalse(ProjectVersion.objects.filter(sha256='').exists())
+
+    def test_backfill_uploads_charges_recorded_sizes(self):
+        import io
+        import os
+        from django.core.management import call_command
+        from . import quota
+
+        for n in range(1, 3):
+            ProjectVersion.objects.create(
+                project=self.proj, version_number=n, uploaded_file=SimpleUploadedFile(f'v{n}.py', b'z' * 100 * n),
+            )
+        # legacy rows: no recorded size, so nothing charged for them
+        ProjectVersion.objects.update(sha256='', content_type='', file_size=None)
+        quota.reconcile()
+
+        checkpoint = os.path.join(self.media_root, 'quota.checkpoint')
+        call_command('backfill_uploads', workers=1, checkpoint=checkpoint, nice=0, stdout=io.StringIO())
+        self.proj.refresh_from_db()
+        self.assertEqual((self.proj.bytes_used, quota.usage(self.user)), (300, 300))
+        for version in ProjectVersion.objects.all():
+            version.delete()
+        self.proj.refresh_from_db()
+        self.assertEqual((self.proj.bytes_used, quota.usage(self.user)), (0, 0))
+
+
+    def test_backfill_uploads_with_spawned_workers(self):
+        import io
+        import os
+        from django.core.management import call_command
+
+        versions = [
+            ProjectVersion.objects.create(
+                project=self.proj, version_number=n, uploaded_file=SimpleUploadedFile(f'v{n}.py', b'y = %d\n' % n),
+            )
+            for n in range(1, 3)
+        ]
+        ProjectVersion.objects.update(sha256='', content_type='', file_size=None)
+        checkpoint = os.path.join(self.media_root, 'spawn.checkpoint')
+
+        # spawned workers start without Django set up, as on Windows and macOS;
+        # they must also read this test's MEDIA_ROOT
+        out, err = io.StringIO(), io.StringIO()
+        call_command('backfill_uploads', workers=1, start_method='spawn', checkpoint=checkpoint, stdout=out, stderr=err)
+        self.assertIn('Backfilled 2 files: 0 missing, 0 failed, updated 2', out.getvalue(), err.getvalue())
+        for version in versions:
+            version.refresh_from_db()
+            self.assertEqual(version.file_size, 6)
+
+
+class ShardedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='shard-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('shard_student', password='pw')
+        self.proj = Project.objects.create(owner=self.user, title='Shard', description='d')
+
+    def test_new_uploads_are_sharded(self):
+        from .storage import is_sharded
+
+        v = ProjectVersion.objects.create(project=self.proj, uploaded_file=SimpleUploadedFile('a.zip', b'PK'))
+        self.assertTrue(is_sharded(v.uploaded_file.name), v.uploaded_file.name)
+        self.assertTrue(v.uploaded_file.name.endswith('_a.zip'))
+
+    def test_shard_uploads_moves_flat_files(self):
+        import io
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+        from .storage import is_sharded
+
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        old = storage.save('project_uploads/legacy.zip', ContentFile(b'legacy bytes'))
+        v1 = ProjectVersion.objects.create(project=self.proj, version_number=1)
+        v2 = ProjectVersion.objects.create(project=self.proj, version_number=2)
+        ProjectVersion.objects.filter(pk__in=[v1.pk, v2.pk]).update(uploaded_file=old)
+        lost = ProjectVersion.objects.create(project=self.proj, version_number=3)
+        ProjectVersion.objects.filter(pk=lost.pk).update(uploaded_file='project_uploads/lost.zip')
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('shard_uploads', batch_size=1, stdout=out, stderr=err)
+        self.assertIn('Moved 1 files; 1 missing, 0 old files kept', out.getvalue())
+
+        v1.refresh_from_db()
+        v2.refresh_from_db()
+        self.assertTrue(is_sharded(v1.uploaded_file.name))
+        self.assertEqual(v1.uploaded_file.name, v2.uploaded_file.name)
+        self.assertFalse(storage.exists(old))
+        with v1.uploaded_file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'legacy bytes')
+
+        # re-running only retries what is still unmoved
+        call_command('shard_uploads', stdout=out, stderr=err)
+        self.assertIn('Moved 0 files; 1 missing', out.getvalue())
+
+    def test_shard_uploads_keeps_files_still_referenced(self):
+        import io
+        import os
+        import time
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+
+        storage = ProjectVersion._meta.get_field('uploaded_file').storage
+        old = storage.save('project_uploads/shared.zip', ContentFile(b'shared bytes'))
+        past = time.time() - 30 * 86400
+        os.utime(storage.path(old), (past, past))
+        live = ProjectVersion.objects.create(project=self.proj, version_number=1)
+        archived = ProjectVersion.objects.create(project=self.proj, version_number=2)
+        ProjectVersion.objects.filter(pk=live.pk).update(uploaded_file=old)
+        ProjectVersion.objects.filter(pk=archived.pk).update(uploaded_file=old, is_archived=True)
+
+        out = io.StringIO()
+        call_command('shard_uploads', stdout=out, stderr=io.StringIO())
+        self.assertIn('Moved 1 files; 0 missing, 1 old files kept', out.getvalue())
+        live.refresh_from_db()
+        self.assertNotEqual(live.uploaded_file.name, old)
+        # the archived row still names the old file, so it is not deleted
+        self.assertTrue(storage.exists(old))
+        # the new link is fresh, so gc_uploads' grace period covers it
+        self.assertGreater(os.path.getmtime(storage.path(live.uploaded_file.name)), past + 86400)
+
+
+
+class CompressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='compress-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, UPLOAD_COMPRESSION='gzip')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('gz_student', password='pw')
+        Profile.objects.create(user=self.user, type='S')
+        self.proj = Project.objects.create(owner=self.user, title='Gz', description='d')
+        self.client.login(username='gz_student', password='pw')
+        self.text = b'def main():\n    return 42\n' * 400
+
+    def _version(self, name, data):
+        return ProjectVersion.objects.create(project=self.proj, uploaded_file=SimpleUploadedFile(name, data))
+
+    def test_compressible_upload_is_stored_gzipped(self):
+        import gzip
+        import hashlib
+
+        v = self._version('main.py', self.text)
+        self.assertEqual(v.content_encoding, 'gzip')
+        self.assertTrue(v.uploaded_file.name.endswith('_main.py.gz'))
+        self.assertEqual(v.file_size, len(self.text))
+        self.assertLess(v.stored_size, len(self.text) // 10)
+        self.assertEqual(v.sha256, hashlib.sha256(self.text).hexdigest())
+        with v.uploaded_file.open('rb') as fh:
+            self.assertEqual(gzip.decompress(fh.read()), self.text)
+
+    def test_archives_are_stored_as_is(self):
+        v = self._version('work.zip', b'PK\x03\x04' + self.text)
+        self.assertEqual(v.content_encoding, '')
+        self.assertEqual(v.stored_size, v.file_size)
+
+    def test_download_negotiates_encoding(self):
+        import gzip
+
+        v = self._version('main.py', self.text)
+        url = reverse('projects:download_version', args=[self.proj.pk, v.pk])
+
+        resp = self.client.get(url, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(resp['Content-Length'], str(v.stored_size))
+        self.assertIn('Accept-Encoding', resp['Vary'])
+        self.assertIn('main.py"', resp['Content-Disposition'])
+        self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)), self.text)
+        resp.close()
+
+        resp = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertEqual(resp['Content-Length'], str(len(self.text)))
+        self.assertEqual(b''.join(resp.streaming_content), self.text)
+        resp.close()
+
+    def test_scrub_reads_compressed_files(self):
+        import io
+        from django.core.management import call_command
+
+        self._version('main.py', self.text)
+        out = io.StringIO()
+        call_command('scrub_uploads', stdout=out)
+        self.assertIn('Checked 1 files: 0 missing, updated 0', out.getvalue())
+
+
+class ColdStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='cold-media-')
+        self.cold_root = tempfile.mkdtemp(prefix='cold-packs-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.cold_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, COLD_STORAGE_ROOT=self.cold_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('cold_student', password='pw')
+        Profile.objects.create(user=self.user, type='S')
+        self.proj = Project.objects.create(owner=self.user, title='Cold', description='d')
+        self.client.login(username='cold_student', password='pw')
+        self.old = ProjectVersion.objects.create(
+            project=self.proj, version_number=1, uploaded_file=SimpleUploadedFile('v1.py', b'print(1)\n' * 200),
+        )
+        self.new = ProjectVersion.objects.create(
+            project=self.proj, version_number=2, uploaded_file=SimpleUploadedFile('v2.py', b'print(2)\n'),
+        )
+
+    def _archive(self, *args):
+        import io
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command('archive_versions', *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def test_superseded_versions_are_packed(self):
+        import os
+
+        out = self._archive('--superseded')
+        self.assertIn('Packed 1 files into 1 packs', out)
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertTrue(self.old.is_archived)
+        self.assertTrue(os.path.exists(os.path.join(self.cold_root, self.old.pack_name)))
+        self.assertFalse(self.old.uploaded_file.storage.exists(self.old.uploaded_file.name))
+        self.assertFalse(self.new.is_archived)
+        self.assertTrue(self.new.uploaded_file.storage.exists(self.new.uploaded_file.name))
+
+    def test_age_policy(self):
+        self.assertIn('Packed 0 files', self._archive('--older-than', '1'))
+        ProjectVersion.objects.update(created_at=timezone.now() - timedelta(days=10))
+        self.assertIn('Packed 2 files into 1 packs', self._archive('--older-than', '7'))
+
+    def test_download_restores_archived_file(self):
+        self._archive('--superseded')
+        url = reverse('projects:download_version', args=[self.proj.pk, self.old.pk])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), b'print(1)\n' * 200)
+        resp.close()
+        self.old.refresh_from_db()
+        self.assertFalse(self.old.is_archived)
+        self.assertIsNotNone(self.old.restored_at)
+        pack_name = self.old.pack_name
+
+        # the restored copy stays hot until --cache-days passes, then is evicted
+        self.assertIn('evicted 0 restored', self._archive('--superseded'))
+        ProjectVersion.objects.filter(pk=self.old.pk).update(restored_at=timezone.now() - timedelta(days=60))
+        out = self._archive('--superseded', '--cache-days', '30')
+        self.assertIn('Packed 0 files into 0 packs; evicted 1 restored', out)
+        self.old.refresh_from_db()
+        self.assertTrue(self.old.is_archived)
+        self.assertEqual(self.old.pack_name, pack_name)
+
+    def test_missing_pack_is_404(self):
+        import os
+
+        self._archive('--superseded')
+        self.old.refresh_from_db()
+        os.remove(os.path.join(self.cold_root, self.old.pack_name))
+        resp = self.client.get(reverse('projects:download_version', args=[self.proj.pk, self.old.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+
+class SoftDeleteManagerTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='purge-media-')
+        self.cold_root = tempfile.mkdtemp(prefix='purge-packs-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.cold_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, COLD_STORAGE_ROOT=self.cold_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('sd_student', password='pw')
+        Profile.objects.create(user=self.user, type='S')
+        self.live = Project.objects.create(owner=self.user, title='Live', description='d')
+        self.gone = Project.objects.create(owner=self.user, title='Gone', description='d')
+        self.version = ProjectVersion.objects.create(project=self.gone, uploaded_file=SimpleUploadedFile('gone.py', b'x = 1\n'))
+        reviewer = User.objects.create_user('sd_faculty', password='pw')
+        Review.objects.create(project=self.gone, reviewer=reviewer, decision=Review.DECISION_REJECTED)
+        self.gone.soft_delete()
+
+    def test_default_manager_hides_deleted(self):
+        self.assertEqual(list(Project.objects.all()), [self.live])
+        self.assertEqual(Project.all_objects.count(), 2)
+        self.assertEqual(list(self.user.projects.all()), [self.live])
+        self.client.login(username='sd_student', password='pw')
+        resp = self.client.get(reverse('projects:project_detail', args=[self.gone.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_purge_moves_old_deleted_projects_out(self):
+        import io
+        import os
+        from django.core.management import call_command
+        from .models import ArchivedProject
+
+        out = io.StringIO()
+        call_command('purge_deleted_projects', stdout=out)
+        self.assertIn('Purged 0 projects', out.getvalue())
+
+        Project.all_objects.filter(pk=self.gone.pk).update(deleted_at=timezone.now() - timedelta(days=100))
+        out = io.StringIO()
+        call_command('purge_deleted_projects', '--older-than', '90', stdout=out)
+        self.assertIn('Purged 1 projects with 1 versions; 1 files moved', out.getvalue())
+
+        self.assertFalse(Project.all_objects.filter(pk=self.gone.pk).exists())
+        self.assertFalse(ProjectVersion.objects.filter(pk=self.version.pk).exists())
+        self.assertFalse(Review.objects.filter(project_id=self.gone.pk).exists())
+        self.assertFalse(self.version.uploaded_file.storage.exists(self.version.uploaded_file.name))
+        archived = ArchivedProject.objects.get(project_id=self.gone.pk)
+        self.assertEqual(archived.data['project']['title'], 'Gone')
+        self.assertEqual(len(archived.data['reviews']), 1)
+        pack_name = archived.data['versions'][0]['pack_name']
+        self.assertTrue(os.path.exists(os.path.join(self.cold_root, pack_name)))
+        self.assertTrue(Project.objects.filter(pk=self.live.pk).exists())
+
+
+class UploadGCTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='gc-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('gc_student', password='pw')
+        self.proj = Project.objects.create(owner=self.user, title='GC', description='d')
+
+    def _gc(self, *args):
+        import io
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command('gc_uploads', *args, stdout=out)
+        return out.getvalue()
+
+    def test_removes_only_old_unreferenced_files(self):
+        import os
+
+        kept = ProjectVersion.objects.create(project=self.proj, uploaded_file=SimpleUploadedFile('kept.py', b'1'))
+        gone = ProjectVersion.objects.create(project=self.proj, uploaded_file=SimpleUploadedFile('gone.py', b'22'))
+        storage = kept.uploaded_file.storage
+        gone_name = gone.uploaded_file.name
+        gone.delete()
+        fresh = storage.save('project_uploads/ff/ff/ffffffffffffffff_fresh.py', SimpleUploadedFile('fresh.py', b'3'))
+        past = time.time() - 2 * 86400
+        for name in (kept.uploaded_file.name, gone_name):
+            os.utime(storage.path(name), (past, past))
+
+        self.assertIn('1 orphaned (2 bytes), deleted 0', self._gc('--dry-run'))
+        self.assertTrue(storage.exists(gone_name))
+        self.assertIn('Scanned 3 files: 1 orphaned (2 bytes), deleted 1.', self._gc('--batch-size', '2'))
+        self.assertFalse(storage.exists(gone_name))
+        self.assertTrue(storage.exists(kept.uploaded_file.name))
+        # younger than the grace period: may belong to an upload in flight
+        self.assertTrue(storage.exists(fresh))
+
+
+@override_settings(STORAGE_QUOTA_BYTES=1000)
+class StorageQuotaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='quota-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('quota_student', password='pw')
+        Profile.objects.create(user=self.user, type='S')
+        self.proj = Project.objects.create(owner=self.user, title='Quota', description='d')
+        self.client.login(username='quota_student', password='pw')
+
+    def _usage(self):
+        from . import quota
+        self.proj.refresh_from_db()
+        return self.proj.bytes_used, quota.usage(self.user)
+
+    def _version(self, size):
+        return ProjectVersion.objects.create(project=self.proj, uploaded_file=SimpleUploadedFile('f.py', b'x' * size))
+
+    def test_counters_follow_creates_and_deletes(self):
+        v = self._version(300)
+        self._version(200)
+        self.assertEqual(self._usage(), (500, 500))
+        v.delete()
+        self.assertEqual(self._usage(), (200, 200))
+        self.proj.soft_delete()
+        self.assertEqual(self._usage(), (200, 0))
+
+    def test_upload_over_quota_is_rejected(self):
+        self._version(900)
+        url = reverse('projects:upload_version', args=[self.proj.pk])
+        resp = self.client.post(url, {'uploaded_file': SimpleUploadedFile('big.py', b'y' * 200)}, follow=True)
+        self.assertContains(resp, 'Storage quota exceeded')
+        self.assertEqual(self.proj.versions.count(), 1)
+        self.assertEqual(self._usage(), (900, 900))
+
+        resp = self.client.post(url, {'uploaded_file': SimpleUploadedFile('ok.py', b'z' * 100)})
+        self.assertEqual(self.proj.versions.count(), 2)
+        self.assertEqual(self._usage(), (1000, 1000))
+
+    def test_reconcile_fixes_drift(self):
+        import io
+        from django.core.management import call_command
+        from .models import StorageUsage
+
+        self._version(300)
+        StorageUsage.objects.update(bytes_used=5)
+        Project.objects.update(bytes_used=7)
+        out = io.StringIO()
+        call_command('reconcile_storage', stdout=out)
+        self.assertIn('corrected 1 user totals', out.getvalue())
+        self.assertEqual(self._usage(), (300, 300))
+
+    def test_scrub_charges_sizes_it_fills_in(self):
+        import io
+        from django.core.management import call_command
+        from . import quota
+
+        # a legacy row: no recorded size, so nothing charged for it
+        v = self._version(300)
+        ProjectVersion.objects.filter(pk=v.pk).update(file_size=None)
+        quota.reconcile()
+        self.assertEqual(self._usage(), (0, 0))
+        call_command('scrub_uploads', stdout=io.StringIO())
+        self.assertEqual(self._usage(), (300, 300))
+        v.delete()
+        self.assertEqual(self._usage(), (0, 0))
+
+    def test_release_never_goes_below_zero(self):
+        from .models import StorageUsage
+
+        v = self._version(300)
+        StorageUsage.objects.update(bytes_used=100)
+        Project.objects.update(bytes_used=100)
+        v.delete()
+        self.assertEqual(self._usage(), (0, 0))
+
+    def test_usage_shown_on_dashboard_and_user_list(self):
+        self._version(300)
+        resp = self.client.get(reverse('accounts:dashboard_student'))
+        self.assertContains(resp, '300\xa0bytes of 1000\xa0bytes')
+        admin = User.objects.create_user('quota_admin', password='pw', is_staff=True)
+        Profile.objects.create(user=admin, type='A')
+        self.client.login(username='quota_admin', password='pw')
+        resp = self.client.get(reverse('accounts:manage_users'))
+        self.assertContains(resp, '300\xa0bytes')
+
+
+class SearchJsonTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('json_owner', password='pw')
+        Profile.objects.create(user=owner, type='S')
+        self.alpha = Project.objects.create(owner=owner, title='Alpha JSON', description='d')
+        self.beta = Project.objects.create(owner=owner, title='Beta JSON', description='d')
+        self.fac = User.objects.create_user('json_fac', password='pw')
+        Profile.objects.create(user=self.fac, type='F')
+        self.client.login(username='json_fac', password='pw')
+        self.url = reverse('projects:search_projects') + '?q=JSON'
+
+    def _get(self, **headers):
+        return self.client.get(self.url, HTTP_ACCEPT='application/json', **headers)
+
+    def test_rows_and_revalidation(self):
+        resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        rows = resp.json()['results']
+        self.assertEqual([r['id'] for r in rows], [self.beta.pk, self.alpha.pk])
+        self.assertEqual(rows[0]['owner'], 'json_owner')
+        self.assertEqual(rows[0]['status'], 'Pending')
+        self.assertNotIn('delete_url', rows[0])
+        self.assertIn('Accept', resp['Vary'])
+
+        resp2 = self._get(HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp2.status_code, 304)
+        self.assertEqual(resp2.content, b'')
+
+        # a review changes a row's status and so the ETag
+        Review.objects.create(project=self.alpha, reviewer=self.fac, decision=Review.DECISION_APPROVED)
+        resp3 = self._get(HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp3.status_code, 200)
+        self.assertEqual(resp3.json()['results'][1]['status'], 'Approved')
+
+    def test_html_requests_still_get_html(self):
+        resp = self.client.get(self.url)
+        self.assertContains(resp, f'data-id="{self.alpha.pk}"')
+        self.assertContains(resp, 'id="project-row-template"')
+        resp = self.client.get(self.url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertContains(resp, 'Alpha JSON')
+
+    def test_writes_touch_the_project(self):
+        old = timezone.now() - timedelta(days=1)
+        Project.all_objects.filter(pk=self.alpha.pk).update(updated_at=old)
+        version = ProjectVersion.objects.create(project=self.alpha, version_number=1)
+        self.alpha.refresh_from_db()
+        self.assertGreater(self.alpha.updated_at, old)
+
+        Project.all_objects.filter(pk=self.alpha.pk).update(updated_at=old)
+        version.delete()
+        self.alpha.refresh_from_db()
+        self.assertGreater(self.alpha.updated_at, old)
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('cond_owner', password='pw')
+        Profile.objects.create(user=self.owner, type='S')
+        self.proj = Project.objects.create(owner=self.owner, title='Conditional', description='d')
+        self.fac = User.objects.create_user('cond_fac', password='pw')
+        Profile.objects.create(user=self.fac, type='F')
+
+    def _revalidate(self, url, user):
+        self.client.force_login(user)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('private', resp['Cache-Control'])
+        return resp['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+    def test_unchanged_pages_are_not_modified(self):
+        for name, args, user in (
+            ('projects:my_projects', [], self.owner),
+            ('projects:project_detail', [self.proj.pk], self.owner),
+            ('projects:project_detail', [self.proj.pk], self.fac),
+            ('projects:submitted_projects', [], self.fac),
+        ):
+            with self.subTest(name=name, user=user.username):
+                etag, resp = self._revalidate(reverse(name, args=args), user)
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp['ETag'], etag)
+
+    def test_writes_move_the_watermarks(self):
+        from . import watermarks
+        detail = reverse('projects:project_detail', args=[self.proj.pk])
+        etag, _ = self._revalidate(detail, self.fac)
+        before = watermarks.changed_at(watermarks.owner_key(self.owner.pk))
+
+        Review.objects.create(project=self.proj, reviewer=self.fac, decision=Review.DECISION_APPROVED)
+        self.assertEqual(self.client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertGreater(watermarks.changed_at(watermarks.owner_key(self.owner.pk)), before)
+
+        etag, _ = self._revalidate(reverse('projects:submitted_projects'), self.fac)
+        self.proj.soft_delete()
+        resp = self.client.get(reverse('projects:submitted_projects'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, 'Conditional')
+
+    def test_other_users_and_pending_messages_get_full_responses(self):
+        from django.contrib.messages import constants
+
+        detail = reverse('projects:project_detail', args=[self.proj.pk])
+        etag, _ = self._revalidate(detail, self.owner)
+        other = User.objects.create_user('cond_other', password='pw')
+        Profile.objects.create(user=other, type='S')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+        etag, _ = self._revalidate(reverse('projects:my_projects'), self.owner)
+        # a refused request leaves a flash message for the next page
+        self.client.get(reverse('projects:review_project', args=[self.proj.pk]))
+        resp = self.client.get(reverse('projects:my_projects'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([m.level for m in resp.context['messages']], [constants.ERROR])
+
+
+@override_settings(SIMILARITY_THRESHOLD=0.6, SIMILARITY_ON_UPLOAD=True)
+class SimilarityTests(TestCase):
+    def setUp(self):
+        import random
+
+        self.media_root = tempfile.mkdtemp(prefix='similarity-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.students = []
+        for name in ('sim_a', 'sim_b', 'sim_c'):
+            user = User.objects.create_user(name, password='pw')
+            Profile.objects.create(user=user, type='S')
+            self.students.append(Project.objects.create(owner=user, title=f'Project {name}', description='d'))
+        self.fac = User.objects.create_user('sim_fac', password='pw')
+        Profile.objects.create(user=self.fac, type='F')
+        rng = random.Random(7)
+        words = [f'w{i}' for i in range(500)]
+        self.text = ' '.join(rng.choice(words) for _ in range(3000))
+        self.other_text = ' '.join(rng.choice(words) for _ in range(3000))
+
+    def _zip(self, files):
+        import io
+        import zipfile
+
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            for name, data in files.items():
+                zf.writestr(name, data)
+        return buf.getvalue()
+
+    def _tar_gz(self, files):
+        import io
+        import tarfile
+
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode='w:gz') as tf:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        return buf.getvalue()
+
+    def _upload(self, proj, name, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProjectVersion.objects.create(project=proj, uploaded_file=SimpleUploadedFile(name, data))
+
+    def test_near_duplicates_across_archive_formats(self):
+        from .models import SimilarVersion
+
+        a, b, c = self.students
+        original = self._upload(a, 'a.zip', self._zip({'main.py': self.text.encode(), 'logo.bin': bytes(range(256))}))
+        # a few edits and a different archive format
+        edited = self.text.replace('w1 ', 'x1 ', 3) + ' extra words at the end'
+        copy = self._upload(b, 'b.tar.gz', self._tar_gz({'src/main.py': edited.encode()}))
+        self._upload(c, 'c.py', self.other_text.encode())
+
+        pairs = set(SimilarVersion.objects.values_list('version_id', 'other_id'))
+        self.assertEqual(pairs, {(original.pk, copy.pk), (copy.pk, original.pk)})
+        self.assertGreater(SimilarVersion.objects.get(version=copy).similarity, 0.8)
+        self.assertEqual(copy.signature_bands.count(), 16)
+
+        detail = reverse('projects:project_detail', args=[b.pk])
+        self.client.force_login(self.fac)
+        resp = self.client.get(detail)
+        self.assertContains(resp, 'Similar Submissions')
+        self.assertContains(resp, 'by sim_a')
+        self.client.force_login(b.owner)
+        self.assertNotContains(self.client.get(detail), 'by sim_a')
+
+    def test_same_owner_is_not_matched_and_backfill(self):
+        import io
+
+        from django.core.management import call_command
+        from .models import SimilarVersion, VersionSignature
+
+        a, b, _ = self.students
+        with self.settings(SIMILARITY_ON_UPLOAD=False):
+            self._upload(a, 'one.py', self.text.encode())
+            self._upload(a, 'two.py', self.text.encode())
+            other = self._upload(b, 'three.py', self.text.encode())
+            binary = self._upload(b, 'blob.bin', bytes(range(256)) * 8)
+        self.assertFalse(VersionSignature.objects.exists())
+
+        call_command('index_similarity', stdout=io.StringIO())
+        self.assertEqual(VersionSignature.objects.count(), 4)
+        self.assertEqual(VersionSignature.objects.get(version=binary).shingles, 0)
+        # both of a's versions match b's copy, but not each other
+        self.assertEqual(SimilarVersion.objects.filter(version=other).count(), 2)
+        self.assertEqual(SimilarVersion.objects.count(), 4)
+
+        out = io.StringIO()
+        call_command('index_similarity', stdout=out)
+        self.assertIn('Indexed 0 versions', out.getvalue())
+        call_command('index_similarity', '--reindex', stdout=io.StringIO())
+        self.assertEqual(SimilarVersion.objects.count(), 4)
+
+    def test_reindex_that_drops_a_pair_touches_both_projects(self):
+        from . import similarity
+        from .models import SimilarVersion
+
+        a, b, _ = self.students
+        original = self._upload(a, 'a.py', self.text.encode())
+        self._upload(b, 'b.py', self.text.encode())
+        self.assertEqual(SimilarVersion.objects.count(), 2)
+        before = Project.objects.get(pk=b.pk).updated_at
+
+        # the file is replaced by unrelated text, so the pair goes away
+        with open(original.uploaded_file.path, 'wb') as fh:
+            fh.write(self.other_text.encode())
+        self.assertEqual(similarity.index_version(original), 0)
+        self.assertFalse(SimilarVersion.objects.exists())
+        # b's page no longer lists the pair, so its cached copies are stale
+        self.assertGreater(Project.objects.get(pk=b.pk).updated_at, before)
+
+    def test_signature_estimates_jaccard(self):
+        from . import similarity
+
+        a, b = set(range(0, 3000)), set(range(1000, 4000))
+        sig_a, sig_b = similarity.minhash(a), similarity.minhash(b)
+        self.assertEqual(sig_a, similarity.minhash(set(a)))
+        self.assertEqual(similarity.unpack(similarity.pack(sig_a)), tuple(sig_a))
+        self.assertAlmostEqual(similarity.estimate(sig_a, sig_b), 0.5, delta=0.15)
+        self.assertEqual(similarity.estimate(sig_a, sig_a), 1.0)
+
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'NumPy is not installed')
+    def test_numpy_and_python_signatures_match(self):
+        from . import similarity
+
+        self.assertIsNotNone(similarity.numpy)
+        # more values than one NumPy chunk, to cover the chunked minimum
+        found = similarity.shingles(self.text) | set(range(0, 2 ** 32, 2 ** 32 // (3 * similarity.CHUNK)))
+        self.assertEqual(similarity._minhash_numpy(found), similarity._minhash_python(found))
+
+    def test_signatures_without_numpy(self):
+        from unittest import mock
+
+        from . import similarity
+
+        found = similarity.shingles(self.text)
+        with mock.patch.object(similarity, 'numpy', None):
+            signature = similarity.minhash(found)
+        self.assertEqual(signature, similarity._minhash_python(found))
+        self.assertEqual(len(signature), similarity.NUM_PERM)
+
+
+class VersionDiffTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='diff-media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.student = User.objects.create_user('diff_student', password='pw')
+        Profile.objects.create(user=self.student, type='S')
+        self.proj = Project.objects.create(owner=self.student, title='Diffed', description='d')
+        self.fac = User.objects.create_user('diff_fac', password='pw')
+        Profile.objects.create(user=self.fac, type='F')
+        self.client.force_login(self.fac)
+
+    def _archive(self, files, tar=False):
+        import io
+        import tarfile
+        import zipfile
+
+        buf = io.BytesIO()
+        if tar:
+            with tarfile.open(fileobj=buf, mode='w:gz') as tf:
+                for name, data in files.items():
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    tf.addfile(info, io.BytesIO(data))
+        else:
+            with zipfile.ZipFile(buf, 'w') as zf:
+                for name, data in files.items():
+                    zf.writestr(name, data)
+        return buf.getvalue()
+
+    def _versions(self, before, after, tar=False):
+        name = 'src.tar.gz' if tar else 'src.zip'
+        return [
+            ProjectVersion.objects.create(
+                project=self.proj, version_number=n,
+                uploaded_file=SimpleUploadedFile(name, self._archive(files, tar)),
+            )
+            for n, files in ((1, before), (2, after))
+        ]
+
+    def test_only_changed_members_are_diffed(self):
+        from unittest import mock
+        from . import archives
+        from .models import VersionDiff
+
+        old, new = self._versions(
+            {'same.py': b'print(1)\n', 'main.py': b'a = 1\nb = 2\nc = 3\n', 'logo.png': b'\x89PNG\x00'},
+            {'same.py': b'print(1)\n', 'main.py': b'a = 1\nb = 20\nc = 3\n', 'new.py': b'x = 1\n'},
+        )
+        url = reverse('projects:diff_versions', args=[self.proj.pk, old.pk, new.pk])
+        read = archives.Member.read
+        with mock.patch.object(archives.Member, 'read', autospec=True, side_effect=read) as spy:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('same.py', {call.args[0].name for call in spy.call_args_list})
+
+        files = {f['name']: f for f in resp.context['diff']['files']}
+        self.assertEqual({n: f['status'] for n, f in files.items()},
+                         {'main.py': 'changed', 'new.py': 'added', 'logo.png': 'removed'})
+        self.assertEqual(resp.context['diff']['unchanged'], 1)
+        self.assertIn(['del', 'b = 2'], files['main.py']['lines'])
+        self.assertIn(['add', 'b = 20'], files['main.py']['lines'])
+        self.assertIsNone(files['logo.png']['lines'])
+        self.assertContains(resp, 'b = 20')
+
+        # the second view comes from the cache, even with the files gone
+        self.assertEqual(VersionDiff.objects.count(), 1)
+        shutil.rmtree(self.media_root)
+        self.assertContains(self.client.get(url), 'b = 20')
+
+    def test_tar_uploads_and_access(self):
+        old, new = self._versions(
+            {'pkg/a.py': b'one\n', 'pkg/b.py': b'two\n'},
+            {'pkg/a.py': b'one\n', 'pkg/b.py': b'three\n'},
+            tar=True,
+        )
+        url = reverse('projects:diff_versions', args=[self.proj.pk, old.pk, new.pk])
+        diff = self.client.get(url).context['diff']
+        self.assertEqual([f['name'] for f in diff['files']], ['pkg/b.py'])
+        self.assertEqual(diff['unchanged'], 1)
+
+        detail = self.client.get(reverse('projects:project_detail', args=[self.proj.pk]))
+        self.assertContains(detail, url)
+
+        other = User.objects.create_user('diff_other', password='pw')
+        Profile.objects.create(user=other, type='S')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+# Query budgets -------------------------------------------------------------
+
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+
+from monitoring import profiler
+from .diffs import version_diff
+from .seeding import make_archive, seed_projects, seed_users
+
+BUDGET_MEDIA_ROOT = tempfile.mkdtemp(prefix='budget-media-')
+
+
+@override_settings(MEDIA_ROOT=BUDGET_MEDIA_ROOT, PROFILE_DIR=os.path.join(BUDGET_MEDIA_ROOT, 'profiles'))
+class QueryBudgetTests(TestCase):
+    """Every page must run a fixed number of queries whatever the data size,
+    and none of them may full-scan the projects tables.
+
+    Each case is requested with 10 projects in the database and again after
+    growing it to 1,000; both runs must match and stay within the budget.
+    """
+
+    SMALL = 10
+    LARGE = 1000
+    GUARDED_TABLES = ('projects_project', 'projects_projectversion', 'projects_review')
+
+    # label -> maximum number of queries (session and auth lookups included)
+    BUDGETS = {
+        # the three watermarked pages include their watermark lookup
+        'projects:my_projects': 5,
+        'projects:create_project': 3,
+        'projects:submitted_projects': 5,
+        'projects:search_projects': 4,
+        'projects:search_projects?q': 4,
+        'projects:search_projects?status=Pending': 4,
+        'projects:search_projects?status=Approved': 4,
+        'projects:search_projects?status=Rejected': 4,
+        'projects:project_detail': 8,
+        'projects:project_detail[faculty]': 9,
+        'projects:delete_project': 5,
+        'projects:upload_version': 5,
+        'projects:review_project': 5,
+        'projects:admin_override_status': 3,
+        'projects:download_version': 6,
+        'projects:diff_versions': 6,
+        'accounts:register': 0,
+        'accounts:login': 0,
+        'accounts:logout': 4,
+        'accounts:profile': 3,
+        'accounts:password_change': 2,
+        'accounts:password_change_done': 2,
+        'accounts:dashboard_student': 6,
+        'accounts:dashboard_faculty': 4,
+        'accounts:dashboard_admin': 8,
+        'accounts:post_login': 3,
+        'accounts:manage_users': 4,
+        # measured with the role totals uncached; a search counts its matches too
+        'accounts:manage_users?q': 5,
+        'accounts:manage_users?type=F': 4,
+        'accounts:bulk_users': 3,
+        'accounts:edit_user': 4,
+        'accounts:delete_user': 3,
+        'register': 0,
+        'login': 0,
+        'logout': 4,
+        'profile': 3,
+        'password_change': 2,
+        'password_change_done': 2,
+        'dashboard_student': 6,
+        'dashboard_faculty': 4,
+        'dashboard_admin': 8,
+        'post_login': 3,
+        'home': 3,
+        'metrics': 3,
+        'monitoring:slow_queries': 3,
+        'monitoring:memory': 3,
+        'monitoring:profiles': 3,
+        'monitoring:profile_file': 3,
+        'notifications:list': 3,
+        'notifications:stream': 4,
+        'api:projects': 4,
+        'api:projects?include': 6,
+        'api:versions': 4,
+        'api:reviews': 4,
+        'api:users': 3,
+        'reports:overview': 5,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = seed_users(1, 'S', 'budget_student')[0]
+        cls.faculty = seed_users(1, 'F', 'budget_faculty')[0]
+        cls.admin = seed_users(1, 'A', 'budget_admin')[0]
+        cls.admin.is_staff = True
+        cls.admin.save()
+        cls.others = seed_users(4, 'S', 'budget_other')
+        cls.owners = [cls.student] + cls.others
+
+        cls.proj = Project.objects.create(owner=cls.student, title='Budget project', description='d')
+        cls.version = ProjectVersion.objects.create(
+            project=cls.proj,
+            version_number=1,
+            uploaded_file=SimpleUploadedFile('budget.zip', b'PK\x03\x04budget'),
+        )
+        cls.next_version = ProjectVersion.objects.create(
+            project=cls.proj,
+            version_number=2,
+            uploaded_file=SimpleUploadedFile('budget.zip', make_archive(2, 2048)),
+        )
+        # measured as a repeat view, served from the diff cache
+        version_diff(cls.version, cls.next_version)
+        seed_projects(cls.owners, cls.SMALL - 1, reviewers=[cls.faculty])
+        cls.profile_id = profiler.save(Counter({'main': 1}), None, {'path': '/'})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(BUDGET_MEDIA_ROOT, ignore_errors=True)
+
+    def _cases(self):
+        """Return (label, url, user) for every GET-able route."""
+        p, v = self.proj.pk, self.version.pk
+        stu, fac, adm = self.student, self.faculty, self.admin
+        cases = [
+            ('projects:my_projects', reverse('projects:my_projects'), stu),
+            ('projects:create_project', reverse('projects:create_project'), stu),
+            ('projects:submitted_projects', reverse('projects:submitted_projects'), fac),
+            ('projects:search_projects', reverse('projects:search_projects'), fac),
+            ('projects:search_projects?q', reverse('projects:search_projects') + '?q=Project', fac),
+            ('projects:project_detail', reverse('projects:project_detail', args=[p]), stu),
+            ('projects:project_detail[faculty]', reverse('projects:project_detail', args=[p]), fac),
+            ('projects:delete_project', reverse('projects:delete_project', args=[p]), stu),
+            ('projects:upload_version', reverse('projects:upload_version', args=[p]), stu),
+            ('projects:review_project', reverse('projects:review_project', args=[p]), fac),
+            ('projects:admin_override_status', reverse('projects:admin_override_status', args=[p]), adm),
+            ('projects:download_version', reverse('projects:download_version', args=[p, v]), stu),
+            ('projects:diff_versions', reverse('projects:diff_versions', args=[p, v, self.next_version.pk]), fac),
+        ]
+        for status in ('Pending', 'Approved', 'Rejected'):
+            cases.append((
+                f'projects:search_projects?status={status}',
+                reverse('projects:search_projects') + f'?status={status}',
+                fac,
+            ))
+        for name, user in (
+            ('register', None), ('login', None), ('logout', stu), ('profile', stu),
+            ('password_change', stu), ('password_change_done', stu),
+            ('dashboard_student', stu), ('dashboard_faculty', fac), ('dashboard_admin', adm),
+            ('post_login', stu),
+        ):
+            cases.append((f'accounts:{name}', reverse(f'accounts:{name}'), user))
+            cases.append((name, reverse(name), user))
+        cases += [
+            ('accounts:manage_users', reverse('accounts:manage_users'), adm),
+            ('accounts:manage_users?q', reverse('accounts:manage_users') + '?q=budget_other', adm),
+            ('accounts:manage_users?type=F', reverse('accounts:manage_users') + '?type=F', adm),
+            ('accounts:bulk_users', reverse('accounts:bulk_users'), adm),
+            ('accounts:edit_user', reverse('accounts:edit_user', args=[stu.pk]), adm),
+            ('accounts:delete_user', reverse('accounts:delete_user', args=[stu.pk]), adm),
+            ('home', reverse('home'), stu),
+            ('metrics', reverse('metrics'), adm),
+            ('monitoring:slow_queries', reverse('monitoring:slow_queries'), adm),
+            ('monitoring:memory', reverse('monitoring:memory'), adm),
+            ('monitoring:profiles', reverse('monitoring:profiles'), adm),
+            ('monitoring:profile_file', reverse('monitoring:profile_file', args=[self.profile_id, 'txt']), adm),
+            ('notifications:list', reverse('notifications:list'), fac),
+            ('notifications:stream', reverse('notifications:stream'), fac),
+            ('api:projects', reverse('api:projects'), fac),
+            ('api:projects?include', reverse('api:projects') + '?include=versions,reviews', fac),
+            ('api:versions', reverse('api:versions'), fac),
+            ('api:reviews', reverse('api:reviews'), fac),
+            ('api:users', reverse('api:users'), adm),
+            ('reports:overview', reverse('reports:overview'), adm),
+        ]
+        return cases
+
+    def _measure(self):
+        counts, queries = {}, {}
+        for label, url, user in self._cases():
+            self.client.logout()
+            if user is not None:
+                self.client.force_login(user)
+            # measure uncached pages, e.g. the user list's role totals
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url)
+            resp.close()
+            self.assertLess(resp.status_code, 400, label)
+            counts[label] = len(ctx.captured_queries)
+            queries[label] = [q['sql'] for q in ctx.captured_queries]
+        return counts, queries
+
+    def _grow(self):
+        seed_projects(self.owners, self.LARGE - self.SMALL, reviewers=[self.faculty])
+        self.assertEqual(Project.objects.count(), self.LARGE)
+
+    def test_every_route_has_a_case(self):
+        from accounts import urls as accounts_urls
+        from api import urls as api_urls
+        from monitoring import urls as monitoring_urls
+        from notifications import urls as notifications_urls
+        from projects import urls as projects_urls
+        from reports import urls as reports_urls
+        from student_repo import urls as root_urls
+
+        labels = {label.split('?')[0].split('[')[0] for label, _, _ in self._cases()}
+        for module, prefix in ((projects_urls, 'projects:'), (accounts_urls, 'accounts:'),
+                               (monitoring_urls, 'monitoring:'), (notifications_urls, 'notifications:'),
+                               (api_urls, 'api:'), (reports_urls, 'reports:'), (root_urls, '')):
+            for pattern in module.urlpatterns:
+                if isinstance(pattern, URLResolver) or not isinstance(pattern, URLPattern) or not pattern.name:
+                    continue
+                self.assertIn(prefix + pattern.name, labels)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small, _ = self._measure()
+        self._grow()
+        large, _ = self._measure()
+        for label, count in large.items():
+            with self.subTest(label=label):
+                self.assertEqual(small[label], count, f'{label} query count depends on row count')
+                self.assertLessEqual(count, self.BUDGETS[label])
+
+    def test_no_full_table_scans(self):
+        self._grow()
+        _, queries = self._measure()
+        with connection.cursor() as cursor:
+            for label, sqls in queries.items():
+                for sql in sqls:
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    # subqueries alias tables, e.g. "projects_review" U0
+                    aliases = dict((a, t) for t, a in re.findall(r'"(\w+)" ([A-Z]\d+)\b', sql))
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    for row in cursor.fetchall():
+                        detail = row[-1]
+                        m = re.match(r'SCAN (\w+)', detail)
+                        if not m or 'USING' in detail:
+                            continue
+                        table = aliases.get(m.group(1), m.group(1))
+                        self.assertNotIn(table, self.GUARDED_TABLES, f'{label}: {detail}\n{sql}')
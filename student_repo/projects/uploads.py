@@ -0,0 +1,186 @@
+"""Streaming upload handling for project archives.
+
+Django's default handlers buffer the whole request body (to memory or a temp
+file) before the form can look at ``f.size``, so an oversized upload ties up
+a worker and disk until it has fully arrived. :class:`ProjectUploadHandler`
+enforces ``PROJECT_UPLOAD_MAX_BYTES`` while the body is being read instead,
+and hashes and sniffs the file on the way through so nothing needs to read
+it back afterwards.
+"""
+import hashlib
+import mimetypes
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .quota import exceeded_message, is_exempt, quota_bytes, usage
+
+# bytes kept from the start of each file for type detection (tar's magic
+# number sits at offset 257)
+SNIFF_BYTES = 512
+
+# multipart boundaries and part headers on top of the file and form fields
+MULTIPART_OVERHEAD = 16 * 1024
+
+# (offset, magic bytes, content type), checked in order
+SIGNATURES = (
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'\xfd7zXZ\x00', 'application/x-xz'),
+    (0, b"7z\xbc\xaf'\x1c", 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (257, b'ustar', 'application/x-tar'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+)
+
+
+def max_upload_bytes():
+    return getattr(settings, 'PROJECT_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def too_large_message(max_bytes):
+    return f'File too large. Max size is {max_bytes} bytes.'
+
+
+def detect_content_type(head, filename=''):
+    """Guess a content type from the first bytes of a file, then its name."""
+    for offset, magic, content_type in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    guessed, _ = mimetypes.guess_type(filename or '')
+    if guessed:
+        return guessed
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        # a multi-byte character cut off at the end of the sniffed block is fine
+        if exc.start < len(head) - 3:
+            return 'application/octet-stream'
+    return 'text/plain' if head else 'application/octet-stream'
+
+
+def file_metadata(f):
+    """Return the ProjectVersion metadata fields describing file ``f``.
+
+    Files received through ProjectUploadHandler carry their digest and type
+    already; anything else (admin uploads, seeded files) is read once here.
+    """
+    digest = getattr(f, 'sha256', None)
+    content_type = getattr(f, 'detected_content_type', None)
+    if digest is None or content_type is None:
+        hasher, head = hashlib.sha256(), b''
+        for chunk in f.chunks():
+            hasher.update(chunk)
+            if len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES - len(head)]
+        f.seek(0)
+        digest = digest or hasher.hexdigest()
+        content_type = content_type or detect_content_type(head, f.name)
+    return {
+        'original_filename': os.path.basename(f.name or '')[:255],
+        'file_size': f.size,
+        'content_type': content_type,
+        'sha256': digest,
+    }
+
+
+class ProjectUploadHandler(FileUploadHandler):
+    """Write uploads to a temp file, rejecting them as soon as they are too big.
+
+    The limit is ``PROJECT_UPLOAD_MAX_BYTES``, or the user's remaining storage
+    quota if that is smaller. The upload is refused before any file data is
+    read when the request's Content-Length already exceeds the limit, and
+    aborted mid-stream once the bytes received pass it. The rejection reason
+    is left on ``request.upload_error`` for the form to report.
+
+    Completed files get ``sha256`` (hex digest) and ``detected_content_type``
+    attributes.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = max_upload_bytes()
+        self.message = too_large_message(self.max_bytes)
+        self.content_length = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.content_length = content_length
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated and not is_exempt(user):
+            # an upload that cannot fit in the user's quota is cut off the same way
+            used = usage(user)
+            left = max(quota_bytes() - used, 0)
+            if left < self.max_bytes:
+                self.max_bytes = left
+                self.message = exceeded_message(used)
+        # returning None lets the normal multipart parser run
+
+    def new_file(self, *args, **kwargs):
+        # DATA_UPLOAD_MAX_MEMORY_SIZE = None turns Django's own field limit off
+        limit = self.max_bytes + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0) + MULTIPART_OVERHEAD
+        if self.content_length and self.content_length > limit:
+            # the form fields can't account for the excess, so the file must
+            self._reject()
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.received = 0
+        self.digest = hashlib.sha256()
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self._reject()
+        self.digest.update(raw_data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        self.file.detected_content_type = detect_content_type(self.head, self.file_name)
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+    def _reject(self):
+        if self.request is not None:
+            self.request.upload_error = self.message
+        self.upload_interrupted()
+        # stop reading the body; the rest of it is never written anywhere
+        raise StopUpload(connection_reset=True)
+
+
+def streaming_upload(view_func):
+    """Decorator: handle the view's file uploads with ProjectUploadHandler.
+
+    Upload handlers can only be replaced before ``request.POST`` is first
+    read, which ``CsrfViewMiddleware`` would otherwise do before the view
+    runs, so the middleware is skipped and the CSRF check applied here after
+    the swap instead.
+    """
+    protected = csrf_protect(view_func)
+
+    @csrf_exempt
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        request.upload_handlers = [ProjectUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return _wrapped
+
+
+def upload_error(request):
+    """The reason ProjectUploadHandler rejected this request's upload, if any."""
+    return getattr(request, 'upload_error', None)
@@ -14,5 +14,6 @@ urlpatterns = [
     path('<int:pk>/admin_override/', views.admin_override_status, name='admin_override_status'),
     path('search/', views.search_projects, name='search_projects'),
     path('<int:pk>/download/<int:version_pk>/', views.download_version, name='download_version'),
+    path('<int:pk>/diff/<int:old_pk>/<int:new_pk>/', views.diff_versions, name='diff_versions'),
     path('project/<int:pk>/delete/', views.delete_project, name='delete_project'),
 ]
@@ -1,51 +1,96 @@
+import hashlib
+import mimetypes
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import Http404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from student_repo.database import read_only_db
 from accounts.decorators import is_profile_type, is_staff_or_type, require_role, forbid_role
-from .models import Project, ProjectVersion
+from .models import Project, ProjectVersion, SimilarVersion
 from .forms import ProjectForm, ProjectVersionForm
 from .forms import ReviewForm
-from django.http import FileResponse
-import mimetypes
+from . import quota, watermarks
+from .diffs import version_diff
+from .coldstore import restore
+from .compression import SUFFIXES, accepts_encoding, iter_decoded
+from .uploads import streaming_upload, upload_error
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import dateformat
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import content_disposition_header, quote_etag
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import render
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 
+def _owner_changed_at(request):
+    return watermarks.changed_at(watermarks.owner_key(request.user.pk))
+
+
+def _project_changed_at(request, pk):
+    row = Project.objects.filter(pk=pk).values_list('owner_id', 'updated_at').first()
+    # anyone else gets the view's 404 instead
+    if row and (row[0] == request.user.pk or is_staff_or_type(request.user, 'F')):
+        return row[1]
+    return None
+
+
+def _all_changed_at(request):
+    return watermarks.changed_at(watermarks.ALL)
+
+
 @login_required
+@read_only_db
+@watermarks.conditional_page(_owner_changed_at)
 def my_projects(request):
-    # exclude soft-deleted projects
-    projects = Project.objects.filter(owner=request.user, is_deleted=False).order_by('-created_at')
+    # status is computed in SQL and versions are prefetched so the template's
+    # p.status / p.latest_version do not query once per project
+    projects = (
+        Project.objects.filter(owner=request.user)
+        .with_status()
+        .prefetch_related('versions')
+        .order_by('-created_at')
+    )
     return render(request, 'projects/my_projects.html', {'projects': projects})
 
 
 @login_required
 @forbid_role('F', redirect_to='dashboard_faculty', message='Access denied: faculty may not create project submissions.')
+@streaming_upload
 def create_project(request):
     if request.method == 'POST':
         form = ProjectForm(request.POST)
-        file_form = ProjectVersionForm(request.POST, request.FILES)
+        file_form = ProjectVersionForm(request.POST, request.FILES, upload_error=upload_error(request))
         if form.is_valid() and file_form.is_valid():
             proj = form.save(commit=False)
             proj.owner = request.user
-            proj.save()
-            # create initial version if file uploaded
-            uploaded = file_form.cleaned_data.get('uploaded_file')
-            if uploaded:
-                # prefer explicit snapshots from the upload form; fall back to project fields
-                title_snap = file_form.cleaned_data.get('title_snapshot') or proj.title
-                desc_snap = file_form.cleaned_data.get('description_snapshot') or proj.description
-                ProjectVersion.objects.create(
-                    project=proj,
-                    uploaded_file=uploaded,
-                    version_number=1,
-                    title_snapshot=title_snap,
-                    description_snapshot=desc_snap,
-                )
-            messages.success(request, 'Project created successfully.')
-            return redirect('projects:project_detail', pk=proj.pk)
+            try:
+                with transaction.atomic():
+                    proj.save()
+                    # create initial version if file uploaded
+                    uploaded = file_form.cleaned_data.get('uploaded_file')
+                    if uploaded:
+                        # prefer explicit snapshots from the upload form; fall back to project fields
+                        title_snap = file_form.cleaned_data.get('title_snapshot') or proj.title
+                        desc_snap = file_form.cleaned_data.get('description_snapshot') or proj.description
+                        version = ProjectVersion.objects.create(
+                            project=proj,
+                            uploaded_file=uploaded,
+                            version_number=1,
+                            title_snapshot=title_snap,
+                            description_snapshot=desc_snap,
+                        )
+                        quota.check(request.user)
+            except quota.QuotaExceeded as exc:
+                version.uploaded_file.delete(save=False)
+                file_form.add_error('uploaded_file', str(exc))
+            else:
+                messages.success(request, 'Project created successfully.')
+                return redirect('projects:project_detail', pk=proj.pk)
     else:
         form = ProjectForm()
         file_form = ProjectVersionForm()
@@ -53,29 +98,40 @@ def create_project(request):
 
 
 @login_required
+@read_only_db
+@watermarks.conditional_page(_project_changed_at)
 def project_detail(request, pk):
-    proj = get_object_or_404(Project, pk=pk)
-    if proj.is_deleted:
-        raise Http404
+    proj = get_object_or_404(Project.objects.with_status(), pk=pk)
     # Allow owners, staff, and faculty to view a project. Students can only view their own.
     is_faculty = is_profile_type(request.user, 'F')
-    if proj.owner != request.user and not (request.user.is_staff or is_faculty):
+    if proj.owner_id != request.user.pk and not (request.user.is_staff or is_faculty):
         raise Http404
-    versions = proj.versions.all()
+    versions = list(proj.versions.all())
+    # versions are newest first; each one can be compared with the one before it
+    for newer, older in zip(versions, versions[1:]):
+        newer.previous = older
     file_form = ProjectVersionForm()
     # Pair each review with the latest project version that existed at the
     # time the review was created. This lets us show which version was
     # approved/rejected without changing the Review model.
-    reviews = proj.reviews.all()
+    reviews = proj.reviews.select_related('reviewer', 'version')
     reviews_with_versions = []
     for r in reviews:
-        # Prefer an explicit FK if present (new migration); otherwise infer by timestamp
-        v = getattr(r, 'version', None)
+        # Prefer an explicit FK if present (new migration); otherwise infer by
+        # timestamp from the versions already loaded (newest first)
+        v = r.version
         if not v:
-            v = proj.versions.filter(created_at__lte=r.created_at).first()
+            v = next((pv for pv in versions if pv.created_at <= r.created_at), None)
         reviews_with_versions.append((r, v))
     # determine whether the current user may upload versions: owners and staff only
     can_upload = (proj.owner == request.user) or request.user.is_staff
+    similar = []
+    if request.user.is_staff or is_faculty:
+        # near-duplicates found by projects.similarity, best match first
+        similar = (
+            SimilarVersion.objects.filter(version__project=proj, other__project__is_deleted=False)
+            .select_related('version', 'other__project__owner')
+        )
     return render(request, 'projects/project_detail.html', {
         'project': proj,
         'versions': versions,
@@ -83,6 +139,7 @@ def project_detail(request, pk):
         'can_upload': can_upload,
         'is_faculty': is_faculty,
         'reviews_with_versions': reviews_with_versions,
+        'similar': similar,
     })
 
 
@@ -94,8 +151,6 @@ def admin_override_status(request, pk):
     Creating a Review is used to record the override and keep the audit trail.
     """
     proj = get_object_or_404(Project, pk=pk)
-    if proj.is_deleted:
-        raise Http404
     if request.method == 'POST':
         form = ReviewForm(request.POST)
         if form.is_valid():
@@ -114,6 +169,7 @@ def admin_override_status(request, pk):
 
 @login_required
 @require_role('F', message='Access denied: faculty only.')
+@read_only_db
 def search_projects(request):
     """Simple search and filter for projects.
 
@@ -126,7 +182,7 @@ def search_projects(request):
     created_after = request.GET.get('created_after', '').strip()
     created_before = request.GET.get('created_before', '').strip()
 
-    qs = Project.objects.filter(is_deleted=False).order_by('-created_at')
+    qs = Project.objects.select_related('owner').with_status().order_by('-created_at')
     if q:
         qs = qs.filter(Q(title__icontains=q) | Q(owner__username__icontains=q) | Q(description__icontains=q))
 
@@ -140,9 +196,14 @@ def search_projects(request):
         # If parsing/filtering fails, ignore the date filters
         pass
 
-    projects = list(qs)
+    # the status filter runs in SQL instead of loading every row to compare
+    # the Python property
     if status:
-        projects = [p for p in projects if p.status == status]
+        qs = qs.filter(computed_status=status)
+    projects = qs
+
+    if request.get_preferred_type(['text/html', 'application/json']) == 'application/json':
+        return _search_json(request, projects)
 
     # If this is an AJAX/XHR request, return a partial (table rows) to update dynamically
     is_xhr = request.headers.get('x-requested-with') == 'XMLHttpRequest'
@@ -157,7 +218,49 @@ def search_projects(request):
         'created_before': created_before,
     })
 
+def _search_json(request, projects):
+    """The live-search results as compact JSON rows, with an ETag.
+
+    The ETag covers the result ids and the watermark that every project,
+    version and review write moves forward (see projects.watermarks), so a
+    repeated search that nothing has touched since is answered 304 without
+    serializing anything.
+    """
+    user = request.user
+    rows = list(projects.values_list('pk', 'title', 'owner_id', 'owner__username', 'computed_status', 'created_at'))
+    watermark = watermarks.changed_at(watermarks.ALL)
+    # the row links depend on who is asking
+    digest = hashlib.sha1(f'{user.pk}:{user.is_staff}:{watermark}:'.encode())
+    digest.update(','.join(str(row[0]) for row in rows).encode())
+    etag = quote_etag(digest.hexdigest())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        results = []
+        for pk, title, owner_id, owner, status, created_at in rows:
+            row = {
+                'id': pk,
+                'title': title,
+                'owner': owner,
+                'status': status,
+                'created': dateformat.format(timezone.localtime(created_at), 'M d, Y'),
+                'url': reverse('projects:project_detail', args=[pk]),
+            }
+            if user.is_staff or owner_id == user.pk:
+                row['delete_url'] = reverse('projects:delete_project', args=[pk])
+            if user.is_staff:
+                row['override_url'] = reverse('projects:admin_override_status', args=[pk])
+            results.append(row)
+        response = JsonResponse({'results': results})
+    response['ETag'] = etag
+    # always revalidate; the browser may keep the body for the 304s
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
 @login_required
+@read_only_db
 def download_version(request, pk, version_pk):
     """Serve a project's version file after access checks.
 
@@ -165,44 +268,91 @@ def download_version(request, pk, version_pk):
     and centralizes permission checks.
     """
     proj = get_object_or_404(Project, pk=pk)
-    if proj.is_deleted:
-        raise Http404
     is_faculty = is_profile_type(request.user, 'F')
     if proj.owner != request.user and not (request.user.is_staff or is_faculty):
         raise Http404
 
     version = get_object_or_404(ProjectVersion, pk=version_pk, project=proj)
     ffield = version.uploaded_file
-    if not ffield or not ffield.name:
+    if not ffield or not version.file_present:
+        raise Http404("File not found")
+    if version.is_archived and not restore(version):
         raise Http404("File not found")
 
-    storage = ffield.storage
-    if not storage.exists(ffield.name):
+    # Size, type and name were recorded at upload time, so the file is opened
+    # straight away with no exists()/size() round trips to the storage.
+    try:
+        fileobj = ffield.storage.open(ffield.name, 'rb')
+    except OSError:
         # File missing on disk/storage
         raise Http404("File not found")
-
-    # Use storage.open to get a file-like object and return a FileResponse
-    fileobj = storage.open(ffield.name, 'rb')
-    content_type, _ = mimetypes.guess_type(ffield.name)
-    response = FileResponse(fileobj, content_type=content_type or 'application/octet-stream')
-    response['Content-Length'] = storage.size(ffield.name)
-    # Suggest a filename for download
-    response['Content-Disposition'] = f'attachment; filename="{ffield.name.split("/")[-1]}"'
+    encoding = version.content_encoding
+    # rows from before 0007 have no recorded type until scrub_uploads runs
+    content_type = (
+        version.content_type
+        or mimetypes.guess_type(ffield.name.removesuffix(SUFFIXES.get(encoding, '')))[0]
+        or 'application/octet-stream'
+    )
+    if encoding and not accepts_encoding(request, encoding):
+        # the client can't take the stored bytes: decompress while streaming
+        response = StreamingHttpResponse(iter_decoded(fileobj, encoding), content_type=content_type)
+        response['Content-Disposition'] = content_disposition_header(True, version.download_name)
+        length = version.file_size
+    else:
+        response = FileResponse(fileobj, as_attachment=True, filename=version.download_name, content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        length = version.stored_size if encoding else version.file_size
+        if length is None:
+            # nor a recorded size; ask the storage as before
+            length = ffield.storage.size(ffield.name)
+    if encoding:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if length is not None:
+        response['Content-Length'] = length
     return response
 
 
+@login_required
+def diff_versions(request, pk, old_pk, new_pk):
+    """Show what changed between two versions of a project.
+
+    Same access rules as downloads. Diffs are cached by the pair of upload
+    digests (see projects.diffs), so only the first view reads the files.
+    """
+    proj = get_object_or_404(Project, pk=pk)
+    is_faculty = is_profile_type(request.user, 'F')
+    if proj.owner_id != request.user.pk and not (request.user.is_staff or is_faculty):
+        raise Http404
+    found = {v.pk: v for v in ProjectVersion.objects.filter(project=proj, pk__in=[old_pk, new_pk])}
+    old, new = found.get(old_pk), found.get(new_pk)
+    if old is None or new is None:
+        raise Http404
+    if not all(v.uploaded_file and v.file_present for v in (old, new)):
+        raise Http404("File not found")
+    try:
+        diff = version_diff(old, new)
+    except OSError:
+        raise Http404("File not found")
+    return render(request, 'projects/version_diff.html', {
+        'project': proj,
+        'old': old,
+        'new': new,
+        'diff': diff,
+    })
+
+
 @login_required
 @forbid_role('F', redirect_to='dashboard_faculty', message='Access denied: faculty may not upload project versions.')
+@streaming_upload
 def upload_version(request, pk):
     proj = get_object_or_404(Project, pk=pk)
-    if proj.is_deleted:
-        raise Http404
     # Students may only upload to their own projects; staff may upload to any.
     # Students may only upload to their own projects; staff may upload to any.
     if proj.owner != request.user and not request.user.is_staff:
         raise Http404
     if request.method == 'POST':
-        form = ProjectVersionForm(request.POST, request.FILES)
+        form = ProjectVersionForm(request.POST, request.FILES, upload_error=upload_error(request))
         if form.is_valid():
             # Prevent uploads when the project is already approved (unless staff).
             # This enforces the rule: once a project is approved it cannot be edited/uploaded
@@ -233,12 +383,21 @@ def upload_version(request, pk):
                 pv.description_snapshot = desc_snap
                 if proj.description != desc_snap:
                     proj.description = desc_snap
-            pv.save()
-            # save project if metadata changed
-            proj.save()
+            try:
+                with transaction.atomic():
+                    pv.save()
+                    # the new version counts against the owner's quota
+                    quota.check(proj.owner)
+                    # save project if metadata changed
+                    proj.save()
+            except quota.QuotaExceeded as exc:
+                pv.uploaded_file.delete(save=False)
+                messages.error(request, f'Upload failed. {exc}')
+                return redirect('projects:project_detail', pk=proj.pk)
             messages.success(request, 'New version uploaded and project metadata updated.')
         else:
-            messages.error(request, 'Upload failed.')
+            reason = ' '.join(form.errors.get('uploaded_file', []))
+            messages.error(request, f'Upload failed. {reason}'.strip())
     return redirect('projects:project_detail', pk=proj.pk)
 
 
@@ -251,8 +410,6 @@ def review_project(request, pk):
     to the project detail.
     """
     proj = get_object_or_404(Project, pk=pk)
-    if proj.is_deleted:
-        raise Http404
     # Prevent project owners from reviewing their own submissions
     if request.user == proj.owner:
         messages.error(request, 'Owners may not review their own projects.')
@@ -276,32 +433,27 @@ def review_project(request, pk):
 
 @login_required
 @require_role('F', raise_404=True)
+@read_only_db
+@watermarks.conditional_page(_all_changed_at)
 def submitted_projects(request):
     """List all submitted (non-deleted) projects for faculty/admin."""
-    projects = Project.objects.filter(is_deleted=False).order_by('-created_at')
+    projects = Project.objects.select_related('owner').with_status().order_by('-created_at')
     return render(request, 'projects/submitted_projects.html', {'projects': projects})
 
 
 @login_required
 def delete_project(request, pk):
-    """Soft-delete a project. Owners and staff can perform this action."""
-    proj = get_object_or_404(Project, pk=pk)
+    """Soft-delete a project. Owners and staff can perform this action,
+    only while the project is Pending or Rejected."""
+    proj = get_object_or_404(Project.objects.with_status(), pk=pk)
     # Only owner or staff can delete. Faculty may not delete others' projects.
     if proj.owner != request.user and not request.user.is_staff:
         raise Http404
+    if proj.status.lower() not in ['pending', 'rejected']:
+        messages.error(request, "Cannot delete a project in this state.")
+        return redirect('projects:my_projects')
     if request.method == 'POST':
         proj.soft_delete()
         messages.success(request, 'Project deleted (soft delete).')
         return redirect('projects:my_projects')
     return render(request, 'projects/confirm_delete.html', {'project': proj})
-
-@login_required
-def delete_project(request, pk):
-    project = get_object_or_404(Project, pk=pk, owner=request.user)
-    if project.status.lower() not in ['pending', 'rejected']:
-        messages.error(request, "Cannot delete a project in this state.")
-        return redirect('projects:my_projects')
-    if request.method == 'POST':
-        project.delete()
-        return redirect('projects:my_projects')
-    return redirect('projects:my_projects')
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Change watermarks, so unchanged pages can be answered 304 Not Modified.
+
+A project's own watermark is ``Project.updated_at``: saving the project and
+saving or deleting one of its versions or reviews moves it forward (see
+projects.signals). The same writes move the ``Watermark`` rows of the
+project's owner and of ``ALL``, so list pages are validated with a single
+primary-key lookup before any of their real queries run.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+ALL = 'all'
+
+
+def owner_key(user_id):
+    return f'owner:{user_id}'
+
+
+def bump(owner_ids, now=None):
+    """Move the watermarks of ``owner_ids`` and of ALL to ``now``."""
+    from .models import Watermark
+
+    now = now or timezone.now()
+    keys = [ALL] + [owner_key(pk) for pk in set(owner_ids) if pk is not None]
+    Watermark.objects.bulk_create(
+        [Watermark(key=key, changed_at=now) for key in keys],
+        update_conflicts=True, unique_fields=['key'], update_fields=['changed_at'],
+    )
+
+
+def touch(project_ids):
+    """Record that something shown about the given projects changed."""
+    from .models import Project
+
+    now = timezone.now()
+    projects = Project.all_objects.filter(pk__in=list(project_ids))
+    owner_ids = list(projects.values_list('owner_id', flat=True).distinct())
+    projects.update(updated_at=now)
+    bump(owner_ids, now)
+
+
+def changed_at(key):
+    from .models import Watermark
+    return Watermark.objects.filter(key=key).values_list('changed_at', flat=True).first()
+
+
+def conditional_page(watermark_func):
+    """Decorator: ``condition()`` for pages validated by one watermark.
+
+    ``watermark_func(request, *args, **kwargs)`` returns when the page's data
+    last changed, or None to render it unconditionally. The ETag combines it
+    with the viewer and their session, since the page also carries their
+    links and CSRF token. A page with flash messages waiting is always
+    rendered, or they would be shown on some later page instead.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+                return view_func(request, *args, **kwargs)
+            changed = watermark_func(request, *args, **kwargs)
+            if changed is None:
+                return view_func(request, *args, **kwargs)
+            user = request.user
+            digest = hashlib.sha1(
+                f'{changed.isoformat()}:{user.pk}:{user.is_staff}:{request.session.session_key}'.encode()
+            )
+            etag = quote_etag(digest.hexdigest())
+            last_modified = int(changed.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped
+    return decorator
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import DailyReviewStats
+
+
+@admin.register(DailyReviewStats)
+class DailyReviewStatsAdmin(admin.ModelAdmin):
+    list_display = ('day', 'reviewer_id', 'submissions', 'reviews', 'approved', 'rejected', 'first_reviews', 'approvals')
+    list_filter = ('day',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
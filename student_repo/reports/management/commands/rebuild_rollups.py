@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reports.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily review rollups behind the reports page from the version and '
+        'review tables. The signals keep them current as rows are written; run this after '
+        'deletes, bulk imports or seeding, or nightly with --days to true up recent days.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, metavar='N', help='only rebuild the last N days (default: everything)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.localdate() - timedelta(days=options['days'] - 1)
+        written = rebuild(since)
+        scope = f'since {since}' if since else 'for all days'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily rollup rows {scope}.'))
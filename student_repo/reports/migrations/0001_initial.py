@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReviewStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('reviewer_id', models.PositiveIntegerField(default=0)),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('approved', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('first_reviews', models.PositiveIntegerField(default=0)),
+                ('first_review_seconds', models.BigIntegerField(default=0)),
+                ('approvals', models.PositiveIntegerField(default=0)),
+                ('approval_seconds', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('reviewer_id', 'day'), name='rollup_reviewer_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import models
+
+
+class DailyReviewStats(models.Model):
+    """Review throughput for one day, for one reviewer or for everyone.
+
+    Maintained by reports.rollups as versions and reviews are written, and
+    recomputed by ``manage.py rebuild_rollups``. Durations are stored as
+    sums with their counts so any range of days can be averaged.
+    """
+    ALL_REVIEWERS = 0
+
+    day = models.DateField()
+    # a user id, or ALL_REVIEWERS for the site-wide row; not a foreign key so
+    # history survives deleted reviewers
+    reviewer_id = models.PositiveIntegerField(default=ALL_REVIEWERS)
+    # uploaded versions; only counted on the site-wide row
+    submissions = models.PositiveIntegerField(default=0)
+    reviews = models.PositiveIntegerField(default=0)
+    approved = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    pending = models.PositiveIntegerField(default=0)
+    # projects reviewed for the first time, and the seconds they waited since
+    # they were created
+    first_reviews = models.PositiveIntegerField(default=0)
+    first_review_seconds = models.BigIntegerField(default=0)
+    # projects approved for the first time, and the seconds that took
+    approvals = models.PositiveIntegerField(default=0)
+    approval_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['reviewer_id', 'day'], name='rollup_reviewer_day_uniq'),
+        ]
+
+    def __str__(self):
+        who = 'all reviewers' if self.reviewer_id == self.ALL_REVIEWERS else f'reviewer {self.reviewer_id}'
+        return f"{self.day} ({who})"
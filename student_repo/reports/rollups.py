@@ -0,0 +1,128 @@
+"""Daily review-throughput rollups (see DailyReviewStats).
+
+Each version or review written adds to its day's rows as it happens
+(reports.signals), so reports read a few dozen pre-aggregated rows instead
+of the raw tables. Deleting versions or reviews does not subtract anything;
+``manage.py rebuild_rollups`` recomputes the rows from the raw tables.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+
+from projects.models import ProjectVersion, Review
+from .models import DailyReviewStats
+
+ALL = DailyReviewStats.ALL_REVIEWERS
+
+
+def add(day, reviewer_id, **deltas):
+    """Add ``deltas`` to the day's row for ``reviewer_id``, creating it if needed."""
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    with transaction.atomic():
+        rows = DailyReviewStats.objects.filter(day=day, reviewer_id=reviewer_id)
+        if rows.update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                DailyReviewStats.objects.create(day=day, reviewer_id=reviewer_id, **deltas)
+        except IntegrityError:
+            # created concurrently
+            rows.update(**increments)
+
+
+def record_version(version):
+    add(timezone.localdate(version.created_at), ALL, submissions=1)
+
+
+def record_review(review):
+    """Count a new review, and the project's first review or approval if it is one."""
+    deltas = {'reviews': 1, _decision_field(review.decision): 1}
+    earlier = Review.objects.filter(project_id=review.project_id).exclude(pk=review.pk)
+    if not earlier.exists():
+        deltas['first_reviews'] = 1
+        deltas['first_review_seconds'] = _waited(review)
+    if review.decision == Review.DECISION_APPROVED and not earlier.filter(decision=Review.DECISION_APPROVED).exists():
+        deltas['approvals'] = 1
+        deltas['approval_seconds'] = _waited(review)
+    day = timezone.localdate(review.created_at)
+    add(day, ALL, **deltas)
+    add(day, review.reviewer_id, **deltas)
+
+
+def _decision_field(decision):
+    return {
+        Review.DECISION_APPROVED: 'approved',
+        Review.DECISION_REJECTED: 'rejected',
+    }.get(decision, 'pending')
+
+
+def _waited(review):
+    return max(int((review.created_at - review.project.created_at).total_seconds()), 0)
+
+
+def _firsts(reviews):
+    """``(created_at, reviewer_id, waited)`` for each project's first review in ``reviews``."""
+    return (
+        reviews.annotate(
+            rank=Window(RowNumber(), partition_by=[F('project_id')], order_by=[F('created_at').asc(), F('pk').asc()]),
+            waited=ExpressionWrapper(F('created_at') - F('project__created_at'), output_field=DurationField()),
+        )
+        .filter(rank=1)
+        .values_list('created_at', 'reviewer_id', 'waited')
+    )
+
+
+def rebuild(since=None):
+    """Recompute the rows for ``since`` (a date) onwards, or all of them.
+
+    Counts are grouped by day in SQL. First reviews and first approvals are
+    picked with ROW_NUMBER() over each project's reviews, which has to see
+    the reviews before ``since`` too. Returns the number of rows written.
+    """
+    start = timezone.make_aware(datetime.combine(since, time.min)) if since else None
+    stats = defaultdict(Counter)
+
+    versions = ProjectVersion.objects.order_by()
+    if start:
+        versions = versions.filter(created_at__gte=start)
+    for day, n in versions.annotate(day=TruncDate('created_at')).values('day').annotate(n=Count('pk')).values_list('day', 'n'):
+        stats[(day, ALL)]['submissions'] += n
+
+    reviews = Review.objects.order_by()
+    if start:
+        reviews = reviews.filter(created_at__gte=start)
+    by_reviewer = reviews.annotate(day=TruncDate('created_at')).values('day', 'reviewer_id').annotate(
+        reviews=Count('pk'),
+        approved=Count('pk', filter=Q(decision=Review.DECISION_APPROVED)),
+        rejected=Count('pk', filter=Q(decision=Review.DECISION_REJECTED)),
+        pending=Count('pk', filter=Q(decision=Review.DECISION_PENDING)),
+    )
+    for row in by_reviewer:
+        counts = {field: row[field] for field in ('reviews', 'approved', 'rejected', 'pending')}
+        for key in (row['reviewer_id'], ALL):
+            stats[(row['day'], key)].update(counts)
+
+    for count_field, seconds_field, candidates in (
+        ('first_reviews', 'first_review_seconds', Review.objects.order_by()),
+        ('approvals', 'approval_seconds', Review.objects.filter(decision=Review.DECISION_APPROVED).order_by()),
+    ):
+        for created_at, reviewer_id, waited in _firsts(candidates).iterator():
+            day = timezone.localdate(created_at)
+            if since and day < since:
+                continue
+            for key in (reviewer_id, ALL):
+                stats[(day, key)][count_field] += 1
+                stats[(day, key)][seconds_field] += max(int(waited.total_seconds()), 0)
+
+    rows = [DailyReviewStats(day=day, reviewer_id=key, **counts) for (day, key), counts in stats.items()]
+    with transaction.atomic():
+        stale = DailyReviewStats.objects.all()
+        if since:
+            stale = stale.filter(day__gte=since)
+        stale.delete()
+        DailyReviewStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from projects.models import ProjectVersion, Review
+from . import rollups
+
+
+@receiver(post_save, sender=ProjectVersion)
+def count_version(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.record_version(instance)
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.record_review(instance)
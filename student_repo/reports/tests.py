@@ -0,0 +1,87 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Profile
+from projects.models import Project, ProjectVersion, Review
+from .models import DailyReviewStats
+
+User = get_user_model()
+ALL = DailyReviewStats.ALL_REVIEWERS
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user('rollup_student', password='pw')
+        Profile.objects.create(user=self.student, type='S')
+        self.reviewers = []
+        for name in ('rollup_fac1', 'rollup_fac2'):
+            user = User.objects.create_user(name, password='pw')
+            Profile.objects.create(user=user, type='F')
+            self.reviewers.append(user)
+        self.proj = Project.objects.create(owner=self.student, title='Rollup', description='d')
+        # the project has been waiting two hours
+        Project.objects.filter(pk=self.proj.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        self.proj.refresh_from_db()
+
+    def _rows(self):
+        fields = ('reviewer_id', 'submissions', 'reviews', 'approved', 'rejected', 'first_reviews', 'approvals')
+        return {
+            row[0]: row[1:]
+            for row in DailyReviewStats.objects.values_list(*fields)
+        }
+
+    def _activity(self):
+        fac1, fac2 = self.reviewers
+        ProjectVersion.objects.create(project=self.proj, version_number=1)
+        ProjectVersion.objects.create(project=self.proj, version_number=2)
+        Review.objects.create(project=self.proj, reviewer=fac1, decision=Review.DECISION_REJECTED)
+        Review.objects.create(project=self.proj, reviewer=fac2, decision=Review.DECISION_APPROVED)
+        Review.objects.create(project=self.proj, reviewer=fac1, decision=Review.DECISION_APPROVED)
+
+    def test_writes_update_the_rollups(self):
+        self._activity()
+        fac1, fac2 = self.reviewers
+        self.assertEqual(self._rows(), {
+            ALL: (2, 3, 2, 1, 1, 1),
+            fac1.pk: (0, 2, 1, 1, 1, 0),
+            fac2.pk: (0, 1, 1, 0, 0, 1),
+        })
+        overall = DailyReviewStats.objects.get(reviewer_id=ALL)
+        self.assertAlmostEqual(overall.first_review_seconds, 7200, delta=60)
+
+    def test_rebuild_matches_incremental(self):
+        self._activity()
+        incremental = self._rows()
+        DailyReviewStats.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('Rebuilt 3 daily rollup rows', out.getvalue())
+        self.assertEqual(self._rows(), incremental)
+
+        # --days leaves older rows alone
+        old_day = timezone.localdate() - timedelta(days=10)
+        DailyReviewStats.objects.create(day=old_day, reviewer_id=ALL, reviews=4)
+        call_command('rebuild_rollups', '--days', '2', stdout=out)
+        self.assertTrue(DailyReviewStats.objects.filter(day=old_day, reviews=4).exists())
+        self.assertEqual(DailyReviewStats.objects.count(), 4)
+
+    def test_reports_page_reads_the_rollups(self):
+        self._activity()
+        admin = User.objects.create_user('rollup_admin', password='pw', is_staff=True)
+        Profile.objects.create(user=admin, type='A')
+        self.client.force_login(admin)
+        resp = self.client.get(reverse('reports:overview'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['overall']['reviews'], 3)
+        self.assertEqual(resp.context['overall']['approval_rate'], '67%')
+        self.assertEqual([r['name'] for r in resp.context['reviewers']], ['rollup_fac1', 'rollup_fac2'])
+
+        self.client.force_login(self.reviewers[0])
+        resp = self.client.get(reverse('reports:overview'))
+        self.assertEqual(resp.status_code, 302)
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.shortcuts import render
+from django.utils import timezone
+
+from accounts.decorators import require_role
+from student_repo.database import read_only_db
+from .models import DailyReviewStats
+
+TOTAL_FIELDS = (
+    'submissions', 'reviews', 'approved', 'rejected', 'pending',
+    'first_reviews', 'first_review_seconds', 'approvals', 'approval_seconds',
+)
+
+
+def _average(seconds, count):
+    """A mean duration for display, e.g. '5.2 hours'; '-' when there is none."""
+    if not count:
+        return '-'
+    hours = seconds / count / 3600
+    return f'{hours / 24:.1f} days' if hours >= 48 else f'{hours:.1f} hours'
+
+
+def _summary(totals):
+    reviewed = totals['approved'] + totals['rejected']
+    return {
+        **totals,
+        'approval_rate': f"{100 * totals['approved'] / reviewed:.0f}%" if reviewed else '-',
+        'avg_first_review': _average(totals['first_review_seconds'], totals['first_reviews']),
+        'avg_approval': _average(totals['approval_seconds'], totals['approvals']),
+    }
+
+
+@login_required
+@require_role('A', message='Access denied: admin only.')
+@read_only_db
+def overview(request):
+    """Review throughput over the last REPORTS_DAYS days, read from the daily rollups."""
+    days = getattr(settings, 'REPORTS_DAYS', 30)
+    start = timezone.localdate() - timedelta(days=days - 1)
+    recent = DailyReviewStats.objects.filter(day__gte=start)
+
+    by_day = {row.day: row for row in recent.filter(reviewer_id=DailyReviewStats.ALL_REVIEWERS)}
+    chart = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        row = by_day.get(day)
+        chart.append({
+            'day': day,
+            'submissions': row.submissions if row else 0,
+            'reviews': row.reviews if row else 0,
+        })
+    peak = max([max(c['submissions'], c['reviews']) for c in chart] + [1])
+    for c in chart:
+        c['submissions_pct'] = round(100 * c['submissions'] / peak)
+        c['reviews_pct'] = round(100 * c['reviews'] / peak)
+
+    totals = {
+        row.pop('reviewer_id'): row
+        for row in recent.order_by().values('reviewer_id').annotate(**{f: Sum(f) for f in TOTAL_FIELDS})
+    }
+    overall = totals.pop(DailyReviewStats.ALL_REVIEWERS, None) or dict.fromkeys(TOTAL_FIELDS, 0)
+    names = dict(get_user_model().objects.filter(pk__in=list(totals)).values_list('pk', 'username'))
+    reviewers = sorted(
+        ({'name': names.get(pk, f'deleted user {pk}'), **_summary(t)} for pk, t in totals.items()),
+        key=lambda r: -r['reviews'],
+    )
+    return render(request, 'reports/overview.html', {
+        'days': days,
+        'start': start,
+        'chart': chart,
+        'overall': _summary(overall),
+        'reviewers': reviewers,
+    })
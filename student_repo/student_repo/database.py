@@ -0,0 +1,132 @@
+"""SQLite connection profile and read-only routing.
+
+The app runs on a single SQLite file. Out of the box SQLite uses rollback
+journaling, which means a write (an upload or a review) locks out every
+reader until it commits. This module builds the ``DATABASES`` setting with:
+
+- WAL journaling so readers never block on a writer (and vice versa),
+- ``synchronous=NORMAL`` which is durable in WAL mode and much cheaper than
+  the default ``FULL``,
+- a ``busy_timeout`` so concurrent writers queue instead of failing,
+- ``mmap_size`` / ``cache_size`` so hot pages are served from memory,
+- persistent connections (``CONN_MAX_AGE``) so the pragmas are only paid
+  once per connection rather than once per request,
+- a second ``readonly`` alias opened with ``mode=ro`` which read-only views
+  are routed to via :class:`ReadOnlyRouter` and :func:`read_only_db`.
+"""
+import contextvars
+from functools import wraps
+
+from django.db import connections
+
+READONLY_ALIAS = 'readonly'
+
+# Pragmas applied to every connection when it is opened. Values can be
+# overridden through ``sqlite_databases(pragmas=...)``.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # milliseconds to wait on a locked database before raising
+    'busy_timeout': 5000,
+    # 256 MiB of the file mapped into memory
+    'mmap_size': 256 * 1024 * 1024,
+    # negative values are KiB: ~20 MiB page cache per connection
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+# journal_mode is a property of the database file and requires write access;
+# the read-only connection inherits it and refuses writes on top of mode=ro.
+_READONLY_SKIP = {'journal_mode'}
+_READONLY_EXTRA = {'query_only': 'ON'}
+
+
+def sqlite_init_command(pragmas):
+    """Return an ``init_command`` string applying the given pragmas."""
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+def sqlite_databases(path, conn_max_age=600, pragmas=None, readonly=True):
+    """Build a ``DATABASES`` dict for the SQLite file at ``path``.
+
+    When ``readonly`` is True a second alias (``READONLY_ALIAS``) is added
+    which opens the same file read-only. During tests it mirrors ``default``.
+    """
+    pragmas = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+    databases = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': sqlite_init_command(pragmas),
+                # take the write lock at BEGIN so two writers cannot both
+                # start as readers and then deadlock upgrading to a writer
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+    if readonly:
+        ro_pragmas = {k: v for k, v in pragmas.items() if k not in _READONLY_SKIP}
+        ro_pragmas.update(_READONLY_EXTRA)
+        databases[READONLY_ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # Django always opens SQLite with uri=True
+            'NAME': f'file:{path}?mode=ro',
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': sqlite_init_command(ro_pragmas),
+            },
+            'TEST': {'MIRROR': 'default'},
+        }
+    return databases
+
+
+_use_readonly = contextvars.ContextVar('use_readonly_db', default=False)
+
+
+def read_only_db(view_func):
+    """Route the ORM reads made by ``view_func`` to the read-only alias.
+
+    Writes still go to ``default``; see :class:`ReadOnlyRouter`.
+    """
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        token = _use_readonly.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_readonly.reset(token)
+    return _wrapped
+
+
+class ReadOnlyRouter:
+    """Send reads to ``READONLY_ALIAS`` inside :func:`read_only_db` views.
+
+    Falls back to ``default`` when the alias is not configured, when it is a
+    test mirror of ``default`` (a second connection would not see the test
+    transaction), or when ``default`` is inside an atomic block (so a view
+    always reads its own uncommitted writes).
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_readonly.get() or READONLY_ALIAS not in connections:
+            return None
+        default = connections['default']
+        if default.in_atomic_block:
+            return None
+        if connections[READONLY_ALIAS].settings_dict['NAME'] == default.settings_dict['NAME']:
+            return None
+        return READONLY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases are the same database file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READONLY_ALIAS
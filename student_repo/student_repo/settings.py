@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
+
+from .database import sqlite_databases
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,15 +43,25 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'accounts.apps.AccountsConfig',
     'projects.apps.ProjectsConfig',
+    'monitoring.apps.MonitoringConfig',
+    'notifications.apps.NotificationsConfig',
+    'api.apps.ApiConfig',
+    'reports.apps.ReportsConfig',
     'widget_tweaks',
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover every other middleware too
+    'monitoring.middleware.PerformanceMiddleware',
+    'monitoring.middleware.SlowQueryMiddleware',
+    'monitoring.middleware.MemoryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # needs request.user to check the caller is an admin
+    'monitoring.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,12 +89,15 @@ WSGI_APPLICATION = 'student_repo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# SQLite is tuned for concurrent readers/writers (WAL, pragmas, persistent
+# connections) and read-only views are routed to a second, read-only alias.
+# See student_repo/database.py.
+DATABASES = sqlite_databases(
+    BASE_DIR / 'db.sqlite3',
+    conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 600)),
+)
+
+DATABASE_ROUTERS = ['student_repo.database.ReadOnlyRouter']
 
 
 # Password validation
@@ -143,5 +159,88 @@ LOGIN_REDIRECT_URL = 'post_login'
 LOGOUT_REDIRECT_URL = 'login'
 
 # Maximum allowed upload size for project archives (in bytes).
-# Default is 10 MB but you can override with the environment variable
+# Default is 10 MB but you can override with the environment variable.
+# Enforced while the upload streams in (projects.uploads.ProjectUploadHandler).
 PROJECT_UPLOAD_MAX_BYTES = int(os.getenv('PROJECT_UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+
+# Store compressible uploads compressed: '' (off), 'gzip', or 'zstd' (needs
+# the optional zstandard package, otherwise gzip is used). Downloads are sent
+# precompressed to clients that accept the encoding.
+UPLOAD_COMPRESSION = os.getenv('UPLOAD_COMPRESSION', '')
+
+# Per-user storage quota in bytes (0 = unlimited; staff are exempt). Usage is
+# kept as running counters, see projects.quota.
+STORAGE_QUOTA_BYTES = int(os.getenv('STORAGE_QUOTA_BYTES', 200 * 1024 * 1024))
+
+# Cold tier for old project versions: `manage.py archive_versions` packs their
+# files into zip packs here, and downloads restore them on first access.
+COLD_STORAGE_ROOT = os.getenv('COLD_STORAGE_ROOT', str(BASE_DIR / 'cold_storage'))
+
+# Request metrics (monitoring app). Each worker process writes its samples to
+# METRICS_DIR and /metrics merges them. Set METRICS_TOKEN to let a Prometheus
+# scraper authenticate with "Authorization: Bearer <token>".
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'student_repo_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Queries slower than this are logged to the 'monitoring.slow_queries' logger
+# with the view and template/frame that issued them; admins can browse the
+# per-process fingerprint table at /monitoring/queries/.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_FINGERPRINTS = 500
+
+# On-demand profiling: admins add ?_profile=1 (or an "X-Profile: 1" header)
+# to a request to store a flamegraph and cProfile summary for it in
+# PROFILE_DIR, listed at /monitoring/profiles/. Only the newest PROFILE_KEEP
+# runs are kept.
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'student_repo_profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 2))
+
+# Sampled memory tracking: trace this fraction of requests (0 disables it,
+# 0.01 traces one in a hundred) with tracemalloc, record their peak per view
+# and log any request whose peak exceeds MEMORY_BUDGET_BYTES. Per-view peaks
+# and top allocation sites are listed at /monitoring/memory/.
+MEMORY_SAMPLE_RATE = float(os.getenv('MEMORY_SAMPLE_RATE', 0))
+MEMORY_BUDGET_BYTES = int(os.getenv('MEMORY_BUDGET_BYTES', 64 * 1024 * 1024))
+MEMORY_TOP_SITES = 10
+
+# Notification stream (notifications app). Under ASGI a stream stays open for
+# NOTIFICATIONS_STREAM_SECONDS and also checks the database every
+# NOTIFICATIONS_POLL_SECONDS for notifications created by other processes;
+# under WSGI clients poll at that interval instead.
+NOTIFICATIONS_POLL_SECONDS = int(os.getenv('NOTIFICATIONS_POLL_SECONDS', 15))
+NOTIFICATIONS_STREAM_SECONDS = int(os.getenv('NOTIFICATIONS_STREAM_SECONDS', 300))
+
+# Read-only JSON API (api app): rows per page by default and at most
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 1000))
+
+# Days shown on the review reports page (reports app)
+REPORTS_DAYS = int(os.getenv('REPORTS_DAYS', 30))
+
+# Near-duplicate detection (projects.similarity): uploads whose text files
+# share at least SIMILARITY_THRESHOLD of their 5-word runs with another
+# student's upload are listed on the project page for faculty. At most
+# SIMILARITY_MAX_TEXT_BYTES of text is read from each upload. New uploads are
+# indexed by running `manage.py index_similarity` on a schedule;
+# SIMILARITY_ON_UPLOAD=1 indexes each one right after it commits instead,
+# inside the upload request.
+SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.7))
+SIMILARITY_MAX_TEXT_BYTES = int(os.getenv('SIMILARITY_MAX_TEXT_BYTES', 1024 * 1024))
+SIMILARITY_ON_UPLOAD = os.getenv('SIMILARITY_ON_UPLOAD', '0') == '1'
+
+# Version diffs (projects.diffs): files larger than DIFF_MAX_FILE_BYTES are
+# listed without a diff, and each file's diff stops after DIFF_MAX_LINES.
+DIFF_MAX_FILE_BYTES = int(os.getenv('DIFF_MAX_FILE_BYTES', 512 * 1024))
+DIFF_MAX_LINES = int(os.getenv('DIFF_MAX_LINES', 2000))
+
+# Users per page on the admin user directory (accounts.views.manage_users)
+MANAGE_USERS_PAGE_SIZE = int(os.getenv('MANAGE_USERS_PAGE_SIZE', 50))
+# Seconds the per-role user totals on that page are cached
+USER_COUNTS_CACHE_SECONDS = int(os.getenv('USER_COUNTS_CACHE_SECONDS', 60))
+
+# PBKDF2 rounds for passwords set by bulk imports (accounts.provisioning).
+# Far below Django's default so thousands of accounts hash in seconds; each
+# hash is upgraded to the full count when its user first logs in.
+IMPORT_PASSWORD_ITERATIONS = int(os.getenv('IMPORT_PASSWORD_ITERATIONS', 1000))
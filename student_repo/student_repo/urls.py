@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from accounts import views as accounts_views
+from monitoring import views as monitoring_views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -42,6 +43,13 @@ urlpatterns = [
     # Home should route to a dispatcher that sends logged-in users to their
     # dashboard and anonymous users to the login page.
     path('', accounts_views.post_login_redirect, name='home'),
+    # Prometheus scrape endpoint (admins or METRICS_TOKEN bearer only)
+    path('metrics', monitoring_views.metrics_view, name='metrics'),
+    path('monitoring/', include('monitoring.urls')),
+    path('notifications/', include('notifications.urls')),
+    # read-only JSON API for integrations
+    path('api/v1/', include('api.urls')),
+    path('reports/', include('reports.urls')),
 ]
 
 # Serve media files during development when DEBUG is True